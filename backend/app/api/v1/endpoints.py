@@ -1,7 +1,8 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Form
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Form, Header
 from fastapi.responses import JSONResponse
-from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
+from fastapi.responses import StreamingResponse, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session, load_only
 from typing import List, Optional
 import os
 import uuid
@@ -18,15 +19,21 @@ from app.schemas.equipment import (
     AnalyzeResponse
 )
 from app.services.file_parser import get_parser
-from app.services.langchain_analyzer import get_langchain_analyzer
-from app.services.simulation_engine import simulation_engine
+from app.services.langchain_analyzer import get_langchain_analyzer, analyzer_registry, get_rag_retriever
+from app.services.llm_transport import llm_transport
+from app.services.simulation_engine import simulation_engine, SimulationLimitError
+from app.services.simulation_plan import records_to_output
+from app.services.simulation_replay import TableReplay
 from app.services.knowledge_base import knowledge_manager
+from app.services.ingestion import ingestion_jobs
+from app.services.table_index import table_index, table_payload
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 ALLOWED_EXTENSIONS = {".mdb", ".accdb", ".bak", ".sql", ".mysql"}
+TABLE_ANALYSIS_TYPES = {"table", "thermal", "trend"}
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
 
 # 确保上传目录存在
@@ -43,6 +50,12 @@ async def health_check():
     }
 
 
+@router.get("/llm/metrics")
+async def get_llm_metrics():
+    """LLM 后端调用指标（延迟、重试、token 用量、熔断状态）"""
+    return llm_transport.get_metrics()
+
+
 def allowed_file(filename: str) -> bool:
     """检查文件扩展名是否允许"""
     return "." in filename and \
@@ -64,8 +77,19 @@ def get_file_type(filename: str) -> str:
 
 @router.on_event("startup")
 async def startup_event():
-    """应用启动时初始化数据库"""
+    """应用启动时初始化数据库并预热分析器"""
     init_db()
+    if settings.PREWARM_ANALYZERS:
+        analyzer_registry.prewarm()
+
+
+@router.on_event("shutdown")
+async def shutdown_event():
+    """应用关闭时写入待保存的历史分析、停止模拟调度并释放共享连接"""
+    get_rag_retriever().flush()
+    llm_transport.close()
+    ingestion_jobs.shutdown()
+    await simulation_engine.shutdown()
 
 
 @router.post("/upload", response_model=AnalysisRecordResponse)
@@ -127,18 +151,26 @@ async def upload_file(
         )
         db.add(record)
 
+        table_rows = []
         for table_info in parse_result.get("tables", []):
             table_data = TableData(
                 record_id=file_id,
                 table_name=table_info.get("table_name"),
                 columns=table_info.get("columns"),
-                data=table_info.get("preview"),
+                data=table_info.get("rows", table_info.get("preview")),
                 row_count=table_info.get("row_count")
             )
             db.add(table_data)
+            table_rows.append(table_data)
 
         db.commit()
 
+        # 建立表指纹，供后续相似表检索；记录已提交，指纹建立失败不影响上传结果
+        try:
+            await run_in_threadpool(table_index.index_tables, file.filename, [table_payload(t) for t in table_rows])
+        except Exception as e:
+            logger.warning(f"表指纹建立失败，跳过: {file.filename}, {str(e)}")
+
         return AnalysisRecordResponse(
             id=record.id,
             file_name=record.file_name,
@@ -284,6 +316,33 @@ async def get_table_data(
     }
 
 
+@router.get("/records/{record_id}/tables/{table_name}/similar")
+async def get_similar_tables(
+    record_id: str,
+    table_name: str,
+    k: int = 5,
+    db: Session = Depends(get_db)
+):
+    """查找结构与数值分布相近的已上传表，并附上其最近一次分析结果"""
+    record = db.query(AnalysisRecord).filter(AnalysisRecord.id == record_id).first()
+    actual_record_id = record.source_record_id if record and record.source_record_id else record_id
+
+    table = db.query(TableData).filter(
+        TableData.record_id == actual_record_id,
+        TableData.table_name == table_name
+    ).first()
+    if not table:
+        raise HTTPException(status_code=404, detail="表不存在")
+
+    similar = await run_in_threadpool(
+        table_index.similar, table.columns or [], table.data or [], k, actual_record_id
+    )
+    return {
+        "table_name": table_name,
+        "similar_tables": table_index.attach_analyses(similar)
+    }
+
+
 @router.get("/records/{record_id}/tables/{table_name}/download")
 async def download_table_data(
     record_id: str,
@@ -365,6 +424,16 @@ async def analyze_data(
 
         logger.info(f"开始AI分析，记录状态: {record.status}")
 
+        if request.table_name:
+            analysis_type = request.analysis_type or "table"
+            if analysis_type not in TABLE_ANALYSIS_TYPES:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"不支持的分析类型: {analysis_type}。支持: {', '.join(sorted(TABLE_ANALYSIS_TYPES))}"
+                )
+        else:
+            analysis_type = "general"
+
         # 创建新的分析记录，保存历史
         new_record = AnalysisRecord(
             id=str(uuid.uuid4()),
@@ -375,7 +444,7 @@ async def analyze_data(
             record_count=record.record_count,
             status="pending",
             table_name=request.table_name if request.table_name else None,
-            analysis_type="table" if request.table_name else "general",
+            analysis_type=analysis_type,
             source_record_id=request.record_id if request.table_name else None
         )
         db.add(new_record)
@@ -393,23 +462,38 @@ async def analyze_data(
                 raise HTTPException(status_code=404, detail=f"表 {request.table_name} 不存在")
             
             row_count = target_table.row_count or 0
-            if row_count < 1000:
-                table_data = target_table.data if target_table.data else []
-                data_mode = "全量"
-            else:
-                table_data = target_table.data[:1000] if target_table.data else []
-                data_mode = "采样"
+            # 全部已存储的行交给本地异常检测，LLM 只接收检测摘要和少量样例
+            table_data = target_table.data if target_table.data else []
+            data_mode = "全量" if len(table_data) >= row_count else "采样"
             
+            # 结构与取值相近、且已有分析结果的历史表，作为参考上下文
+            try:
+                similar_tables = await run_in_threadpool(
+                    table_index.similar,
+                    target_table.columns or [],
+                    table_data,
+                    settings.SIMILAR_TABLE_TOP_K,
+                    request.record_id,
+                    settings.SIMILAR_TABLE_MIN_SCORE
+                )
+                similar_tables = [
+                    t for t in table_index.attach_analyses(similar_tables) if t.get("analysis")
+                ]
+            except Exception as e:
+                logger.warning(f"相似表检索失败，跳过参考上下文: {str(e)}")
+                similar_tables = []
+
             data = {
                 "file_name": record.file_name,
                 "table_name": target_table.table_name,
                 "columns": target_table.columns,
                 "row_count": row_count,
                 "data": table_data,
-                "data_mode": data_mode
+                "data_mode": data_mode,
+                "table_version": target_table.version_key,
+                "similar_tables": similar_tables
             }
-            analysis_type = "table"
-            logger.info(f"分析特定表: {request.table_name}, 数据条数: {row_count}, 模式: {data_mode}")
+            logger.info(f"分析特定表: {request.table_name}, 类型: {analysis_type}, 数据条数: {row_count}, 模式: {data_mode}")
         else:
             data = {
                 "file_name": record.file_name,
@@ -424,13 +508,14 @@ async def analyze_data(
                     for t in tables
                 ]
             }
-            analysis_type = "general"
             logger.info(f"分析整个文件，包含 {len(tables)} 个表")
 
         analyzer = get_langchain_analyzer(use_local_model=request.use_local_model)
         logger.info(f"调用AI分析器完成，准备分析")
 
-        analysis_result = analyzer.analyze(
+        # 模型调用与本地检测计算都是阻塞的，放到线程池中执行，不阻塞事件循环（模拟调度与数据推送）
+        analysis_result = await run_in_threadpool(
+            analyzer.analyze,
             data=data,
             user_query=request.query,
             analysis_type=analysis_type
@@ -487,6 +572,7 @@ async def delete_record(
 
     db.delete(record)
     db.commit()
+    table_index.remove_record(record_id)
 
     file_ext = os.path.splitext(record.file_name)[1]
     file_location = os.path.join(
@@ -502,11 +588,23 @@ async def delete_record(
 @router.post("/knowledge/upload")
 async def upload_knowledge_document(
     file: UploadFile = File(...),
+    background: bool = False,
+    replace_doc_id: Optional[str] = Form(None)
 ):
-    """上传文档到知识库"""
+    """上传文档到知识库（background=true 时后台导入，返回任务 ID；replace_doc_id 指定要替换的旧版本文档）"""
     try:
         file_content = await file.read()
-        result = knowledge_manager.add_document(file_content, file.filename)
+        if background:
+            job = ingestion_jobs.submit([(file.filename, file_content)], replace_doc_id=replace_doc_id)
+            return {
+                "success": True,
+                "message": "文档已提交后台导入",
+                "data": job
+            }
+
+        result = await run_in_threadpool(
+            knowledge_manager.add_document, file_content, file.filename, replace_doc_id=replace_doc_id
+        )
         if result.get("success"):
             return {
                 "success": True,
@@ -514,7 +612,10 @@ async def upload_knowledge_document(
                 "data": {
                     "doc_id": result.get("doc_id"),
                     "file_name": result.get("file_name"),
-                    "chunks_count": result.get("chunks_count")
+                    "chunks_count": result.get("chunks_count"),
+                    "duplicate": result.get("duplicate", False),
+                    "updated": result.get("updated", False),
+                    "embedded_chunks": result.get("embedded_chunks", 0)
                 }
             }
         else:
@@ -527,6 +628,48 @@ async def upload_knowledge_document(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/knowledge/upload/batch")
+async def upload_knowledge_documents(
+    files: List[UploadFile] = File(...),
+):
+    """批量上传文档到知识库（后台导入，通过任务接口查询进度）"""
+    if not files:
+        raise HTTPException(status_code=400, detail="未选择文件")
+
+    try:
+        contents = [(file.filename, await file.read()) for file in files]
+        job = ingestion_jobs.submit(contents)
+        return {
+            "success": True,
+            "message": f"已提交 {len(contents)} 个文档后台导入",
+            "data": job
+        }
+    except Exception as e:
+        logger.error(f"批量上传知识库文档失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/knowledge/jobs")
+async def list_knowledge_jobs():
+    """列出知识库导入任务"""
+    return {
+        "success": True,
+        "data": ingestion_jobs.list_jobs()
+    }
+
+
+@router.get("/knowledge/jobs/{job_id}")
+async def get_knowledge_job(job_id: str):
+    """查询知识库导入任务进度"""
+    job = ingestion_jobs.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return {
+        "success": True,
+        "data": job
+    }
+
+
 @router.get("/knowledge/list")
 async def list_knowledge_documents():
     """列出知识库中的文档"""
@@ -567,9 +710,28 @@ async def start_simulation(
     table_name: str,
     interval: int = 5,
     use_analysis_features: bool = True,
+    fault_rate: Optional[float] = None,
+    mode: str = "synthetic",
+    speed: float = 1.0,
+    loop: bool = False,
+    start_at: Optional[str] = None,
+    time_column: Optional[str] = None,
+    seed: Optional[int] = None,
     db: Session = Depends(get_db)
 ):
-    """启动数据模拟"""
+    """
+    启动数据模拟
+
+    mode: synthetic 生成模拟数据（fault_rate: 每个数值列每步随机发生故障片段的概率，seed: 随机种子，
+    以同样的参数与种子启动得到相同的数据序列，默认随机生成并在状态中返回）/
+    replay 按时间列回放表中的真实数据（speed 倍速、loop 循环、start_at 起始时间、time_column 指定时间列）
+    """
+    if mode not in ("synthetic", "replay"):
+        raise HTTPException(status_code=400, detail=f"不支持的模拟模式: {mode}")
+    if seed is not None and seed < 0:
+        raise HTTPException(status_code=400, detail="随机种子不能为负数")
+    if fault_rate is not None and not 0 <= fault_rate <= 1:
+        raise HTTPException(status_code=400, detail="故障发生概率应在 0 到 1 之间")
     
     record = db.query(AnalysisRecord).filter(AnalysisRecord.id == record_id).first()
     
@@ -580,31 +742,72 @@ async def start_simulation(
     if record.source_record_id:
         actual_record_id = record.source_record_id
     
-    table_data = db.query(TableData).filter(
+    query = db.query(TableData).filter(
         TableData.record_id == actual_record_id,
         TableData.table_name == table_name
-    ).first()
+    )
+    if mode == "replay":
+        # 回放按页从数据库读取行，不加载整列数据
+        query = query.options(load_only(TableData.id, TableData.columns))
+    table_data = query.first()
     
     if not table_data:
         raise HTTPException(status_code=404, detail="表不存在")
     
     columns = table_data.columns or []
     analysis_features = None
+    simulation_id = f"{record_id}_{table_name}"
+    
+    if mode == "replay":
+        try:
+            replay = await run_in_threadpool(
+                TableReplay,
+                table_data.id,
+                columns,
+                time_column=time_column,
+                speed=speed,
+                loop=loop,
+                start_at=start_at
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        try:
+            return await simulation_engine.start_simulation(
+                simulation_id=simulation_id,
+                columns=columns,
+                interval=interval,
+                replay=replay
+            )
+        except SimulationLimitError as e:
+            raise HTTPException(status_code=429, detail=str(e))
     
-    if use_analysis_features and record.analysis_result:
+    # 优先按已入库的真实数据拟合分布、自相关与列间相关（按表版本缓存），数据过少时退回关键字规则
+    model = await run_in_threadpool(
+        simulation_engine.fit_model,
+        table_data.data or [],
+        columns,
+        table_data.version_key
+    )
+    
+    if model is None and use_analysis_features and record.analysis_result:
         analysis_features = simulation_engine.extract_features_from_analysis(
             record.analysis_result,
-            columns
+            columns,
+            cache_key=record.id
         )
     
-    simulation_id = f"{record_id}_{table_name}"
-    
-    result = simulation_engine.start_simulation(
-        simulation_id=simulation_id,
-        columns=columns,
-        interval=interval,
-        analysis_features=analysis_features
-    )
+    try:
+        result = await simulation_engine.start_simulation(
+            simulation_id=simulation_id,
+            columns=columns,
+            interval=interval,
+            analysis_features=analysis_features,
+            model=model,
+            fault_rate=fault_rate,
+            seed=seed
+        )
+    except SimulationLimitError as e:
+        raise HTTPException(status_code=429, detail=str(e))
     
     return result
 
@@ -612,44 +815,144 @@ async def start_simulation(
 @router.post("/simulation/stop")
 async def stop_simulation(simulation_id: str):
     """停止模拟"""
-    result = simulation_engine.stop_simulation(simulation_id)
+    result = await simulation_engine.stop_simulation(simulation_id)
     return result
 
 
+@router.post("/simulation/fault")
+async def inject_simulation_fault(
+    simulation_id: str,
+    column: str,
+    kind: str = "overheat",
+    duration: Optional[int] = None,
+    magnitude: Optional[float] = None
+):
+    """向运行中的模拟注入故障片段（overheat 缓慢过热 / stuck 传感器卡死 / dropout 数据缺失）"""
+    try:
+        fault = await simulation_engine.inject_fault(simulation_id, column, kind, duration, magnitude)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="模拟不存在")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"simulation_id": simulation_id, "fault": fault}
+
+
+@router.post("/simulation/seek")
+async def seek_simulation(simulation_id: str, position: str):
+    """回放跳转（position: 时间字符串；数值时间列为数值，无时间列时为行号）"""
+    try:
+        replay = await simulation_engine.seek_simulation(simulation_id, position)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="模拟不存在")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"simulation_id": simulation_id, "replay": replay}
+
+
 @router.get("/simulation/data")
 async def get_simulation_data(
     simulation_id: str,
-    row_count: int = 20
+    since: Optional[int] = None,
+    row_count: int = 20,
+    format: str = "records"
 ):
-    """获取模拟数据"""
+    """
+    获取模拟已生成的数据（增量读取）
+
+    since 传上次返回的 last_seq，只返回其后的新行；不传时返回最近 row_count 行。
+    format: records 行列表 / columnar 按列 / arrow Arrow IPC 流
+    """
     
-    status = simulation_engine.get_simulation_status(simulation_id)
+    status = await simulation_engine.get_simulation_status(simulation_id)
     
     if not status:
         raise HTTPException(status_code=404, detail="模拟不存在")
+    if format not in ("records", "columnar", "arrow"):
+        raise HTTPException(status_code=400, detail=f"不支持的输出格式: {format}")
     
-    columns = status.get('columns', [])
-    analysis_features = status.get('analysis_features', {})
+    result = await simulation_engine.read_simulation_data(simulation_id, since, row_count)
+    if result is None:
+        raise HTTPException(status_code=404, detail="模拟不存在")
+    rows = result["rows"]
     
-    data = simulation_engine.generate_simulation_data(
-        columns=columns,
-        row_count=row_count,
-        analysis_features=analysis_features
-    )
+    try:
+        data = records_to_output(rows, format)
+    except ImportError:
+        raise HTTPException(status_code=400, detail="服务端未安装 pyarrow，无法输出 Arrow 格式")
+    
+    if format == "arrow":
+        import pyarrow as pa
+
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, data.schema) as writer:
+            writer.write_table(data)
+        return Response(
+            content=sink.getvalue().to_pybytes(),
+            media_type="application/vnd.apache.arrow.stream",
+            headers={
+                "X-Simulation-Id": simulation_id,
+                "X-Row-Count": str(len(rows)),
+                "X-Last-Seq": str(result["last_seq"]),
+                "X-Dropped": str(result["dropped"])
+            }
+        )
     
     return {
         "simulation_id": simulation_id,
         "status": status.get('status'),
         "data": data,
-        "columns": columns,
-        "data_count": len(data)
+        "columns": status.get('columns', []),
+        "format": format,
+        "data_count": len(rows),
+        "last_seq": result["last_seq"],
+        "dropped": result["dropped"],
+        "has_more": result["has_more"]
     }
 
 
+@router.get("/simulation/stream")
+async def stream_simulation_data(
+    simulation_id: str,
+    since: Optional[int] = None,
+    last_event_id: Optional[str] = Header(None)
+):
+    """
+    模拟数据推送（Server-Sent Events）
+
+    每个 rows 事件携带一批新行，id 为该批最后一行的序号；断线重连时浏览器自动带上 Last-Event-ID 续传。
+    Last-Event-ID 优先于 since：EventSource 重连沿用初始 URL，since 只表示首次连接的起点。
+    模拟停止后发送 end 事件并关闭连接。
+    """
+    if not await simulation_engine.get_simulation_status(simulation_id):
+        raise HTTPException(status_code=404, detail="模拟不存在")
+
+    if last_event_id and last_event_id.lstrip("-").isdigit():
+        since = int(last_event_id)
+
+    async def event_stream():
+        yield "retry: 3000\n\n"
+        async for batch in simulation_engine.subscribe(simulation_id, since):
+            if batch is None:
+                yield ": keepalive\n\n"
+                continue
+            payload = (
+                f'{{"last_seq": {batch["last_seq"]}, "dropped": {batch["dropped"]}, '
+                f'"rows": [{",".join(batch["rows"])}]}}'
+            )
+            yield f"id: {batch['last_seq']}\nevent: rows\ndata: {payload}\n\n"
+        yield "event: end\ndata: {}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get("/simulation/status")
 async def get_simulation_status(simulation_id: str):
     """获取模拟状态"""
-    status = simulation_engine.get_simulation_status(simulation_id)
+    status = await simulation_engine.get_simulation_status(simulation_id)
     
     if not status:
         return {
@@ -662,5 +965,12 @@ async def get_simulation_status(simulation_id: str):
         "simulation_id": simulation_id,
         "status": status.get('status'),
         "start_time": status.get('start_time'),
-        "data_count": status.get('data_count', 0)
+        "interval": status.get('interval'),
+        "seed": status.get('seed'),
+        "model": status.get('model'),
+        "faults": status.get('faults', []),
+        "data_count": status.get('data_count', 0),
+        "buffered_from_seq": status.get('buffered_from_seq', 0),
+        "subscribers": status.get('subscribers', 0),
+        "owner": status.get('owner')
     }
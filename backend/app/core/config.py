@@ -27,6 +27,94 @@ class Settings(BaseSettings):
     OLLAMA_MODEL: str = "llama2"
     USE_LOCAL_MODEL: bool = False
 
+    # LLM 连接与分析器配置
+    LLM_REQUEST_TIMEOUT: float = 120.0
+    OLLAMA_REQUEST_TIMEOUT: float = 300.0
+    LLM_MAX_RETRIES: int = 3
+    LLM_RETRY_BASE_DELAY: float = 0.5
+    LLM_RETRY_MAX_DELAY: float = 8.0
+    LLM_CIRCUIT_FAILURE_THRESHOLD: int = 5
+    LLM_CIRCUIT_RESET_SECONDS: float = 30.0
+    DEEPSEEK_MAX_CONCURRENCY: int = 8
+    OLLAMA_MAX_CONCURRENCY: int = 1
+    HTTP_MAX_CONNECTIONS: int = 20
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    PREWARM_ANALYZERS: bool = True
+
+    # 向量化配置：auto / openai / local（sentence-transformers 本地模型）/ hashing（哈希字符 n-gram）
+    EMBEDDING_BACKEND: str = "auto"
+    LOCAL_EMBEDDING_MODEL: str = ""
+    EMBEDDING_BATCH_SIZE: int = 64
+    HASHING_EMBEDDING_DIM: int = 1024
+    QUERY_EMBEDDING_CACHE_SIZE: int = 1024
+    RAG_QUERY_CACHE_SIZE: int = 256
+    # 各工作进程内的 BM25/ANN 索引每隔该秒数比对向量库条数，其他进程写入或删除后重建（0 表示不检查）
+    RAG_INDEX_REFRESH_INTERVAL: float = 30.0
+
+    # 向量检索索引：Chroma HNSW 参数（集合首次创建时生效）；
+    # VECTOR_ANN_BACKEND=chroma 使用 Chroma 内置 HNSW，quantized 使用内存量化精确索引（VECTOR_QUANTIZATION: int8/float16/none），
+    # faiss 使用 IVF-PQ（需安装 faiss-cpu），可用 scripts/benchmark_ann.py 对比召回率与延迟
+    VECTOR_HNSW_M: int = 16
+    VECTOR_HNSW_CONSTRUCTION_EF: int = 100
+    VECTOR_HNSW_SEARCH_EF: int = 64
+    VECTOR_ANN_BACKEND: str = "chroma"
+    VECTOR_QUANTIZATION: str = "int8"
+    FAISS_IVF_NLIST: int = 1024
+    FAISS_PQ_M: int = 64
+    FAISS_NPROBE: int = 16
+
+    # 上传解析：每个表入库的最大行数（表数据浏览与下载、异常检测、模拟拟合与历史回放都使用入库的行）
+    TABLE_DATA_MAX_ROWS: int = 100000
+
+    # 相似表检索：分析时引用综合相似度不低于阈值的已分析表
+    SIMILAR_TABLE_TOP_K: int = 3
+    SIMILAR_TABLE_MIN_SCORE: float = 0.8
+    # 各工作进程的内存指纹矩阵每隔该秒数与数据库同步（载入其他进程上传的表、移除已删除的表，0 表示不同步）
+    TABLE_INDEX_REFRESH_INTERVAL: float = 30.0
+
+    # 历史分析库：近重复判定的 SimHash 海明距离阈值，及每个文件/表的保留条数与天数（0 表示不限）
+    HISTORY_SIMHASH_DISTANCE: int = 8
+    HISTORY_MAX_PER_TABLE: int = 5
+    HISTORY_RETENTION_DAYS: int = 180
+    # 历史分析异步写入：批量条数、最长等待秒数、队列上限
+    HISTORY_FLUSH_BATCH_SIZE: int = 32
+    HISTORY_FLUSH_INTERVAL: float = 2.0
+    HISTORY_QUEUE_MAX_SIZE: int = 1000
+
+    # 知识库文档导入配置
+    INGEST_WORKERS: int = min(4, os.cpu_count() or 1)
+    INGEST_PAGES_PER_TASK: int = 16
+    INGEST_EMBED_BATCH_SIZE: int = 128
+    INGEST_MAX_PARALLEL_DOCS: int = 2
+
+    # 数据模拟：每个模拟保留的最近行数（环形缓冲）、每次触发生成的行数、最小触发间隔（秒）
+    SIMULATION_BUFFER_SIZE: int = 1000
+    SIMULATION_ROWS_PER_TICK: int = 1
+    SIMULATION_MIN_INTERVAL: float = 0.1
+    # 模拟模型：入库的表数据不少于该行数时按真实数据拟合分布/自相关/列间相关，否则按列名关键字生成；拟合结果按表版本缓存
+    # （200 行时自相关与相关系数的标准误约 0.07，行数更少时拟合结果主要是噪声）
+    SIMULATION_FIT_MIN_ROWS: int = 200
+    SIMULATION_MODEL_CACHE_SIZE: int = 32
+    # 模拟故障注入：每个数值列每步随机发生故障片段（过热、卡死、缺失）的概率，0 表示只在手动注入时发生
+    SIMULATION_FAULT_RATE: float = 0.0
+    # 模拟数据推送（SSE）：每批最多行数、两批最小间隔（秒）、心跳间隔（秒）
+    SIMULATION_PUSH_MAX_BATCH: int = 500
+    SIMULATION_PUSH_MIN_INTERVAL: float = 0.2
+    SIMULATION_PUSH_HEARTBEAT: float = 15.0
+    # 模拟注册表：同时运行的模拟上限（所有工作进程合计，0 表示不限）、无人读取多久后自动停止、停止后保留多久（秒），
+    # 以及本进程的新行与心跳写入共享存储（数据库）的间隔（秒），其他工作进程据此查询、读取与停止
+    SIMULATION_MAX_ACTIVE: int = 50
+    SIMULATION_IDLE_TIMEOUT: float = 1800.0
+    SIMULATION_TTL: float = 600.0
+    SIMULATION_STORE_FLUSH_INTERVAL: float = 1.0
+    # 历史表回放：每次从数据库读取的行数（只在内存中保留当前页与预取的下一页）
+    SIMULATION_REPLAY_PAGE_SIZE: int = 1000
+
+    # 热分析配置（整流元件温度，单位 °C）
+    THERMAL_JUNCTION_LIMIT: float = 125.0
+    THERMAL_ALARM_THRESHOLD: float = 100.0
+    THERMAL_IMBALANCE_THRESHOLD: float = 15.0
+
     # 文件解析配置
     MDB_DRIVER: str = "{Microsoft Access Driver (*.mdb, *.accdb)}"
 
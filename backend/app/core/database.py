@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, BigInteger, DateTime, Text, JSON, create_engine
+from sqlalchemy import Column, String, Integer, BigInteger, DateTime, Text, JSON, LargeBinary, create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
@@ -37,6 +37,64 @@ class TableData(Base):
     row_count = Column(Integer, default=0)
     created_at = Column(DateTime, default=datetime.now)
 
+    @property
+    def version_key(self) -> str:
+        """表数据版本标识，用于按表和版本缓存计算结果"""
+        created_at = self.created_at.isoformat() if self.created_at else ""
+        return f"{self.id}:{self.row_count}:{created_at}"
+
+class KnowledgeDocument(Base):
+    """知识库文档目录：与向量库并行维护，列表与删除无需扫描向量库"""
+    __tablename__ = "knowledge_documents"
+
+    doc_id = Column(String(36), primary_key=True)
+    file_name = Column(String(255), nullable=False, index=True)
+    file_path = Column(String(1024), nullable=True)
+    file_hash = Column(String(64), nullable=True, unique=True, index=True)
+    file_size = Column(BigInteger, default=0)
+    char_count = Column(Integer, default=0)
+    chunks_count = Column(Integer, default=0)
+    chunk_ids = Column(JSON)
+    created_at = Column(DateTime, default=datetime.now, index=True)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+class TableFingerprint(Base):
+    """表指纹：列名向量 + 数值分布画像，用于查找结构与取值相近的已分析表"""
+    __tablename__ = "table_fingerprints"
+
+    table_data_id = Column(String(36), primary_key=True)
+    record_id = Column(String(36), nullable=False, index=True)
+    file_name = Column(String(255))
+    table_name = Column(String(255), nullable=False)
+    columns = Column(JSON)
+    model_id = Column(String(100))
+    schema_vector = Column(LargeBinary)
+    profile_vector = Column(LargeBinary)
+    profile = Column(JSON)
+    created_at = Column(DateTime, default=datetime.now)
+
+class SimulationState(Base):
+    """模拟注册表：运行中与最近停止的模拟，多个工作进程共享（生成数据的进程定期刷新 updated_at）"""
+    __tablename__ = "simulation_states"
+
+    simulation_id = Column(String(255), primary_key=True)
+    run_id = Column(String(36), nullable=False)
+    owner = Column(String(100))
+    status = Column(String(20), default="running", index=True)
+    info = Column(JSON)
+    next_seq = Column(Integer, default=0)
+    start_time = Column(DateTime, default=datetime.now)
+    last_access = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now, index=True)
+
+class SimulationRow(Base):
+    """模拟最近生成的数据行（每个模拟保留 SIMULATION_BUFFER_SIZE 行，data 为行的 JSON 编码）"""
+    __tablename__ = "simulation_rows"
+
+    simulation_id = Column(String(255), primary_key=True)
+    seq = Column(Integer, primary_key=True)
+    data = Column(Text)
+
 engine = create_engine(
     settings.DATABASE_URL,
     connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {}
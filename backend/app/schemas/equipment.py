@@ -44,6 +44,7 @@ class AnalyzeRequest(BaseModel):
     table_name: Optional[str] = None
     query: Optional[str] = None
     use_local_model: bool = False
+    analysis_type: Optional[str] = None  # 表分析类型: table(默认)/thermal/trend
 
 class AnalyzeResponse(BaseModel):
     record_id: str
@@ -1,4 +1,3 @@
-import requests
 import json
 import pandas as pd
 from typing import Dict, Any, Optional, List
@@ -6,9 +5,19 @@ from datetime import datetime
 import logging
 
 from app.core.config import settings
+from app.services.llm_transport import llm_transport
+from app.services.anomaly_detector import anomaly_detector
+from app.services.thermal_analyzer import thermal_analyzer, THERMAL_SYSTEM_PROMPT, THERMAL_TASK_PROMPT
+from app.services.trend_engine import trend_engine, TREND_TASK_PROMPT
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_SYSTEM_PROMPT = "你是一位资深的设备数据分析专家，擅长从设备运行数据中发现问题、分析趋势、提供优化建议。请用中文回答问题。"
+
+SYSTEM_PROMPTS = {
+    "thermal": THERMAL_SYSTEM_PROMPT
+}
+
 
 class AIAnalyzer:
     """AI分析器 - 支持DeepSeek和本地Ollama模型"""
@@ -33,7 +42,7 @@ class AIAnalyzer:
         Args:
             data: 解析后的数据
             user_query: 用户自定义查询
-            analysis_type: 分析类型 (general/anomaly/trend/report)
+            analysis_type: 分析类型 (general/anomaly/trend/report/table/thermal)
         """
         try:
             if self.use_local_model:
@@ -52,6 +61,28 @@ class AIAnalyzer:
     def _prepare_context(self, data: Dict[str, Any], analysis_type: str = "general") -> str:
         """准备分析上下文"""
         
+        if analysis_type == "thermal":
+            context = {
+                "file_name": data.get("file_name"),
+                "table_name": data.get("table_name"),
+                "row_count": data.get("row_count", 0),
+                "columns": data.get("columns", []),
+                "data_mode": data.get("data_mode", "采样"),
+                "thermal_analysis": thermal_analyzer.analyze(data.get("data", []), data.get("columns"))
+            }
+            return json.dumps(context, ensure_ascii=False, indent=2)
+
+        if analysis_type == "trend" and data.get("data"):
+            context = {
+                "file_name": data.get("file_name"),
+                "table_name": data.get("table_name"),
+                "row_count": data.get("row_count", 0),
+                "columns": data.get("columns", []),
+                "data_mode": data.get("data_mode", "采样"),
+                "trend_analysis": trend_engine.analyze(data.get("data", []), data.get("columns"), cache_key=data.get("table_version"))
+            }
+            return json.dumps(context, ensure_ascii=False, indent=2)
+
         if analysis_type == "table":
             table_data = data.get("data", [])
             context = {
@@ -60,7 +91,8 @@ class AIAnalyzer:
                 "row_count": data.get("row_count", 0),
                 "columns": data.get("columns", []),
                 "data_mode": data.get("data_mode", "采样"),
-                "sample_data": table_data[:20] if table_data else []
+                "sample_data": table_data[:5] if table_data else [],
+                "anomaly_detection": anomaly_detector.detect(table_data, data.get("columns"))
             }
             return json.dumps(context, ensure_ascii=False, indent=2)
         
@@ -114,12 +146,14 @@ class AIAnalyzer:
         elif analysis_type == "anomaly":
             base_prompt += """
 请对以上设备运行数据进行异常检测分析：
-1. 识别潜在的数据异常（如：极端值、缺失率高的字段、异常时间戳等）
+1. 识别潜在的数据异常（如：极端值、缺失率高的字段、异常时间戳等），如数据概览中包含 anomaly_detection，以其全量检测结果为准
 2. 分析可能的异常原因
 3. 给出异常预警建议
 
 请用中文回答，重点关注异常点。
 """
+        elif analysis_type == "trend" and data.get("data"):
+            base_prompt += TREND_TASK_PROMPT
         elif analysis_type == "trend":
             base_prompt += """
 请对以上设备运行数据进行趋势分析：
@@ -141,6 +175,8 @@ class AIAnalyzer:
 
 请用中文生成正式的分析报告格式。
 """
+        elif analysis_type == "thermal":
+            base_prompt += THERMAL_TASK_PROMPT
         elif analysis_type == "table":
             table_name = data.get("table_name", "")
             row_count = data.get("row_count", 0)
@@ -149,7 +185,7 @@ class AIAnalyzer:
             base_prompt += f"""
 请对表「{table_name}」（共 {row_count} 条记录，数据模式：{data_mode}）进行详细数据分析：
 1. 表结构分析：字段含义、类型、数据特征
-2. 数据质量分析：缺失值、异常值、数据分布
+2. 数据质量分析：缺失值、异常值、数据分布（异常值以 anomaly_detection 中的全量本地检测结果为准）
 3. 字段特征分析：各字段的值域范围、重复度、关键字段识别
 4. 数据洞察：发现的问题、规律、建议
 
@@ -168,7 +204,7 @@ class AIAnalyzer:
 
         return base_prompt
 
-    def _call_deepseek(self, prompt: str) -> str:
+    def _call_deepseek(self, prompt: str, system_prompt: str = DEFAULT_SYSTEM_PROMPT) -> str:
         """调用DeepSeek API"""
         if not self.deepseek_api_key:
             raise Exception("DeepSeek API Key未配置")
@@ -183,7 +219,7 @@ class AIAnalyzer:
             "messages": [
                 {
                     "role": "system",
-                    "content": "你是一位资深的设备数据分析专家，擅长从设备运行数据中发现问题、分析趋势、提供优化建议。请用中文回答问题。"
+                    "content": system_prompt
                 },
                 {
                     "role": "user",
@@ -194,26 +230,17 @@ class AIAnalyzer:
             "max_tokens": 4096
         }
 
-        response = requests.post(
-            self.deepseek_api_url,
-            headers=headers,
-            json=payload,
-            timeout=120
-        )
-
-        if response.status_code != 200:
-            raise Exception(f"DeepSeek API调用失败: {response.text}")
-
-        result = response.json()
+        result = llm_transport.post_json_sync("deepseek", self.deepseek_api_url, payload, headers=headers)
         return result["choices"][0]["message"]["content"]
 
-    def _call_ollama(self, prompt: str) -> str:
+    def _call_ollama(self, prompt: str, system_prompt: str = DEFAULT_SYSTEM_PROMPT) -> str:
         """调用本地Ollama模型"""
         url = f"{self.ollama_base_url}/api/generate"
 
         payload = {
             "model": self.ollama_model,
             "prompt": prompt,
+            "system": system_prompt,
             "stream": False,
             "options": {
                 "temperature": 0.7,
@@ -221,12 +248,7 @@ class AIAnalyzer:
             }
         }
 
-        response = requests.post(url, json=payload, timeout=300)
-
-        if response.status_code != 200:
-            raise Exception(f"Ollama API调用失败: {response.text}")
-
-        result = response.json()
+        result = llm_transport.post_json_sync("ollama", url, payload)
         return result.get("response", "")
 
     def _analyze_with_deepseek(
@@ -238,7 +260,7 @@ class AIAnalyzer:
         """使用DeepSeek进行分析"""
         try:
             prompt = self._build_prompt(data, user_query, analysis_type)
-            result = self._call_deepseek(prompt)
+            result = self._call_deepseek(prompt, SYSTEM_PROMPTS.get(analysis_type, DEFAULT_SYSTEM_PROMPT))
 
             return {
                 "status": "success",
@@ -269,7 +291,7 @@ class AIAnalyzer:
         """使用本地Ollama进行分析"""
         try:
             prompt = self._build_prompt(data, user_query, analysis_type)
-            result = self._call_ollama(prompt)
+            result = self._call_ollama(prompt, SYSTEM_PROMPTS.get(analysis_type, DEFAULT_SYSTEM_PROMPT))
 
             return {
                 "status": "success",
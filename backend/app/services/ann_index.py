@@ -0,0 +1,248 @@
+import threading
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    if scores.size <= k:
+        return np.argsort(-scores)
+    index = np.argpartition(-scores, k)[:k]
+    return index[np.argsort(-scores[index])]
+
+
+class QuantizedFlatIndex:
+    """内存精确检索索引（内积），向量可量化为 int8（逐行缩放）或 float16 以降低内存
+
+    int8 每个向量占 dim 字节（float32 的 1/4），float16 为 1/2；检索为分块矩阵乘，结果为精确排序（仅受量化误差影响）。
+    """
+
+    def __init__(self, quantization: str = "int8", block_size: int = 8192):
+        if quantization not in ("int8", "float16", "none"):
+            raise ValueError(f"不支持的量化方式: {quantization}")
+        self.quantization = quantization
+        self.block_size = block_size
+        self.dtype = {"int8": np.int8, "float16": np.float16, "none": np.float32}[quantization]
+        self.dim: Optional[int] = None
+        self.vectors: Optional[np.ndarray] = None
+        self.scales = np.empty(0, dtype=np.float32)
+        self.keys: List[str] = []
+        self.rows: Dict[str, int] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @property
+    def memory_bytes(self) -> int:
+        if self.vectors is None:
+            return 0
+        return len(self) * (self.vectors.itemsize * self.dim + (4 if self.quantization == "int8" else 0))
+
+    def _reserve(self, extra: int):
+        needed = len(self.keys) + extra
+        capacity = 0 if self.vectors is None else self.vectors.shape[0]
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2, 1024)
+        vectors = np.zeros((new_capacity, self.dim), dtype=self.dtype)
+        scales = np.ones(new_capacity, dtype=np.float32)
+        if self.vectors is not None:
+            vectors[:len(self.keys)] = self.vectors[:len(self.keys)]
+            scales[:len(self.keys)] = self.scales[:len(self.keys)]
+        self.vectors, self.scales = vectors, scales
+
+    def _encode(self, matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        if self.quantization != "int8":
+            return matrix.astype(self.dtype), np.ones(len(matrix), dtype=np.float32)
+        scales = np.abs(matrix).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        return np.round(matrix / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+    def add(self, keys: Sequence[str], vectors) -> int:
+        """添加向量（已存在的键忽略），返回新增数量"""
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.ndim != 2 or not len(matrix):
+            return 0
+        with self._lock:
+            if self.dim is None:
+                self.dim = matrix.shape[1]
+            fresh, seen = [], set()
+            for i, key in enumerate(keys):
+                if key not in self.rows and key not in seen:
+                    seen.add(key)
+                    fresh.append(i)
+            if not fresh:
+                return 0
+            encoded, scales = self._encode(matrix[fresh])
+            self._reserve(len(fresh))
+            start = len(self.keys)
+            self.vectors[start:start + len(fresh)] = encoded
+            self.scales[start:start + len(fresh)] = scales
+            for offset, i in enumerate(fresh):
+                self.rows[keys[i]] = start + offset
+                self.keys.append(keys[i])
+            return len(fresh)
+
+    def remove(self, keys: Sequence[str]):
+        """删除向量（末行移入空位，保持存储连续）"""
+        with self._lock:
+            for key in keys:
+                row = self.rows.pop(key, None)
+                if row is None:
+                    continue
+                last = len(self.keys) - 1
+                if row != last:
+                    moved = self.keys[last]
+                    self.vectors[row] = self.vectors[last]
+                    self.scales[row] = self.scales[last]
+                    self.keys[row] = moved
+                    self.rows[moved] = row
+                self.keys.pop()
+
+    def search(self, query, k: int) -> List[Tuple[str, float]]:
+        """返回 [(key, 内积得分)]，按得分降序"""
+        q = np.asarray(query, dtype=np.float32)
+        with self._lock:
+            n = len(self.keys)
+            if n == 0:
+                return []
+            best_scores, best_rows = [], []
+            for start in range(0, n, self.block_size):
+                end = min(n, start + self.block_size)
+                scores = (self.vectors[start:end].astype(np.float32, copy=False) @ q) * self.scales[start:end]
+                top = _top_k(scores, k)
+                best_scores.append(scores[top])
+                best_rows.append(top + start)
+            scores = np.concatenate(best_scores)
+            rows = np.concatenate(best_rows)
+            order = _top_k(scores, k)
+            return [(self.keys[rows[i]], float(scores[i])) for i in order]
+
+
+class FaissIVFPQIndex:
+    """faiss IVF-PQ 近似检索索引（内积）：倒排分桶 + 乘积量化压缩，适合百万级以上片段
+
+    向量数不足以训练时先存入精确索引，达到 train_size 后训练并迁入；需要安装 faiss-cpu。
+    """
+
+    def __init__(self, nlist: int = 1024, pq_m: int = 64, nprobe: int = 16, train_size: Optional[int] = None):
+        import faiss  # noqa: F401
+
+        self.nlist = nlist
+        self.pq_m = pq_m
+        self.nprobe = nprobe
+        self.train_size = train_size
+        self.dim: Optional[int] = None
+        self.index = None
+        self.staging = QuantizedFlatIndex("none")
+        self.ids: Dict[str, int] = {}
+        self.keys: Dict[int, str] = {}
+        self._next_id = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.staging) if self.index is None else self.index.ntotal
+
+    @property
+    def memory_bytes(self) -> int:
+        if self.index is None:
+            return self.staging.memory_bytes
+        return self.index.ntotal * (self.pq_m + 8)
+
+    def _pq_m(self) -> int:
+        m = min(self.pq_m, self.dim)
+        while self.dim % m:
+            m -= 1
+        return m
+
+    def _train(self):
+        import faiss
+
+        n = len(self.staging)
+        nlist = max(1, min(self.nlist, int(4 * np.sqrt(n))))
+        matrix = self.staging.vectors[:n].astype(np.float32)
+        index = faiss.index_factory(self.dim, f"IVF{nlist},PQ{self._pq_m()}", faiss.METRIC_INNER_PRODUCT)
+        index.train(matrix)
+        index.nprobe = self.nprobe
+        index.add_with_ids(matrix, np.array([self.ids[key] for key in self.staging.keys], dtype=np.int64))
+        self.index = index
+        self.staging = QuantizedFlatIndex("none")
+        logger.info(f"IVF-PQ 索引训练完成: {n} 个向量, nlist={nlist}, m={self._pq_m()}")
+
+    def add(self, keys: Sequence[str], vectors) -> int:
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.ndim != 2 or not len(matrix):
+            return 0
+        with self._lock:
+            if self.dim is None:
+                self.dim = matrix.shape[1]
+            fresh = []
+            for i, key in enumerate(keys):
+                if key not in self.ids:
+                    self.ids[key] = self._next_id
+                    self.keys[self._next_id] = key
+                    self._next_id += 1
+                    fresh.append(i)
+            if not fresh:
+                return 0
+
+            if self.index is None:
+                self.staging.add([keys[i] for i in fresh], matrix[fresh])
+                if len(self.staging) >= (self.train_size or self.nlist * 39):
+                    self._train()
+            else:
+                self.index.add_with_ids(matrix[fresh], np.array([self.ids[keys[i]] for i in fresh], dtype=np.int64))
+            return len(fresh)
+
+    def remove(self, keys: Sequence[str]):
+        with self._lock:
+            ids = [self.ids.pop(key) for key in keys if key in self.ids]
+            for i in ids:
+                self.keys.pop(i, None)
+            if self.index is None:
+                self.staging.remove(keys)
+            elif ids:
+                self.index.remove_ids(np.array(ids, dtype=np.int64))
+
+    def search(self, query, k: int) -> List[Tuple[str, float]]:
+        q = np.asarray(query, dtype=np.float32)
+        with self._lock:
+            if self.index is None:
+                return self.staging.search(q, k)
+            scores, ids = self.index.search(q[None, :], k)
+            return [(self.keys[i], float(s)) for s, i in zip(scores[0], ids[0]) if i >= 0 and i in self.keys]
+
+
+def create_ann_index():
+    """按配置创建 ANN 加速索引；VECTOR_ANN_BACKEND=chroma 时返回 None（直接使用 Chroma 内置 HNSW）"""
+    backend = settings.VECTOR_ANN_BACKEND
+    if backend == "chroma":
+        return None
+    if backend == "quantized":
+        return QuantizedFlatIndex(settings.VECTOR_QUANTIZATION)
+    if backend == "faiss":
+        try:
+            return FaissIVFPQIndex(
+                nlist=settings.FAISS_IVF_NLIST,
+                pq_m=settings.FAISS_PQ_M,
+                nprobe=settings.FAISS_NPROBE
+            )
+        except ImportError:
+            logger.warning("未安装 faiss-cpu，改用量化精确索引")
+            return QuantizedFlatIndex(settings.VECTOR_QUANTIZATION)
+    raise ValueError(f"不支持的 ANN 后端: {backend}")
+
+
+def hnsw_metadata() -> Dict[str, int]:
+    """Chroma 集合的 HNSW 参数（仅在集合首次创建时生效）"""
+    return {
+        "hnsw:M": settings.VECTOR_HNSW_M,
+        "hnsw:construction_ef": settings.VECTOR_HNSW_CONSTRUCTION_EF,
+        "hnsw:search_ef": settings.VECTOR_HNSW_SEARCH_EF
+    }
@@ -0,0 +1,272 @@
+import time
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, List, Optional
+import logging
+
+from app.services.frame_utils import (
+    rows_to_frame, detect_time_column, parse_time_column, numeric_frame, time_to_seconds,
+    format_label, round_value
+)
+
+logger = logging.getLogger(__name__)
+
+METHODS = ["zscore", "iqr", "mad", "rate_of_change", "stuck"]
+
+
+class AnomalyDetector:
+    """本地向量化异常检测引擎 - 对全量数值列做滚动Z分数、IQR、MAD、变化率和卡死检测"""
+
+    def __init__(
+        self,
+        zscore_window: int = 60,
+        zscore_threshold: float = 4.0,
+        iqr_k: float = 3.0,
+        mad_threshold: float = 5.0,
+        rate_threshold: float = 8.0,
+        stuck_min_run: int = 10,
+        window_gap: int = 3,
+        top_n: int = 5
+    ):
+        self.zscore_window = zscore_window
+        self.zscore_threshold = zscore_threshold
+        self.iqr_k = iqr_k
+        self.mad_threshold = mad_threshold
+        self.rate_threshold = rate_threshold
+        self.stuck_min_run = stuck_min_run
+        self.window_gap = window_gap
+        self.top_n = top_n
+
+    def detect(
+        self,
+        rows: List[Dict[str, Any]],
+        columns: Optional[List[str]] = None,
+        time_column: Optional[str] = None,
+        rate_limits: Optional[Dict[str, float]] = None,
+        max_columns: int = 20
+    ) -> Dict[str, Any]:
+        """
+        对表数据执行异常检测
+
+        Args:
+            rows: 表数据行（TableData.data）
+            columns: 列顺序
+            time_column: 时间列，不指定时自动识别
+            rate_limits: 各列变化率绝对上限（单位/秒，无时间列时为单位/行）
+            max_columns: 结果中保留的异常列数量上限
+        """
+        df = rows_to_frame(rows, columns)
+        return self.detect_frame(df, time_column, rate_limits, max_columns)
+
+    def detect_frame(
+        self,
+        df: pd.DataFrame,
+        time_column: Optional[str] = None,
+        rate_limits: Optional[Dict[str, float]] = None,
+        max_columns: int = 20
+    ) -> Dict[str, Any]:
+        """对 DataFrame 执行异常检测，返回紧凑的结果摘要"""
+        started = time.perf_counter()
+
+        if time_column is None:
+            time_column = detect_time_column(df)
+        times = parse_time_column(df, time_column)
+
+        num = numeric_frame(df, exclude=[time_column] if time_column else None)
+        result = {
+            "rows": len(df),
+            "time_column": time_column if times is not None else None,
+            "columns_analyzed": num.shape[1],
+            "total_anomalies": 0,
+            "columns": {}
+        }
+
+        if num.empty:
+            result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+            return result
+
+        if times is not None:
+            order = np.argsort(times.to_numpy(), kind="stable")
+            num = num.iloc[order]
+            times = times.iloc[order]
+
+        X = num.to_numpy(dtype=np.float64, copy=True)
+        labels = self._row_labels(num.index.to_numpy(), times)
+
+        zscore_flags, zscores = self._rolling_zscore(num)
+        iqr_flags = self._iqr(X)
+        mad_flags, robust = self._mad(X)
+        rate_flags = self._rate_of_change(X, times, list(num.columns), rate_limits or {})
+        stuck_flags, stuck_episodes, constant = self._stuck(X)
+
+        flags = {
+            "zscore": zscore_flags,
+            "iqr": iqr_flags,
+            "mad": mad_flags,
+            "rate_of_change": rate_flags,
+            "stuck": stuck_flags
+        }
+        any_flag = zscore_flags | iqr_flags | mad_flags | rate_flags | stuck_flags
+        counts = any_flag.sum(axis=0)
+        method_counts = {name: flag.sum(axis=0) for name, flag in flags.items()}
+
+        # 排序评分：优先使用稳健分数（MAD），无法计算时退回滚动Z分数
+        score = np.where(np.isfinite(robust), robust, np.abs(zscores))
+        score = np.where(np.isfinite(score), score, 0.0)
+
+        with np.errstate(all="ignore"):
+            col_min = np.nanmin(X, axis=0)
+            col_max = np.nanmax(X, axis=0)
+            col_mean = np.nanmean(X, axis=0)
+            col_std = np.nanstd(X, axis=0)
+        missing = np.isnan(X).sum(axis=0)
+
+        ranked = np.argsort(-counts, kind="stable")
+        for j in ranked[:max_columns]:
+            col = num.columns[j]
+            column_result = {
+                "count": int(counts[j]),
+                "rate": round(float(counts[j]) / len(X), 4),
+                "methods": {name: int(method_counts[name][j]) for name in METHODS},
+                "stats": {
+                    "min": round_value(col_min[j]),
+                    "max": round_value(col_max[j]),
+                    "mean": round_value(col_mean[j]),
+                    "std": round_value(col_std[j]),
+                    "missing": int(missing[j])
+                },
+                "constant": bool(constant[j]),
+                "stuck_episodes": int(stuck_episodes[j])
+            }
+            if counts[j] > 0:
+                flagged = np.flatnonzero(any_flag[:, j])
+                column_result["windows"] = self._windows(flagged, labels)
+                column_result["top_points"] = self._top_points(flagged, X[:, j], score[:, j], labels)
+            result["columns"][str(col)] = column_result
+
+        result["total_anomalies"] = int(counts.sum())
+        result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        logger.info(
+            f"异常检测完成: {X.shape[0]} 行 x {X.shape[1]} 列, "
+            f"异常点 {result['total_anomalies']}, 耗时 {result['elapsed_ms']}ms"
+        )
+        return result
+
+    def _rolling_zscore(self, num: pd.DataFrame):
+        """滚动Z分数：以前一窗口的均值/标准差衡量当前点，避免异常点稀释自身"""
+        window = self.zscore_window
+        roll = num.rolling(window, min_periods=max(5, window // 5))
+        mean = roll.mean().shift(1).to_numpy()
+        std = roll.std().shift(1).to_numpy()
+        with np.errstate(all="ignore"):
+            z = (num.to_numpy() - mean) / std
+        z[~np.isfinite(z)] = np.nan
+        return np.abs(np.nan_to_num(z)) > self.zscore_threshold, z
+
+    def _iqr(self, X: np.ndarray) -> np.ndarray:
+        """四分位距检测"""
+        q1, q3 = np.nanpercentile(X, [25, 75], axis=0)
+        iqr = q3 - q1
+        with np.errstate(invalid="ignore"):
+            flags = (X < q1 - self.iqr_k * iqr) | (X > q3 + self.iqr_k * iqr)
+        return flags & (iqr > 0)
+
+    def _mad(self, X: np.ndarray):
+        """中位数绝对偏差（稳健Z分数）检测"""
+        median = np.nanmedian(X, axis=0)
+        deviation = np.abs(X - median)
+        mad = np.nanmedian(deviation, axis=0) * 1.4826
+        with np.errstate(all="ignore"):
+            robust = deviation / mad
+        robust[:, ~(mad > 0)] = np.nan
+        with np.errstate(invalid="ignore"):
+            flags = robust > self.mad_threshold
+        return flags, robust
+
+    def _rate_of_change(
+        self,
+        X: np.ndarray,
+        times: Optional[pd.Series],
+        columns: List[str],
+        rate_limits: Dict[str, float]
+    ) -> np.ndarray:
+        """变化率检测：有时间列时按秒计算，指定上限的列使用绝对阈值，其余列使用差分的稳健阈值"""
+        diff = np.empty_like(X)
+        diff[0] = np.nan
+        diff[1:] = X[1:] - X[:-1]
+
+        if times is not None:
+            seconds = time_to_seconds(times)
+            dt = np.empty(len(seconds))
+            dt[0] = np.nan
+            dt[1:] = seconds[1:] - seconds[:-1]
+            dt[~(dt > 0)] = np.nan
+            rate = diff / dt[:, None]
+        else:
+            rate = diff
+
+        median = np.nanmedian(rate, axis=0)
+        mad = np.nanmedian(np.abs(rate - median), axis=0) * 1.4826
+        with np.errstate(invalid="ignore"):
+            flags = (np.abs(rate - median) > self.rate_threshold * mad) & (mad > 0)
+
+        for j, col in enumerate(columns):
+            limit = rate_limits.get(col)
+            if limit is not None:
+                with np.errstate(invalid="ignore"):
+                    flags[:, j] = np.abs(rate[:, j]) > limit
+        return flags
+
+    def _stuck(self, X: np.ndarray):
+        """卡死检测：同一数值连续重复达到 stuck_min_run 次（整列恒定的列单独标记，不计入异常）"""
+        same = np.zeros(X.shape, dtype=bool)
+        same[1:] = X[1:] == X[:-1]
+
+        # 向量化游程计数：累计和减去最近一次中断时的累计值
+        cumulative = np.cumsum(same, axis=0)
+        reset = np.where(same, 0, cumulative)
+        run = cumulative - np.maximum.accumulate(reset, axis=0)
+
+        with np.errstate(all="ignore"):
+            constant = np.nanstd(X, axis=0) == 0
+        flags = (run >= self.stuck_min_run - 1) & ~constant
+        episodes = ((run == self.stuck_min_run - 1) & ~constant).sum(axis=0)
+        return flags, episodes, constant
+
+    def _row_labels(self, index: np.ndarray, times: Optional[pd.Series]) -> List[Any]:
+        """行标识：有时间列时使用时间戳，否则使用原始行号"""
+        if times is None:
+            return index
+
+        return times.to_numpy()
+
+    def _windows(self, flagged: np.ndarray, labels) -> List[Dict[str, Any]]:
+        """将相邻的异常点合并为异常窗口，返回点数最多的前N个窗口"""
+        breaks = np.flatnonzero(np.diff(flagged) > self.window_gap + 1)
+        starts = np.concatenate(([0], breaks + 1))
+        ends = np.concatenate((breaks, [len(flagged) - 1]))
+        sizes = ends - starts + 1
+        top = np.argsort(-sizes, kind="stable")[:self.top_n]
+        return [
+            {
+                "start": format_label(labels, flagged[starts[k]]),
+                "end": format_label(labels, flagged[ends[k]]),
+                "count": int(sizes[k])
+            }
+            for k in sorted(top, key=lambda k: starts[k])
+        ]
+
+    def _top_points(self, flagged: np.ndarray, values: np.ndarray, score: np.ndarray, labels) -> List[Dict[str, Any]]:
+        """评分最高的异常点"""
+        top = flagged[np.argsort(-score[flagged], kind="stable")[:self.top_n]]
+        return [
+            {
+                "at": format_label(labels, i),
+                "value": round_value(values[i]),
+                "score": round_value(score[i])
+            }
+            for i in top
+        ]
+
+
+anomaly_detector = AnomalyDetector()
@@ -0,0 +1,403 @@
+import csv
+import io
+import os
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.simulation_plan import SimulationPlan, NUMERIC_KINDS, classify_column
+from app.services.simulation_signals import new_seed
+
+logger = logging.getLogger(__name__)
+
+DATASET_FORMATS = ("csv", "parquet", "sql")
+DATASET_BATCH_SIZE = 50000
+# 按文件大小生成时，首批只写入少量行以估算平均行大小，之后各批据此控制写入量
+DATASET_PROBE_ROWS = 1000
+# .sql 转储中每条扩展 INSERT 的行数（与 mysqldump --extended-insert 类似）
+SQL_ROWS_PER_INSERT = 1000
+ROW_ID_COLUMN = "id"
+
+# 默认列：设备编号、采集时间，其后按组重复数值与状态列
+BASE_COLUMNS = ["设备编号", "采集时间"]
+COLUMN_GROUP = ["温度", "压力", "电流", "电压", "功率", "效率", "转速", "运行状态"]
+
+_SQL_TYPES = {"int": "bigint", "float": "double", "datetime": "datetime", "string": "varchar(64)"}
+
+
+def dataset_columns(width: int) -> List[str]:
+    """生成 width 列的列名（按字段类型关键字命名，使模拟计划识别出对应的取值范围）"""
+    columns = BASE_COLUMNS[:max(0, width)]
+    group = 1
+    while len(columns) < width:
+        for name in COLUMN_GROUP:
+            if len(columns) >= width:
+                break
+            columns.append(f"{name}_{group}")
+        group += 1
+    return columns
+
+
+def column_types(plan: SimulationPlan) -> Dict[str, str]:
+    """各列的输出类型：int / float / datetime / string"""
+    types = {}
+    for gen in plan.generators:
+        if gen.numeric:
+            types[gen.name] = "int" if gen.decimals is None else "float"
+        elif gen.kind == "time":
+            types[gen.name] = "datetime"
+        else:
+            types[gen.name] = "string"
+    return types
+
+
+def _timestamps(start: np.datetime64, step: float, first: int, n: int) -> np.ndarray:
+    """第 first 行起 n 行的采集时间（datetime64[ms]，按 step 秒递增）"""
+    offsets = np.round(np.arange(first, first + n) * step * 1000).astype("timedelta64[ms]")
+    return start + offsets
+
+
+def _text_columns(
+    data: Dict[str, Tuple[np.ndarray, Optional[np.ndarray]]],
+    columns: List[str]
+) -> List[List[Any]]:
+    """按列转为 Python 值列表，缺失为 None；时间为 YYYY-MM-DD HH:MM:SS（有毫秒时保留毫秒）"""
+    result = []
+    for name in columns:
+        values, missing = data[name]
+        if values.dtype.kind == "M":
+            unit = "ms" if (values.astype(np.int64) % 1000).any() else "s"
+            values = np.char.replace(np.datetime_as_string(values, unit=unit), "T", " ")
+        items = values.tolist()
+        if missing is not None:
+            for i in np.flatnonzero(missing).tolist():
+                items[i] = None
+        result.append(items)
+    return result
+
+
+class CSVDatasetWriter:
+    """CSV 流式写入（UTF-8，首行为列名，缺失值为空）"""
+
+    def __init__(self, file, columns: List[str], types: Dict[str, str], table: str):
+        self.file = file
+        self.columns = columns
+        self._write_text(lambda writer: writer.writerow(columns))
+
+    def _write_text(self, fill) -> None:
+        buffer = io.StringIO()
+        fill(csv.writer(buffer, lineterminator="\n"))
+        self.file.write(buffer.getvalue().encode("utf-8"))
+
+    def write(self, data: Dict[str, Tuple[np.ndarray, Optional[np.ndarray]]], n: int) -> None:
+        rows = zip(*_text_columns(data, self.columns))
+        self._write_text(lambda writer: writer.writerows(rows))
+
+    def close(self) -> None:
+        pass
+
+
+class ParquetDatasetWriter:
+    """Parquet 流式写入（每批一个行组，需要安装 pyarrow）"""
+
+    def __init__(self, file, columns: List[str], types: Dict[str, str], table: str):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        self.columns = columns
+        arrow_types = {"int": pa.int64(), "float": pa.float64(), "datetime": pa.timestamp("ms"), "string": pa.string()}
+        self.schema = pa.schema([(name, arrow_types[types[name]]) for name in columns])
+        self.writer = pq.ParquetWriter(file, self.schema, compression="snappy")
+
+    def write(self, data: Dict[str, Tuple[np.ndarray, Optional[np.ndarray]]], n: int) -> None:
+        pa = self.pa
+        arrays = []
+        for field in self.schema:
+            values, missing = data[field.name]
+            if pa.types.is_string(field.type):
+                # 编号列的异常值为数值，统一为字符串
+                values = values.astype(str)
+            array = pa.array(values, mask=missing)
+            arrays.append(array if array.type == field.type else array.cast(field.type, safe=False))
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+def _sql_literals(items: List[Any], kind: str) -> List[str]:
+    if kind in ("int", "float"):
+        return ["NULL" if v is None else str(v) for v in items]
+    return [
+        "NULL" if v is None else "'" + str(v).replace("\\", "\\\\").replace("'", "\\'") + "'"
+        for v in items
+    ]
+
+
+class SQLDumpWriter:
+    """MySQL 转储流式写入（mysqldump 格式：DROP/CREATE TABLE，LOCK TABLES 内的扩展 INSERT）"""
+
+    def __init__(self, file, columns: List[str], types: Dict[str, str], table: str):
+        self.file = file
+        self.columns = columns
+        self.kinds = [types[name] for name in columns]
+        self.table = table
+        definitions = [
+            f"  `{name}` {'bigint NOT NULL' if name == ROW_ID_COLUMN else _SQL_TYPES[types[name]] + ' DEFAULT NULL'}"
+            for name in columns
+        ]
+        if ROW_ID_COLUMN in columns:
+            definitions.append(f"  PRIMARY KEY (`{ROW_ID_COLUMN}`)")
+        self._write(
+            f"\n--\n-- Table structure for table `{table}`\n--\n\n"
+            f"DROP TABLE IF EXISTS `{table}`;\n"
+            f"CREATE TABLE `{table}` (\n" + ",\n".join(definitions) + "\n"
+            ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;\n\n"
+            f"--\n-- Dumping data for table `{table}`\n--\n\n"
+            f"LOCK TABLES `{table}` WRITE;\n"
+        )
+
+    def _write(self, text: str) -> None:
+        self.file.write(text.encode("utf-8"))
+
+    def write(self, data: Dict[str, Tuple[np.ndarray, Optional[np.ndarray]]], n: int) -> None:
+        literals = [
+            _sql_literals(items, kind)
+            for items, kind in zip(_text_columns(data, self.columns), self.kinds)
+        ]
+        rows = ["(" + ",".join(row) + ")" for row in zip(*literals)]
+        prefix = f"INSERT INTO `{self.table}` VALUES "
+        self._write("".join(
+            prefix + ",".join(rows[i:i + SQL_ROWS_PER_INSERT]) + ";\n"
+            for i in range(0, len(rows), SQL_ROWS_PER_INSERT)
+        ))
+
+    def close(self) -> None:
+        self._write("UNLOCK TABLES;\n")
+
+
+WRITERS = {"csv": CSVDatasetWriter, "parquet": ParquetDatasetWriter, "sql": SQLDumpWriter}
+
+SQL_DUMP_HEADER = (
+    "-- MySQL dump (synthetic dataset generated by equipment-analysis)\n"
+    "-- Generated: {generated}\n\n"
+    "SET NAMES utf8mb4;\n"
+    "SET FOREIGN_KEY_CHECKS=0;\n"
+)
+SQL_DUMP_FOOTER = "\nSET FOREIGN_KEY_CHECKS=1;\n"
+
+
+def dataset_format(path: str, fmt: Optional[str] = None) -> str:
+    """输出格式：未指定时按扩展名判断"""
+    fmt = (fmt or os.path.splitext(path)[1].lstrip(".")).lower()
+    if fmt not in DATASET_FORMATS:
+        raise ValueError(f"不支持的数据集格式: {fmt or path}（支持 {', '.join(DATASET_FORMATS)}）")
+    return fmt
+
+
+def write_table(
+    path: str,
+    fmt: str,
+    table: str,
+    columns: List[str],
+    rows: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+    analysis_features: Optional[Dict[str, Any]] = None,
+    fault_rate: float = 0.0,
+    seed: Optional[int] = None,
+    start: Optional[str] = None,
+    step: float = 1.0,
+    batch_size: int = DATASET_BATCH_SIZE
+) -> Dict[str, Any]:
+    """
+    生成一张表并流式写入文件（每批整列生成后立即写出，内存只保留一批）
+
+    Args:
+        path: 输出文件
+        fmt: csv / parquet / sql（sql 只写入该表的建表与 INSERT 语句，见 generate_dataset）
+        table: 表名
+        columns: 列名（不含行号列 id）
+        rows: 行数；为空时写到 max_bytes 为止
+        max_bytes: 文件大小上限（字节），首批以 DATASET_PROBE_ROWS 行估算行大小，达到后在当前批结束处停止
+        analysis_features: 字段特征（missing_rate、anomaly_rate、value_range、signal）
+        fault_rate: 每个数值列每步随机发生故障片段的概率
+        seed: 随机种子（同样的参数与种子生成相同的数据）
+        start: 首行采集时间，默认当天零点；时间列按 step 秒递增
+        step: 相邻两行的时间间隔（秒）
+        batch_size: 每批行数（Parquet 每批一个行组）
+    """
+    if rows is None and max_bytes is None:
+        raise ValueError("需要指定行数或文件大小")
+    plan = SimulationPlan(columns, analysis_features, fault_rate, seed)
+    types = {ROW_ID_COLUMN: "int", **column_types(plan)}
+    time_columns = [name for name, kind in types.items() if kind == "datetime"]
+    output_columns = [ROW_ID_COLUMN] + [name for name in columns if name != ROW_ID_COLUMN]
+    origin = np.datetime64(start or datetime.now().strftime("%Y-%m-%d"), "ms")
+    batch_size = max(1, batch_size)
+
+    started = time.perf_counter()
+    written = 0
+    with open(path, "wb") as file:
+        writer = WRITERS[fmt](file, output_columns, types, table)
+        try:
+            while rows is None or written < rows:
+                n = batch_size if rows is None else min(batch_size, rows - written)
+                if max_bytes is not None and not written:
+                    n = min(n, DATASET_PROBE_ROWS)
+                elif max_bytes is not None:
+                    # 按已写入的平均行大小缩小最后一批，使文件大小接近上限
+                    remaining = max_bytes - file.tell()
+                    n = max(1, min(n, -(-remaining * written // max(1, file.tell()))))
+                data = plan.generate_columns(n, start_index=written)
+                data[ROW_ID_COLUMN] = (data.pop("_index")[0] + 1, None)
+                for name in time_columns:
+                    data[name] = (_timestamps(origin, step, written, n), data[name][1])
+                writer.write(data, n)
+                written += n
+                if max_bytes is not None and file.tell() >= max_bytes:
+                    break
+        finally:
+            writer.close()
+        size = file.tell()
+
+    seconds = time.perf_counter() - started
+    logger.info(f"数据集表生成完成: {table} {written} 行, {size / 1024 / 1024:.1f} MB, 耗时 {seconds:.1f}s")
+    return {
+        "table": table,
+        "path": path,
+        "rows": written,
+        "columns": len(output_columns),
+        "bytes": size,
+        "seed": plan.seed,
+        "seconds": round(seconds, 3)
+    }
+
+
+def _write_table_job(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    return write_table(**kwargs)
+
+
+def generate_dataset(
+    path: str,
+    fmt: Optional[str] = None,
+    rows: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+    width: int = 20,
+    columns: Optional[List[str]] = None,
+    tables: int = 1,
+    table_prefix: str = "sensor_data",
+    missing_rate: float = 0.0,
+    anomaly_rate: float = 0.0,
+    signal: Optional[str] = None,
+    fault_rate: float = 0.0,
+    seed: Optional[int] = None,
+    start: Optional[str] = None,
+    step: float = 1.0,
+    batch_size: int = DATASET_BATCH_SIZE,
+    workers: int = 1
+) -> Dict[str, Any]:
+    """
+    生成大规模模拟数据集（基于 SimulationPlan 的列生成器：连续信号、缺失、异常值与故障片段）
+
+    多张表时第 i 张表使用种子 seed + i，可由多个进程并行生成；.sql 转储的各表先写入分片文件，
+    再依次拼接到同一个转储文件中，CSV / Parquet 每张表一个文件（文件名追加表名）。
+
+    Args:
+        path: 输出文件
+        fmt: csv / parquet / sql，默认按扩展名判断
+        rows: 每张表的行数；为空时按 max_bytes 写到文件大小上限
+        max_bytes: 输出总大小上限（字节），多张表时平均分配
+        width: 列数（未指定 columns 时按 dataset_columns 生成列名）
+        columns: 列名
+        tables: 表数量
+        table_prefix: 表名前缀（多张表时追加序号）
+        missing_rate: 数值列缺失率
+        anomaly_rate: 数值列异常值比例
+        signal: 数值列信号类型（ou / random_walk / ramp / drift）
+        fault_rate: 故障片段发生概率（每列每步）
+        seed: 随机种子，默认随机生成（在结果中返回）
+        start: 首行采集时间
+        step: 相邻两行的时间间隔（秒）
+        batch_size: 每批行数
+        workers: 并行进程数（多张表时生效）
+
+    Returns:
+        {path, format, seed, rows, bytes, seconds, tables: [各表结果]}
+    """
+    fmt = dataset_format(path, fmt)
+    if rows is None and max_bytes is None:
+        raise ValueError("需要指定行数或文件大小")
+    if rows is not None and rows < 0:
+        raise ValueError("行数不能为负数")
+    tables = max(1, tables)
+    columns = list(columns) if columns else dataset_columns(width)
+    seed = new_seed() if seed is None else int(seed)
+    features = {}
+    for name in columns:
+        if classify_column(name) in NUMERIC_KINDS:
+            feature = {"missing_rate": missing_rate, "anomaly_rate": anomaly_rate}
+            if signal:
+                feature["signal"] = signal
+            features[name] = feature
+
+    stem, ext = os.path.splitext(path)
+    jobs = []
+    for i in range(tables):
+        table = table_prefix if tables == 1 else f"{table_prefix}_{i + 1}"
+        if fmt == "sql":
+            table_path = f"{path}.part{i}"
+        else:
+            table_path = path if tables == 1 else f"{stem}_{table}{ext}"
+        jobs.append({
+            "path": table_path,
+            "fmt": fmt,
+            "table": table,
+            "columns": columns,
+            "rows": rows,
+            "max_bytes": max_bytes // tables if max_bytes is not None else None,
+            "analysis_features": features,
+            "fault_rate": fault_rate,
+            "seed": seed + i,
+            "start": start,
+            "step": step,
+            "batch_size": batch_size
+        })
+
+    started = time.perf_counter()
+    if workers > 1 and tables > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, tables)) as executor:
+            results = list(executor.map(_write_table_job, jobs))
+    else:
+        results = [_write_table_job(job) for job in jobs]
+
+    if fmt == "sql":
+        with open(path, "wb") as dump:
+            dump.write(SQL_DUMP_HEADER.format(generated=datetime.now().isoformat(timespec="seconds")).encode("utf-8"))
+            for job, result in zip(jobs, results):
+                with open(job["path"], "rb") as part:
+                    while True:
+                        chunk = part.read(1 << 20)
+                        if not chunk:
+                            break
+                        dump.write(chunk)
+                os.remove(job["path"])
+                result["path"] = path
+            dump.write(SQL_DUMP_FOOTER.encode("utf-8"))
+        total_bytes = os.path.getsize(path)
+    else:
+        total_bytes = sum(result["bytes"] for result in results)
+
+    return {
+        "path": path,
+        "format": fmt,
+        "seed": seed,
+        "rows": sum(result["rows"] for result in results),
+        "bytes": total_bytes,
+        "seconds": round(time.perf_counter() - started, 3),
+        "tables": results
+    }
@@ -0,0 +1,31 @@
+"""文档文本提取（在子进程中执行，保持轻量：不导入数据库、向量库等模块）"""
+from typing import Iterator, List
+
+
+def pdf_page_count(file_path: str) -> int:
+    """PDF 页数"""
+    from pypdf import PdfReader
+    return len(PdfReader(file_path).pages)
+
+
+def extract_pdf_pages(file_path: str, start: int, end: int) -> List[str]:
+    """提取 PDF 第 [start, end) 页的文本（每个子进程独立打开文件）"""
+    from pypdf import PdfReader
+    reader = PdfReader(file_path)
+    pages = []
+    for index in range(start, end):
+        try:
+            pages.append(reader.pages[index].extract_text() or "")
+        except Exception:
+            pages.append("")
+    return pages
+
+
+def iter_txt_blocks(file_path: str, block_size: int = 1024 * 1024) -> Iterator[str]:
+    """按块读取 TXT 文本"""
+    with open(file_path, "r", encoding="utf-8") as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            yield block
@@ -0,0 +1,253 @@
+import os
+import re
+import zlib
+import sqlite3
+import hashlib
+import threading
+import logging
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.core.cache import LRUCache
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9_\-\.]*|[一-鿿]+")
+
+
+class HashingEmbeddings(Embeddings):
+    """哈希字符 n-gram 向量化（完全离线，无需模型文件）
+
+    中文按字符 1~3-gram、英文/编号按完整词及字符 3-gram 切分，
+    经 CRC32 哈希到固定维度（带符号哈希降低碰撞偏差），次线性词频加权后 L2 归一化。
+    """
+
+    def __init__(self, dim: int = 1024, ngram_range=(1, 3)):
+        self.dim = dim
+        self.ngram_range = ngram_range
+        self.model_id = f"hashing-{dim}-{ngram_range[0]}{ngram_range[1]}"
+
+    def _features(self, text: str) -> List[str]:
+        features = []
+        low, high = self.ngram_range
+        for token in _TOKEN_PATTERN.findall(text.lower()):
+            if token[0].isascii():
+                features.append(f"w:{token}")
+                padded = f" {token} "
+                features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+            else:
+                for n in range(low, high + 1):
+                    features.extend(token[i:i + n] for i in range(len(token) - n + 1))
+        return features
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            hashes = np.fromiter(
+                (zlib.crc32(f.encode("utf-8")) for f in self._features(text)),
+                dtype=np.uint32
+            )
+            if hashes.size == 0:
+                continue
+            index = (hashes % self.dim).astype(np.int64)
+            sign = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+            np.add.at(matrix[row], index, sign)
+
+        matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text])[0].tolist()
+
+
+class SentenceTransformerEmbeddings(Embeddings):
+    """本地句向量模型（sentence-transformers，CPU 运行，模型可预先下载到本地目录）"""
+
+    def __init__(self, model_name_or_path: str, batch_size: int = 32):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name_or_path, device="cpu")
+        self.batch_size = batch_size
+        self.model_id = f"st-{os.path.basename(model_name_or_path.rstrip('/'))}"
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(
+            texts,
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            show_progress_bar=False,
+            convert_to_numpy=True
+        )
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text])[0].tolist()
+
+
+class CachedEmbeddings(Embeddings):
+    """带持久化缓存的向量化包装：按 (模型, 文本哈希) 缓存向量，相同文本不重复计算；未命中的文本分批计算
+
+    只持久化文档片段的向量；查询文本数量不受控，仅缓存在进程内 LRU 中。
+    """
+
+    def __init__(
+        self,
+        underlying: Embeddings,
+        model_id: str,
+        cache_path: str,
+        batch_size: int = 64,
+        query_cache_size: int = 1024
+    ):
+        self.underlying = underlying
+        self.model_id = model_id
+        self.batch_size = batch_size
+        self.cache_path = cache_path
+        self._query_cache = LRUCache(maxsize=query_cache_size)
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embedding_cache (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_id}\0{text}".encode("utf-8")).hexdigest()
+
+    def _lookup(self, keys: List[str]) -> dict:
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embedding_cache WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                found.update((key, np.frombuffer(blob, dtype=np.float32).tolist()) for key, blob in rows)
+        return found
+
+    def _store(self, items: List[tuple]):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embedding_cache (key, vector) VALUES (?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items]
+            )
+            self._conn.commit()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        cached = self._lookup(list(set(keys)))
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        if missing:
+            missing_keys = list(missing)
+            for start in range(0, len(missing_keys), self.batch_size):
+                batch_keys = missing_keys[start:start + self.batch_size]
+                vectors = self.underlying.embed_documents([missing[k] for k in batch_keys])
+                self._store(list(zip(batch_keys, vectors)))
+                cached.update(zip(batch_keys, vectors))
+            logger.info(f"向量化: {len(texts)} 条文本，缓存命中 {len(texts) - len(missing)}，新计算 {len(missing)}")
+
+        return [list(cached[key]) for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        cached = self._query_cache.get(text)
+        if cached is not None:
+            return list(cached)
+        vector = self.underlying.embed_query(text)
+        self._query_cache.set(text, tuple(vector))
+        return vector
+
+
+_embeddings: Optional[CachedEmbeddings] = None
+_embeddings_lock = threading.Lock()
+
+
+def _create_backend(backend: str):
+    """按配置创建向量化后端，返回 (embeddings, model_id)"""
+    if backend == "openai":
+        from langchain_openai import OpenAIEmbeddings
+        embeddings = OpenAIEmbeddings(
+            model="text-embedding-3-small",
+            openai_api_key=settings.OPENAI_API_KEY
+        )
+        return embeddings, "openai-text-embedding-3-small"
+
+    if backend == "local":
+        model = SentenceTransformerEmbeddings(settings.LOCAL_EMBEDDING_MODEL, batch_size=settings.EMBEDDING_BATCH_SIZE)
+        return model, model.model_id
+
+    if backend == "hashing":
+        model = HashingEmbeddings(dim=settings.HASHING_EMBEDDING_DIM)
+        return model, model.model_id
+
+    raise ValueError(f"不支持的向量化后端: {backend}")
+
+
+def _resolve_backends() -> List[str]:
+    backend = settings.EMBEDDING_BACKEND
+    if backend != "auto":
+        return [backend]
+
+    # auto: 有 OpenAI Key 用 OpenAI，其次本地句向量模型，最后哈希向量化兜底（均可离线运行）
+    backends = ["openai"] if settings.OPENAI_API_KEY else []
+    if settings.LOCAL_EMBEDDING_MODEL:
+        backends.append("local")
+    backends.append("hashing")
+    return backends
+
+
+def get_embeddings() -> Optional[CachedEmbeddings]:
+    """获取共享的向量化客户端（带持久化缓存），所有后端均不可用时返回 None"""
+    global _embeddings
+    if _embeddings is not None:
+        return _embeddings
+
+    with _embeddings_lock:
+        if _embeddings is not None:
+            return _embeddings
+
+        for backend in _resolve_backends():
+            try:
+                underlying, model_id = _create_backend(backend)
+            except Exception as e:
+                logger.warning(f"向量化后端 {backend} 不可用: {str(e)}")
+                continue
+
+            _embeddings = CachedEmbeddings(
+                underlying,
+                model_id,
+                os.path.join(settings.BASE_DIR, "data", "embedding_cache.db"),
+                batch_size=settings.EMBEDDING_BATCH_SIZE,
+                query_cache_size=settings.QUERY_EMBEDDING_CACHE_SIZE
+            )
+            logger.info(f"使用向量化后端: {backend} ({model_id})")
+            break
+        else:
+            logger.error("没有可用的向量化后端，RAG 功能已禁用")
+
+    return _embeddings
+
+
+def collection_name(base: str = "langchain") -> str:
+    """向量库集合名：OpenAI 保持原集合名兼容已有数据，其它后端按模型区分，避免向量维度冲突"""
+    embeddings = get_embeddings()
+    if embeddings is None or embeddings.model_id.startswith("openai-"):
+        return base
+    slug = re.sub(r"[^a-zA-Z0-9_-]", "_", embeddings.model_id)
+    return f"{base}_{slug}"[:63]
@@ -0,0 +1,158 @@
+import re
+from bisect import bisect_left
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# 分析文本中的特征关键字（“缺失率”“异常值”等以关键字开头，无需单独列出）
+FEATURE_KEYWORDS: Dict[str, str] = {
+    "missing_rate": "缺失",
+    "anomaly_rate": "异常",
+}
+
+# 列名与关键字、关键字与百分比之间允许的最大字符数（不跨越句号与换行）
+FEATURE_WINDOW = 20
+
+_TOKENS = re.compile(
+    "(?P<keyword>" + "|".join(map(re.escape, FEATURE_KEYWORDS.values())) + ")"
+    r"|(?P<rate>\d+(?:\.\d+)?)\s*[%％]"
+    r"|(?P<boundary>[。\n])"
+)
+
+
+class KeywordAutomaton:
+    """
+    多模式匹配自动机（Aho–Corasick）- 一次扫描文本找出所有模式的全部出现位置（含重叠）
+
+    模式按原文匹配（不作为正则解释），列名中含 ( ) + * 等字符时同样适用。
+    """
+
+    def __init__(self, patterns: List[str]):
+        self.patterns = list(patterns)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[int]] = [[]]
+
+        for index, pattern in enumerate(self.patterns):
+            if not pattern:
+                continue
+            node = 0
+            for char in pattern:
+                next_node = self._goto[node].get(char)
+                if next_node is None:
+                    next_node = len(self._goto)
+                    self._goto[node][char] = next_node
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                node = next_node
+            self._output[node].append(index)
+
+        # 按层次计算失配指针，并把失配链上的输出合并到当前节点
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def finditer(self, text: str) -> Iterator[Tuple[int, int, int]]:
+        """依次产出 (起始位置, 结束位置, 模式下标)，按结束位置排序"""
+        goto, fail, output = self._goto, self._fail, self._output
+        lengths = [len(pattern) for pattern in self.patterns]
+        node = 0
+        for position, char in enumerate(text):
+            next_node = goto[node].get(char)
+            while next_node is None and node:
+                node = fail[node]
+                next_node = goto[node].get(char)
+            node = next_node or 0
+            if output[node]:
+                for index in output[node]:
+                    yield position + 1 - lengths[index], position + 1, index
+
+
+def _parse_rate(value: str) -> float:
+    return float(value) / 100
+
+
+def extract_column_features(
+    content: str,
+    columns: List[str],
+    automaton: Optional[KeywordAutomaton] = None
+) -> Dict[str, Dict[str, float]]:
+    """
+    从分析文本中提取各列的缺失率与异常率
+
+    文本只扫描两遍：一遍正则切出关键字、百分比与分句位置，一遍自动机找出所有列名的出现位置。
+    列名之后 FEATURE_WINDOW 个字符内（同一分句）出现关键字、关键字之后同样范围内出现百分比时记为该列特征，
+    均取最近的一个；同一列多次出现时以第一次能匹配到的为准。百分比换算为小数（5% 记为 0.05）。
+
+    Args:
+        content: 分析文本
+        columns: 列名
+        automaton: 以小写列名编译的 KeywordAutomaton（可复用），默认临时编译
+    """
+    if not content or not columns:
+        return {}
+    text = content.lower()
+    if automaton is None:
+        automaton = KeywordAutomaton([col.lower() for col in columns])
+
+    keyword_kinds = {keyword: kind for kind, keyword in FEATURE_KEYWORDS.items()}
+    keywords: Dict[str, List[Tuple[int, int]]] = {kind: [] for kind in FEATURE_KEYWORDS}
+    rate_starts: List[int] = []
+    rates: List[str] = []
+    boundaries: List[int] = []
+    for match in _TOKENS.finditer(text):
+        group = match.lastgroup
+        if group == "keyword":
+            keywords[keyword_kinds[match.group()]].append((match.start(), match.end()))
+        elif group == "rate":
+            rate_starts.append(match.start())
+            rates.append(match.group("rate"))
+        else:
+            boundaries.append(match.start())
+    keyword_starts = {kind: [start for start, _ in spans] for kind, spans in keywords.items()}
+
+    def same_clause(start: int, end: int) -> bool:
+        return bisect_left(boundaries, start) == bisect_left(boundaries, end)
+
+    def rate_after(position: int) -> Optional[float]:
+        i = bisect_left(rate_starts, position)
+        if i < len(rate_starts) and rate_starts[i] - position <= FEATURE_WINDOW and same_clause(position, rate_starts[i]):
+            return _parse_rate(rates[i])
+        return None
+
+    def feature_after(kind: str, position: int) -> Optional[float]:
+        starts, spans = keyword_starts[kind], keywords[kind]
+        i = bisect_left(starts, position)
+        while i < len(starts) and starts[i] - position <= FEATURE_WINDOW and same_clause(position, starts[i]):
+            rate = rate_after(spans[i][1])
+            if rate is not None:
+                return rate
+            i += 1
+        return None
+
+    occurrences: Dict[int, List[int]] = {}
+    for _, end, index in automaton.finditer(text):
+        occurrences.setdefault(index, []).append(end)
+
+    features: Dict[str, Dict[str, float]] = {}
+    for index, col in enumerate(columns):
+        ends = occurrences.get(index)
+        if not ends:
+            continue
+        col_features = {}
+        for kind in FEATURE_KEYWORDS:
+            for end in ends:
+                rate = feature_after(kind, end)
+                if rate is not None:
+                    col_features[kind] = rate
+                    break
+        if col_features:
+            features[col] = col_features
+    return features
@@ -8,6 +8,8 @@ from typing import Dict, List, Any, Optional
 from datetime import datetime
 import logging
 
+from app.core.config import settings
+
 logger = logging.getLogger(__name__)
 
 
@@ -47,13 +49,15 @@ class MDBParser(DatabaseParser):
             }
 
             for table_name in tables:
-                df = self.read_table(file_path, table_name)
+                df = self.read_table(file_path, table_name, limit=settings.TABLE_DATA_MAX_ROWS)
                 if not df.empty:
+                    rows = df.to_dict(orient="records")
                     result["tables"].append({
                         "table_name": table_name,
                         "columns": list(df.columns),
                         "row_count": len(df),
-                        "preview": df.head(10).to_dict(orient="records")
+                        "preview": rows[:10],
+                        "rows": rows
                     })
                     result["total_records"] += len(df)
 
@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+TIME_KEYWORDS = ['时间', '日期', 'time', 'date', 'timestamp']
+
+
+def rows_to_frame(rows: List[Dict[str, Any]], columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """将 TableData 中的行数据转换为 DataFrame"""
+    if not rows:
+        return pd.DataFrame(columns=columns or [])
+
+    df = pd.DataFrame.from_records(rows)
+    if columns:
+        ordered = [c for c in columns if c in df.columns]
+        df = df[ordered + [c for c in df.columns if c not in ordered]]
+    return df
+
+
+def detect_time_column(df: pd.DataFrame) -> Optional[str]:
+    """自动识别时间列：优先按列名关键字，其次按可解析为时间的比例"""
+    if df.empty:
+        return None
+
+    candidates = [
+        col for col in df.columns
+        if any(keyword in str(col).lower() for keyword in TIME_KEYWORDS)
+    ]
+    candidates += [col for col in df.columns if col not in candidates and df[col].dtype == object]
+
+    for col in candidates:
+        series = df[col]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            return col
+        if pd.api.types.is_numeric_dtype(series):
+            continue
+        sample = series.dropna().head(50)
+        if sample.empty:
+            continue
+        parsed = pd.to_datetime(sample, errors="coerce", format="mixed")
+        if parsed.notna().mean() >= 0.9:
+            return col
+
+    return None
+
+
+def parse_time_column(df: pd.DataFrame, time_column: Optional[str]) -> Optional[pd.Series]:
+    """将时间列解析为 datetime，无法解析时返回 None"""
+    if not time_column or time_column not in df.columns:
+        return None
+    try:
+        parsed = pd.to_datetime(df[time_column], errors="coerce", format="mixed")
+    except Exception as e:
+        logger.warning(f"时间列解析失败: {time_column}, {str(e)}")
+        return None
+    if parsed.notna().sum() == 0:
+        return None
+    if getattr(parsed.dt, "tz", None) is not None:
+        parsed = parsed.dt.tz_localize(None)
+    return parsed
+
+
+def time_to_seconds(times: pd.Series) -> np.ndarray:
+    """datetime 序列转为 Unix 秒（float），NaT 转为 NaN"""
+    seconds = times.to_numpy().astype("datetime64[ns]").astype(np.int64) / 1e9
+    seconds[times.isna().to_numpy()] = np.nan
+    return seconds
+
+
+def numeric_frame(df: pd.DataFrame, exclude: Optional[List[str]] = None) -> pd.DataFrame:
+    """提取数值列（字符串形式的数字也会被转换），返回 float64 DataFrame"""
+    exclude = set(exclude or [])
+    numeric = {}
+    for col in df.columns:
+        if col in exclude or str(col).startswith('_'):
+            continue
+        series = df[col]
+        if pd.api.types.is_bool_dtype(series):
+            continue
+        if not pd.api.types.is_numeric_dtype(series):
+            non_null = series.notna().sum()
+            series = pd.to_numeric(series, errors="coerce")
+            # 大部分值无法转换为数字的列视为文本列
+            if non_null == 0 or series.notna().sum() < non_null * 0.8:
+                continue
+        if series.notna().sum() == 0:
+            continue
+        numeric[col] = series.astype("float64")
+    return pd.DataFrame(numeric, index=df.index)
+
+
+def format_label(labels, i: int) -> Any:
+    """行标识格式化：时间戳转为 ISO 字符串，行号转为 int"""
+    value = labels[i]
+    if isinstance(value, np.datetime64):
+        return None if np.isnat(value) else pd.Timestamp(value).isoformat()
+    return int(value)
+
+
+def round_value(value: float, digits: int = 4) -> Optional[float]:
+    """数值取整，NaN/Inf 返回 None 以便 JSON 序列化"""
+    if value is None or not np.isfinite(value):
+        return None
+    return round(float(value), digits)
@@ -0,0 +1,208 @@
+import uuid
+import queue
+import threading
+import time
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.hybrid_retriever import simhash, hamming_distance
+from app.services.vector_index import VectorIndex, vector_index, ANALYSIS_HISTORY
+
+logger = logging.getLogger(__name__)
+
+
+class AnalysisHistoryStore:
+    """历史分析库写入 - 写入前按 SimHash 去除近重复结果，并按文件/表执行保留策略"""
+
+    def __init__(self, index: Optional[VectorIndex] = None):
+        self.index = index or vector_index
+
+    def _scope_where(self, metadata: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "$and": [
+                {"file_name": metadata.get("file_name", "")},
+                {"table_name": metadata.get("table_name", "")}
+            ]
+        }
+
+    def _scope_entries(self, metadata: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """同一文件/表下已有的历史记录"""
+        data = self.index.get(ANALYSIS_HISTORY, where=self._scope_where(metadata), include=["metadatas", "documents"])
+        entries = []
+        for entry_id, meta, document in zip(data.get("ids", []), data.get("metadatas", []), data.get("documents", [])):
+            meta = meta or {}
+            fingerprint = meta.get("simhash")
+            entries.append({
+                "id": entry_id,
+                "metadata": meta,
+                "simhash": int(fingerprint, 16) if fingerprint else simhash(document or ""),
+                "timestamp": meta.get("timestamp", "")
+            })
+        return entries
+
+    def save(self, text: str, metadata: Dict[str, Any]) -> str:
+        """保存一条分析结果，返回 added / duplicate"""
+        return self.save_many([(text, metadata)])[0]
+
+    def save_many(self, items: List[Tuple[str, Dict[str, Any]]]) -> List[str]:
+        """
+        批量保存分析结果：逐条近重复判定（包括同批次内），新记录一次性写入向量库
+
+        Args:
+            items: [(写入向量库的文本, 元数据)]，元数据含 file_name、table_name、analysis_type、timestamp
+        """
+        statuses = []
+        scopes: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        new_texts, new_entries, new_ids = [], [], []
+        updates: Dict[str, Dict[str, Any]] = {}
+
+        for text, metadata in items:
+            scope = (metadata.get("file_name", ""), metadata.get("table_name", ""))
+            if scope not in scopes:
+                scopes[scope] = self._scope_entries(metadata)
+            entries = scopes[scope]
+            fingerprint = simhash(text)
+
+            duplicate = next(
+                (e for e in entries if hamming_distance(fingerprint, e["simhash"]) <= settings.HISTORY_SIMHASH_DISTANCE),
+                None
+            )
+            if duplicate is not None:
+                # 近重复：不再写入新向量，仅刷新已有记录的时间与命中次数
+                duplicate["metadata"] = {
+                    **duplicate["metadata"],
+                    "timestamp": metadata.get("timestamp", datetime.now().isoformat()),
+                    "repeat_count": int(duplicate["metadata"].get("repeat_count", 1)) + 1
+                }
+                duplicate["timestamp"] = duplicate["metadata"]["timestamp"]
+                if not duplicate.get("pending"):
+                    updates[duplicate["id"]] = duplicate["metadata"]
+                statuses.append("duplicate")
+                continue
+
+            entry = {
+                "id": str(uuid.uuid4()),
+                "metadata": {**metadata, "simhash": format(fingerprint, "016x"), "repeat_count": 1},
+                "simhash": fingerprint,
+                "timestamp": metadata.get("timestamp", ""),
+                "pending": True
+            }
+            entries.append(entry)
+            new_texts.append(text)
+            new_entries.append(entry)
+            new_ids.append(entry["id"])
+            statuses.append("added")
+
+        if updates:
+            self.index.update_metadata(ANALYSIS_HISTORY, list(updates), list(updates.values()))
+        if new_texts:
+            self.index.add(ANALYSIS_HISTORY, new_texts, [entry["metadata"] for entry in new_entries], ids=new_ids)
+            for entries in scopes.values():
+                self._enforce_retention(entries)
+
+        duplicates = statuses.count("duplicate")
+        if duplicates:
+            logger.info(f"历史分析近重复，跳过写入 {duplicates} 条")
+        return statuses
+
+    def _enforce_retention(self, entries: List[Dict[str, Any]]):
+        """保留策略：同一文件/表最多保留 HISTORY_MAX_PER_TABLE 条，超过 HISTORY_RETENTION_DAYS 天的记录删除"""
+        expired = []
+        if settings.HISTORY_RETENTION_DAYS > 0:
+            cutoff = (datetime.now() - timedelta(days=settings.HISTORY_RETENTION_DAYS)).isoformat()
+            expired = [e for e in entries if e["timestamp"] and e["timestamp"] < cutoff]
+
+        remaining = sorted((e for e in entries if e not in expired), key=lambda e: e["timestamp"], reverse=True)
+        if settings.HISTORY_MAX_PER_TABLE > 0:
+            expired += remaining[settings.HISTORY_MAX_PER_TABLE:]
+
+        if expired:
+            self.index.delete(ANALYSIS_HISTORY, [e["id"] for e in expired])
+            logger.info(f"历史分析保留策略: 删除 {len(expired)} 条旧记录")
+
+
+class HistoryWriteBehind:
+    """历史分析异步写入队列 - 分析结果先入队立即返回，后台线程按条数或时间阈值批量向量化写入"""
+
+    def __init__(self, store: AnalysisHistoryStore):
+        self.store = store
+        self.queue: "queue.Queue[Optional[Tuple[str, Dict[str, Any]]]]" = queue.Queue(maxsize=settings.HISTORY_QUEUE_MAX_SIZE)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+
+    def _ensure_worker(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+                    self._thread.start()
+
+    def enqueue(self, text: str, metadata: Dict[str, Any]):
+        """入队一条分析结果（队列满时等待片刻，仍满则丢弃并记录）"""
+        self._ensure_worker()
+        try:
+            self.queue.put((text, metadata), timeout=1.0)
+        except queue.Full:
+            self.dropped += 1
+            logger.warning("历史分析写入队列已满，丢弃一条记录")
+
+    def _run(self):
+        """后台写入循环：攒满 HISTORY_FLUSH_BATCH_SIZE 条或距首条入队超过 HISTORY_FLUSH_INTERVAL 秒即写入"""
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + settings.HISTORY_FLUSH_INTERVAL
+            stop = False
+            while len(batch) < settings.HISTORY_FLUSH_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+
+            self._write(batch)
+            if stop:
+                return
+
+    def _write(self, batch: List[Tuple[str, Dict[str, Any]]]):
+        try:
+            self.store.save_many(batch)
+            self.written += len(batch)
+            logger.info(f"历史分析批量写入: {len(batch)} 条")
+        except Exception as e:
+            logger.error(f"历史分析批量写入失败: {str(e)}")
+
+    def close(self, timeout: float = 30.0):
+        """停止后台线程并写入队列中剩余的记录"""
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            self.queue.put(None)
+            thread.join(timeout=timeout)
+            if thread.is_alive():
+                # 后台线程仍在写入：不与其并发写入剩余记录，交由其处理完队列后自行退出
+                logger.warning(f"历史分析写入线程 {timeout} 秒内未结束，跳过关闭清理（队列剩余 {self.queue.qsize()} 条）")
+                return
+        self._thread = None
+
+        remaining = []
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                remaining.append(item)
+        if remaining:
+            self._write(remaining)
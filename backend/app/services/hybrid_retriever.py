@@ -0,0 +1,332 @@
+import re
+import math
+import time
+import hashlib
+import threading
+import logging
+from collections import defaultdict, Counter
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+from app.core.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+_ASCII_TOKEN = re.compile(r"[a-z0-9]+(?:[\-_\.][a-z0-9]+)*")
+_CJK_RUN = re.compile(r"[一-鿿]+")
+
+try:
+    import jieba
+    jieba.setLogLevel(logging.WARNING)
+except ImportError:
+    jieba = None
+
+
+def tokenize(text: str) -> List[str]:
+    """中文感知分词：设备编号/故障码等英数字串保留整体并拆出子串，中文按二元组（安装 jieba 时追加词语）"""
+    text = text.lower()
+    tokens = []
+
+    for match in _ASCII_TOKEN.finditer(text):
+        token = match.group()
+        tokens.append(token)
+        parts = re.split(r"[\-_\.]", token)
+        if len(parts) > 1:
+            tokens.extend(p for p in parts if p)
+            tokens.append("".join(parts))
+
+    for match in _CJK_RUN.finditer(text):
+        run = match.group()
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        if jieba is not None:
+            tokens.extend(w for w in jieba.cut_for_search(run) if len(w) > 2)
+
+    return tokens
+
+
+def simhash(text: str) -> int:
+    """64 位 SimHash 指纹（基于 tokenize 特征按词频加权），用于近重复文本判定"""
+    counts = Counter(tokenize(text))
+    if not counts:
+        return 0
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little") for term in counts],
+        dtype=np.uint64
+    )
+    weights = np.array(list(counts.values()), dtype=np.float64)
+    bits = (hashes[:, None] >> np.arange(64, dtype=np.uint64)) & np.uint64(1)
+    totals = (np.where(bits == 1, 1.0, -1.0) * weights[:, None]).sum(axis=0)
+    return int(sum(1 << i for i in np.nonzero(totals > 0)[0].tolist()))
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def content_key(text: str) -> str:
+    """以内容哈希作为融合键，BM25 与向量检索结果据此对齐"""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class BM25Index:
+    """倒排 BM25 索引（线程安全，支持增量添加与删除）"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self.doc_lengths: Dict[str, int] = {}
+        self.docs: Dict[str, Dict[str, Any]] = {}
+        self.total_length = 0
+        self._lock = threading.RLock()
+
+    def add(self, key: str, content: str, metadata: Optional[Dict[str, Any]] = None):
+        with self._lock:
+            if key in self.docs:
+                return
+            counts = Counter(tokenize(content))
+            for term, tf in counts.items():
+                self.postings[term][key] = tf
+            length = sum(counts.values())
+            self.doc_lengths[key] = length
+            self.total_length += length
+            self.docs[key] = {"content": content, "metadata": metadata or {}}
+
+    def remove(self, key: str):
+        with self._lock:
+            doc = self.docs.pop(key, None)
+            if doc is None:
+                return
+            for term in set(tokenize(doc["content"])):
+                postings = self.postings.get(term)
+                if postings is not None:
+                    postings.pop(key, None)
+                    if not postings:
+                        del self.postings[term]
+            self.total_length -= self.doc_lengths.pop(key, 0)
+
+    def search(self, query: str, k: int) -> List[tuple]:
+        """返回 [(key, score)]，按得分降序"""
+        with self._lock:
+            n = len(self.docs)
+            if n == 0:
+                return []
+            avg_length = self.total_length / n
+            scores: Dict[str, float] = defaultdict(float)
+            for term in set(tokenize(query)):
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for key, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[key] / avg_length)
+                    scores[key] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+
+class HybridRetriever:
+    """混合检索：BM25 关键词检索与向量检索按 RRF（倒数排名融合）合并，查询结果 LRU 缓存，索引写入时失效
+
+    传入 ann（见 ann_index）时，向量检索改走内存 ANN/量化索引，Chroma 仅作持久化存储。
+    索引项按内容哈希融合，并记录引用该内容的分块 ID：内容相同的分块共用一项，最后一个分块删除时才移除。
+    索引在进程内构建，每隔 refresh_interval 秒比对向量库条数，其他工作进程写入或删除后重建。
+    """
+
+    def __init__(
+        self,
+        vectorstore,
+        cache_size: int = 256,
+        rrf_k: int = 60,
+        candidates: int = 20,
+        ann=None,
+        refresh_interval: float = 30.0
+    ):
+        self.vectorstore = vectorstore
+        self.ann = ann
+        self.bm25 = BM25Index()
+        self.rrf_k = rrf_k
+        self.candidates = candidates
+        self.refresh_interval = refresh_interval
+        self._cache = LRUCache(maxsize=cache_size)
+        self._generation = 0
+        # 分块 ID -> (内容哈希, 元数据)；内容哈希 -> 引用它的分块 ID
+        self._chunks: Dict[str, tuple] = {}
+        self._owners: Dict[str, set] = {}
+        self._loaded = False
+        self._checked_at = 0.0
+        self._lock = threading.RLock()
+
+    def _ensure_loaded(self):
+        """首次检索时从向量库加载已有文本构建 BM25 索引；之后按 refresh_interval 检查是否需要重建"""
+        if self._loaded:
+            if self._stale():
+                with self._lock:
+                    logger.info("向量库已被其他进程修改，重建 BM25 索引")
+                    self._load()
+                self.invalidate()
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            self._load()
+            self._loaded = True
+            self._checked_at = time.monotonic()
+
+    def _stale(self) -> bool:
+        now = time.monotonic()
+        if self.refresh_interval <= 0 or now - self._checked_at < self.refresh_interval:
+            return False
+        self._checked_at = now
+        try:
+            return self.vectorstore._collection.count() != len(self._chunks)
+        except Exception:
+            return False
+
+    def _load(self):
+        """读取向量库全部分块，构建新的 BM25 索引与引用表后整体替换（需持有 _lock）"""
+        try:
+            include = ["documents", "metadatas"] + (["embeddings"] if self.ann is not None else [])
+            existing = self.vectorstore.get(include=include)
+            embeddings = existing.get("embeddings")
+            bm25 = BM25Index(self.bm25.k1, self.bm25.b)
+            chunks: Dict[str, tuple] = {}
+            owners: Dict[str, set] = {}
+            keys, vectors = [], []
+            for i, (chunk_id, content, metadata) in enumerate(zip(
+                existing.get("ids", []), existing.get("documents", []), existing.get("metadatas", [])
+            )):
+                if not content:
+                    continue
+                key = content_key(content)
+                chunks[chunk_id] = (key, metadata or {})
+                if key not in owners:
+                    owners[key] = set()
+                    bm25.add(key, content, metadata)
+                    if embeddings is not None:
+                        keys.append(key)
+                        vectors.append(embeddings[i])
+                owners[key].add(chunk_id)
+            if self.ann is not None:
+                self.ann.remove([key for key in self._owners if key not in owners])
+                if keys:
+                    self.ann.add(keys, vectors)
+            self.bm25, self._chunks, self._owners = bm25, chunks, owners
+            logger.info(f"BM25 索引构建完成: {len(self.bm25)} 个文档")
+        except Exception as e:
+            logger.error(f"BM25 索引构建失败: {str(e)}")
+
+    def add_texts(self, texts: List[str], metadatas: List[Dict[str, Any]], ids: Optional[List[str]] = None):
+        """写入向量库并同步更新 BM25 索引，清空查询缓存"""
+        from langchain_core.documents import Document
+
+        self._ensure_loaded()
+        documents = [Document(page_content=text, metadata=metadata) for text, metadata in zip(texts, metadatas)]
+        if ids:
+            ids = self.vectorstore.add_documents(documents, ids=ids) or ids
+        else:
+            ids = self.vectorstore.add_documents(documents)
+        fresh = []
+        with self._lock:
+            for chunk_id, text, metadata in zip(ids, texts, metadatas):
+                self._release(chunk_id)
+                key = content_key(text)
+                self._chunks[chunk_id] = (key, metadata or {})
+                if key not in self._owners:
+                    self._owners[key] = set()
+                    self.bm25.add(key, text, metadata)
+                    fresh.append(text)
+                self._owners[key].add(chunk_id)
+        if self.ann is not None and fresh:
+            # 向量化客户端带缓存，这里取回刚写入的向量不会重复计算
+            self.ann.add([content_key(text) for text in fresh], self.vectorstore.embeddings.embed_documents(fresh))
+        self.invalidate()
+
+    def _release(self, chunk_id: str) -> Optional[str]:
+        """解除分块对内容项的引用；没有其他分块引用时返回该内容哈希（需持有 _lock）"""
+        chunk = self._chunks.pop(chunk_id, None)
+        if chunk is None:
+            return None
+        key = chunk[0]
+        owners = self._owners.get(key, set())
+        owners.discard(chunk_id)
+        if owners:
+            # 元数据改为仍在的分块的元数据
+            doc = self.bm25.docs.get(key)
+            if doc is not None:
+                doc["metadata"] = self._chunks[next(iter(owners))][1]
+            return None
+        self._owners.pop(key, None)
+        self.bm25.remove(key)
+        return key
+
+    def remove_ids(self, ids: List[str]):
+        """按分块 ID 从索引中移除（向量库删除由调用方完成），内容相同的其他分块不受影响，清空查询缓存"""
+        with self._lock:
+            freed = [key for key in (self._release(chunk_id) for chunk_id in ids) if key is not None]
+        if self.ann is not None and freed:
+            self.ann.remove(freed)
+        self.invalidate()
+
+    def invalidate(self):
+        # 代数纳入缓存键，写入期间进行中的检索不会把旧结果写回缓存
+        self._generation += 1
+        self._cache.clear()
+
+    def search(self, query: str, k: int = 3) -> List[Dict[str, Any]]:
+        """混合检索，返回 [{"content", "metadata", "score"}]"""
+        cache_key = (query, k, self._generation)
+        cached = self._cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        self._ensure_loaded()
+        bm25 = self.bm25
+        fused: Dict[str, float] = defaultdict(float)
+        docs: Dict[str, Dict[str, Any]] = {}
+
+        for rank, (key, _) in enumerate(bm25.search(query, self.candidates)):
+            doc = bm25.docs.get(key)
+            if doc is not None:
+                fused[key] += 1.0 / (self.rrf_k + rank + 1)
+                docs[key] = doc
+
+        try:
+            if self.ann is not None:
+                query_vector = self.vectorstore.embeddings.embed_query(query)
+                vector_keys = [key for key, _ in self.ann.search(query_vector, self.candidates) if key in bm25.docs]
+            else:
+                vector_keys = []
+                for doc in self.vectorstore.similarity_search(query, k=self.candidates):
+                    key = content_key(doc.page_content)
+                    docs.setdefault(key, {"content": doc.page_content, "metadata": doc.metadata})
+                    vector_keys.append(key)
+        except Exception as e:
+            logger.error(f"向量检索失败: {str(e)}")
+            vector_keys = []
+        for rank, key in enumerate(vector_keys):
+            if key not in docs:
+                # 向量命中不在本进程的 BM25 索引中（其他进程写入或刚被删除）时跳过，已带内容的 Chroma 命中在上面登记过
+                doc = bm25.docs.get(key)
+                if doc is None:
+                    continue
+                docs[key] = doc
+            fused[key] += 1.0 / (self.rrf_k + rank + 1)
+
+        ranked = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:k]
+        results = [
+            {
+                "content": docs[key]["content"],
+                "metadata": docs[key]["metadata"],
+                "score": round(score, 6)
+            }
+            for key, score in ranked
+        ]
+        self._cache.set(cache_key, results)
+        return results
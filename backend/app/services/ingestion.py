@@ -0,0 +1,140 @@
+import uuid
+import threading
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.knowledge_base import knowledge_manager, shutdown_process_pool
+
+logger = logging.getLogger(__name__)
+
+
+class IngestionJobManager:
+    """知识库后台导入任务 - 批量文档排队导入，逐文件记录进度"""
+
+    def __init__(self, max_jobs: int = 200):
+        self.max_jobs = max_jobs
+        self.jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=settings.INGEST_MAX_PARALLEL_DOCS,
+                thread_name_prefix="kb-ingest"
+            )
+        return self._executor
+
+    def submit(self, files: List[Tuple[str, bytes]], replace_doc_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        提交导入任务，立即返回任务信息
+
+        Args:
+            files: [(文件名, 文件内容)]
+            replace_doc_id: 要替换的已有文档 ID（仅单文件任务）
+        """
+        if replace_doc_id and len(files) != 1:
+            raise ValueError("替换文档时只能提交单个文件")
+        job_id = str(uuid.uuid4())
+        job = {
+            "job_id": job_id,
+            "status": "pending",
+            "created_at": datetime.now().isoformat(),
+            "finished_at": None,
+            "files": [
+                {
+                    "file_name": file_name,
+                    "status": "pending",
+                    "pages_done": 0,
+                    "pages_total": None,
+                    "chunks_done": 0,
+                    "doc_id": None,
+                    "message": None
+                }
+                for file_name, _ in files
+            ]
+        }
+
+        with self._lock:
+            self.jobs[job_id] = job
+            while len(self.jobs) > self.max_jobs:
+                self.jobs.popitem(last=False)
+            executor = self._get_executor()
+
+        for index, (file_name, content) in enumerate(files):
+            executor.submit(self._run_file, job, index, file_name, content, replace_doc_id)
+
+        logger.info(f"知识库导入任务已提交: {job_id}, {len(files)} 个文件")
+        return self._snapshot(job)
+
+    def _run_file(
+        self,
+        job: Dict[str, Any],
+        index: int,
+        file_name: str,
+        content: bytes,
+        replace_doc_id: Optional[str] = None
+    ):
+        entry = job["files"][index]
+
+        def progress(**kwargs):
+            with self._lock:
+                entry.update(kwargs)
+
+        with self._lock:
+            entry["status"] = "running"
+            job["status"] = "running"
+
+        try:
+            result = knowledge_manager.add_document(
+                content, file_name, progress=progress, replace_doc_id=replace_doc_id
+            )
+        except Exception as e:
+            logger.error(f"知识库导入失败 {file_name}: {str(e)}")
+            result = {"success": False, "message": str(e)}
+
+        with self._lock:
+            entry["status"] = "success" if result.get("success") else "failed"
+            entry["doc_id"] = result.get("doc_id")
+            entry["chunks_done"] = result.get("chunks_count", entry["chunks_done"])
+            entry["message"] = result.get("message")
+            if all(f["status"] in ("success", "failed") for f in job["files"]):
+                failed = sum(1 for f in job["files"] if f["status"] == "failed")
+                job["status"] = "completed" if failed == 0 else ("failed" if failed == len(job["files"]) else "partial")
+                job["finished_at"] = datetime.now().isoformat()
+                logger.info(f"知识库导入任务完成: {job['job_id']}, 失败 {failed} 个")
+
+    def _snapshot(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            files = [dict(f) for f in job["files"]]
+            snapshot = {k: v for k, v in job.items() if k != "files"}
+        snapshot["files"] = files
+        snapshot["total"] = len(files)
+        snapshot["finished"] = sum(1 for f in files if f["status"] in ("success", "failed"))
+        return snapshot
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """获取任务进度"""
+        job = self.jobs.get(job_id)
+        return self._snapshot(job) if job else None
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        """列出最近的任务（新任务在前）"""
+        with self._lock:
+            jobs = list(self.jobs.values())
+        return [self._snapshot(job) for job in reversed(jobs)]
+
+    def shutdown(self):
+        """停止接收新任务并关闭提取进程池"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        shutdown_process_pool()
+
+
+ingestion_jobs = IngestionJobManager()
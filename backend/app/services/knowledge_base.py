@@ -1,15 +1,28 @@
 import os
 import uuid
+import hashlib
 import logging
-from typing import List, Dict, Any, Optional
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Optional, Callable, Iterable, Iterator, Tuple
 from datetime import datetime
 
+from sqlalchemy.exc import IntegrityError
+
 from app.core.config import settings
+from app.core.database import SessionLocal, KnowledgeDocument
+from app.services.vector_index import vector_index, MANUALS
+from app.services.document_extract import pdf_page_count, extract_pdf_pages, iter_txt_blocks
 
 logger = logging.getLogger(__name__)
 
+# 流式切分时的缓冲长度（字符），远大于片段长度以减少重复切分
+STREAM_BUFFER_CHARS = 20000
+
 text_splitter = None
-vectorstore = None
+process_pool = None
+_pool_lock = threading.Lock()
 
 
 def _get_text_splitter():
@@ -23,36 +36,26 @@ def _get_text_splitter():
     return text_splitter
 
 
-def _get_vectorstore():
-    global vectorstore
-    if vectorstore is None:
-        try:
-            from langchain_community.vectorstores import Chroma
-            
-            embeddings = None
-            if settings.OPENAI_API_KEY:
-                from langchain_openai import OpenAIEmbeddings
-                embeddings = OpenAIEmbeddings(
-                    model="text-embedding-3-small",
-                    openai_api_key=settings.OPENAI_API_KEY
-                )
-                logger.info("知识库使用 OpenAI Embedding")
-            elif settings.DEEPSEEK_API_KEY:
-                # DeepSeek 不支持 embedding API，知识库功能不可用
-                logger.info("DeepSeek 不支持 embedding API，知识库功能已禁用。请配置 OPENAI_API_KEY 以使用知识库功能。")
-                return None
-            else:
-                logger.info("未配置 API Key，知识库功能不可用")
-                return None
-            
-            vectorstore = Chroma(
-                persist_directory=os.path.join(settings.BASE_DIR, "data", "knowledge_vectorstore"),
-                embedding_function=embeddings
+def _get_process_pool() -> ProcessPoolExecutor:
+    global process_pool
+    with _pool_lock:
+        if process_pool is None:
+            # 服务进程内已有多个线程，fork 可能复制被其他线程持有的锁，改用 spawn 启动提取进程
+            process_pool = ProcessPoolExecutor(
+                max_workers=settings.INGEST_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
             )
-            logger.info("知识库向量数据库初始化成功")
-        except Exception as e:
-            logger.error(f"知识库向量数据库初始化失败: {str(e)}")
-    return vectorstore
+        return process_pool
+
+
+def shutdown_process_pool():
+    """关闭 PDF 提取进程池"""
+    global process_pool
+    with _pool_lock:
+        if process_pool is None:
+            return
+        process_pool.shutdown(wait=False, cancel_futures=True)
+        process_pool = None
 
 
 class KnowledgeBaseManager:
@@ -61,91 +64,298 @@ class KnowledgeBaseManager:
     def __init__(self):
         self.docs_dir = os.path.join(settings.BASE_DIR, "data", "knowledge_docs")
         os.makedirs(self.docs_dir, exist_ok=True)
+        self._catalog_checked = False
 
-    def _extract_text_from_pdf(self, file_path: str) -> str:
-        """从 PDF 提取文本"""
+    def _ensure_catalog(self):
+        """首次使用时，若目录为空而向量库已有数据（旧版本写入），从向量库元数据回填一次目录"""
+        if self._catalog_checked:
+            return
+
+        db = SessionLocal()
         try:
-            from pypdf import PdfReader
-            reader = PdfReader(file_path)
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() + "\n"
-            return text
+            if db.query(KnowledgeDocument).first() is not None:
+                self._catalog_checked = True
+                return
+
+            docs = vector_index.get(MANUALS, include=["metadatas"])
+            grouped = {}
+            for chunk_id, metadata in zip(docs.get("ids", []), docs.get("metadatas", [])):
+                doc_id = (metadata or {}).get("doc_id")
+                if not doc_id:
+                    continue
+                entry = grouped.setdefault(doc_id, {
+                    "file_name": metadata.get("file_name", "未知"),
+                    "added_at": metadata.get("added_at"),
+                    "chunk_ids": []
+                })
+                entry["chunk_ids"].append(chunk_id)
+
+            for doc_id, entry in grouped.items():
+                created_at = datetime.fromisoformat(entry["added_at"]) if entry["added_at"] else datetime.now()
+                db.add(KnowledgeDocument(
+                    doc_id=doc_id,
+                    file_name=entry["file_name"],
+                    file_path=self._find_doc_file(doc_id),
+                    chunks_count=len(entry["chunk_ids"]),
+                    chunk_ids=entry["chunk_ids"],
+                    created_at=created_at
+                ))
+            db.commit()
+            self._catalog_checked = True
+            if grouped:
+                logger.info(f"知识库目录回填完成: {len(grouped)} 个文档")
         except Exception as e:
-            logger.error(f"PDF 提取文本失败: {str(e)}")
-            return ""
+            db.rollback()
+            logger.error(f"知识库目录回填失败，下次使用时重试: {str(e)}")
+        finally:
+            db.close()
+
+    def _find_doc_file(self, doc_id: str) -> Optional[str]:
+        for file_name in os.listdir(self.docs_dir):
+            if file_name.startswith(doc_id):
+                return os.path.join(self.docs_dir, file_name)
+        return None
+
+    def _iter_pdf_text(self, file_path: str, progress: Optional[Callable[..., None]]) -> Iterator[str]:
+        """分段提取 PDF 文本：页数较多时分发到进程池并行提取，按页序流式返回"""
+        total = pdf_page_count(file_path)
+        step = max(1, settings.INGEST_PAGES_PER_TASK)
+        ranges = [(start, min(start + step, total)) for start in range(0, total, step)]
+
+        if len(ranges) > 1 and settings.INGEST_WORKERS > 1:
+            results = _get_process_pool().map(
+                extract_pdf_pages,
+                [file_path] * len(ranges),
+                [start for start, _ in ranges],
+                [end for _, end in ranges]
+            )
+        else:
+            results = (extract_pdf_pages(file_path, start, end) for start, end in ranges)
 
-    def _extract_text_from_txt(self, file_path: str) -> str:
-        """从 TXT 提取文本"""
+        for (_, end), pages in zip(ranges, results):
+            if progress:
+                progress(pages_done=end, pages_total=total)
+            yield "".join(page + "\n" for page in pages)
+
+    def _iter_chunks(self, blocks: Iterable[str]) -> Iterator[str]:
+        """流式切分：累积到一定长度即切分并输出，末尾片段留待与后续文本拼接，保证跨块的片段边界与重叠"""
+        splitter = _get_text_splitter()
+        buffer = ""
+        for block in blocks:
+            buffer += block
+            if len(buffer) < STREAM_BUFFER_CHARS:
+                continue
+            chunks = splitter.split_text(buffer)
+            if len(chunks) > 1:
+                yield from chunks[:-1]
+                buffer = chunks[-1]
+        if buffer.strip():
+            yield from splitter.split_text(buffer)
+
+    def _find_existing(self, file_hash: str, replace_doc_id: Optional[str]) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """查找内容完全相同的文档，以及调用方指定要替换的旧版本文档（用于增量更新）"""
+        db = SessionLocal()
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return f.read()
-        except Exception as e:
-            logger.error(f"TXT 读取失败: {str(e)}")
-            return ""
+            identical = db.query(KnowledgeDocument).filter(KnowledgeDocument.file_hash == file_hash).first()
+            previous = None
+            if replace_doc_id:
+                previous = db.query(KnowledgeDocument).filter(KnowledgeDocument.doc_id == replace_doc_id).first()
 
-    def add_document(self, file_content: bytes, file_name: str) -> Dict[str, Any]:
-        """添加文档到知识库"""
-        vs = _get_vectorstore()
-        if not vs:
+            def as_dict(doc):
+                if doc is None:
+                    return None
+                return {
+                    "doc_id": doc.doc_id,
+                    "file_name": doc.file_name,
+                    "file_path": doc.file_path,
+                    "chunks_count": doc.chunks_count,
+                    "chunk_ids": list(doc.chunk_ids or [])
+                }
+            return as_dict(identical), as_dict(previous)
+        finally:
+            db.close()
+
+    def _duplicate_result(self, identical: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "success": True,
+            "doc_id": identical["doc_id"],
+            "file_name": identical["file_name"],
+            "chunks_count": identical["chunks_count"],
+            "duplicate": True,
+            "message": f"文档已存在（{identical['file_name']}），未重复导入"
+        }
+
+    def add_document(
+        self,
+        file_content: bytes,
+        file_name: str,
+        progress: Optional[Callable[..., None]] = None,
+        replace_doc_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        添加文档到知识库（提取、切分、向量化流水线执行，片段分批写入向量库）
+
+        内容完全相同的文档直接返回已有记录；指定 replace_doc_id 时视为该文档的新版本原地更新，
+        片段 ID 由内容哈希生成，未变化的片段沿用已存储的向量，只对变化的片段向量化。
+        未指定时总是作为新文档导入（同名文档互不影响）。
+
+        Args:
+            file_content: 文件内容
+            file_name: 文件名
+            progress: 进度回调，关键字参数 pages_done/pages_total/chunks_done
+            replace_doc_id: 要替换的已有文档 ID
+        """
+        if not vector_index.available:
             return {
                 "success": False,
-                "message": "知识库未初始化，请配置 OPENAI_API_KEY"
+                "message": "知识库未初始化，请检查 EMBEDDING_BACKEND 配置"
             }
 
-        try:
-            doc_id = str(uuid.uuid4())
-            file_ext = os.path.splitext(file_name)[1].lower()
-            file_path = os.path.join(self.docs_dir, f"{doc_id}_{file_name}")
+        self._ensure_catalog()
+
+        file_ext = os.path.splitext(file_name)[1].lower()
+        if file_ext not in ('.pdf', '.txt'):
+            return {
+                "success": False,
+                "message": f"不支持的文件类型: {file_ext}，仅支持 PDF 和 TXT"
+            }
+
+        file_hash = hashlib.sha256(file_content).hexdigest()
+        identical, previous = self._find_existing(file_hash, replace_doc_id)
+        if identical:
+            logger.info(f"知识库文档已存在，跳过导入: {file_name} -> {identical['doc_id']}")
+            return self._duplicate_result(identical)
+        if replace_doc_id and previous is None:
+            return {
+                "success": False,
+                "message": f"要替换的文档不存在: {replace_doc_id}"
+            }
 
+        doc_id = previous["doc_id"] if previous else str(uuid.uuid4())
+        existing_ids = set(previous["chunk_ids"]) if previous else set()
+        file_path = os.path.join(self.docs_dir, f"{doc_id}_{file_hash[:8]}_{file_name}")
+        chunk_ids: List[str] = []
+        added_ids: List[str] = []
+        occurrences: Dict[str, int] = {}
+        stored = False
+
+        try:
             with open(file_path, 'wb') as f:
                 f.write(file_content)
 
             if file_ext == '.pdf':
-                text = self._extract_text_from_pdf(file_path)
-            elif file_ext == '.txt':
-                text = self._extract_text_from_txt(file_path)
+                blocks = self._iter_pdf_text(file_path, progress)
             else:
-                os.remove(file_path)
-                return {
-                    "success": False,
-                    "message": f"不支持的文件类型: {file_ext}，仅支持 PDF 和 TXT"
-                }
+                blocks = iter_txt_blocks(file_path)
 
-            if not text.strip():
-                os.remove(file_path)
+            added_at = datetime.now()
+            char_count = 0
+            batch = []
+
+            def chunk_id(chunk: str) -> str:
+                digest = hashlib.sha256(chunk.encode("utf-8")).hexdigest()[:16]
+                count = occurrences.get(digest, 0)
+                occurrences[digest] = count + 1
+                return f"{doc_id}:{digest}" if count == 0 else f"{doc_id}:{digest}-{count}"
+
+            def flush():
+                new_texts, new_ids, new_metadatas = [], [], []
+                reused_ids, reused_metadatas = [], []
+                for chunk in batch:
+                    cid = chunk_id(chunk)
+                    metadata = {
+                        "doc_id": doc_id,
+                        "file_name": file_name,
+                        "chunk_index": len(chunk_ids),
+                        "added_at": added_at.isoformat()
+                    }
+                    chunk_ids.append(cid)
+                    if cid in existing_ids:
+                        reused_ids.append(cid)
+                        reused_metadatas.append(metadata)
+                    else:
+                        new_texts.append(chunk)
+                        new_ids.append(cid)
+                        new_metadatas.append(metadata)
+
+                if new_texts:
+                    vector_index.add(MANUALS, new_texts, new_metadatas, ids=new_ids)
+                    added_ids.extend(new_ids)
+                if reused_ids:
+                    vector_index.update_metadata(MANUALS, reused_ids, reused_metadatas)
+                batch.clear()
+                if progress:
+                    progress(chunks_done=len(chunk_ids))
+
+            for chunk in self._iter_chunks(blocks):
+                char_count += len(chunk)
+                batch.append(chunk)
+                if len(batch) >= settings.INGEST_EMBED_BATCH_SIZE:
+                    flush()
+            if batch:
+                flush()
+
+            if not chunk_ids:
                 return {
                     "success": False,
                     "message": "无法从文档中提取文本"
                 }
 
-            splitter = _get_text_splitter()
-            chunks = splitter.split_text(text)
-            
-            from langchain_core.documents import Document
-            documents = [
-                Document(
-                    page_content=chunk,
-                    metadata={
-                        "doc_id": doc_id,
-                        "file_name": file_name,
-                        "chunk_index": i,
-                        "added_at": datetime.now().isoformat()
-                    }
-                )
-                for i, chunk in enumerate(chunks)
-            ]
+            db = SessionLocal()
+            try:
+                doc = db.query(KnowledgeDocument).filter(KnowledgeDocument.doc_id == doc_id).first()
+                if doc is None:
+                    doc = KnowledgeDocument(doc_id=doc_id, created_at=added_at)
+                    db.add(doc)
+                doc.file_name = file_name
+                doc.file_path = file_path
+                doc.file_hash = file_hash
+                doc.file_size = len(file_content)
+                doc.char_count = char_count
+                doc.chunks_count = len(chunk_ids)
+                doc.chunk_ids = chunk_ids
+                db.commit()
+                stored = True
+            except IntegrityError:
+                # 并发导入相同内容：另一请求已先写入同一哈希，本次写入的片段在 finally 中清理
+                db.rollback()
+                identical, _ = self._find_existing(file_hash, None)
+                if identical is None:
+                    raise
+                logger.info(f"知识库文档已由并发导入写入，跳过: {file_name} -> {identical['doc_id']}")
+                return self._duplicate_result(identical)
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                db.close()
 
-            vs.add_documents(documents)
-            
-            logger.info(f"知识库添加文档成功: {file_name}, {len(chunks)} 个 chunks")
+            reused = len(chunk_ids) - len(added_ids)
+            if previous:
+                stale_ids = list(existing_ids - set(chunk_ids))
+                vector_index.delete(MANUALS, stale_ids)
+                old_path = previous["file_path"]
+                if old_path and old_path != file_path and os.path.exists(old_path):
+                    os.remove(old_path)
+                logger.info(
+                    f"知识库文档更新: {file_name}, {len(chunk_ids)} 个 chunks，"
+                    f"沿用 {reused} 个，新向量化 {len(added_ids)} 个，删除 {len(stale_ids)} 个"
+                )
+            else:
+                logger.info(f"知识库添加文档成功: {file_name}, {len(chunk_ids)} 个 chunks")
 
             return {
                 "success": True,
                 "doc_id": doc_id,
                 "file_name": file_name,
-                "chunks_count": len(chunks),
-                "message": f"成功添加文档，包含 {len(chunks)} 个知识片段"
+                "chunks_count": len(chunk_ids),
+                "embedded_chunks": len(added_ids),
+                "reused_chunks": reused,
+                "updated": previous is not None,
+                "message": (
+                    f"文档已更新，包含 {len(chunk_ids)} 个知识片段（{len(added_ids)} 个有变化）"
+                    if previous else f"成功添加文档，包含 {len(chunk_ids)} 个知识片段"
+                )
             }
 
         except Exception as e:
@@ -154,75 +364,83 @@ class KnowledgeBaseManager:
                 "success": False,
                 "message": str(e)
             }
+        finally:
+            if not stored:
+                if added_ids:
+                    vector_index.delete(MANUALS, added_ids)
+                if os.path.exists(file_path):
+                    os.remove(file_path)
 
     def list_documents(self) -> List[Dict[str, Any]]:
         """列出知识库中的文档"""
-        vs = _get_vectorstore()
-        if not vs:
+        if not vector_index.available:
             return []
 
-        try:
-            docs = vs.get()
-            doc_info = {}
-            
-            for doc_id, metadata in zip(docs.get("ids", []), docs.get("metadatas", [])):
-                file_name = metadata.get("file_name", "未知")
-                if file_name not in doc_info:
-                    doc_info[file_name] = {
-                        "doc_id": metadata.get("doc_id"),
-                        "file_name": file_name,
-                        "chunks_count": 0,
-                        "added_at": metadata.get("added_at", "")
-                    }
-                doc_info[file_name]["chunks_count"] += 1
+        self._ensure_catalog()
 
-            return list(doc_info.values())
+        db = SessionLocal()
+        try:
+            docs = db.query(KnowledgeDocument).order_by(KnowledgeDocument.created_at.desc()).all()
+            return [
+                {
+                    "doc_id": doc.doc_id,
+                    "file_name": doc.file_name,
+                    "chunks_count": doc.chunks_count,
+                    "file_size": doc.file_size,
+                    "added_at": doc.created_at.isoformat() if doc.created_at else ""
+                }
+                for doc in docs
+            ]
         except Exception as e:
             logger.error(f"获取知识库列表失败: {str(e)}")
             return []
+        finally:
+            db.close()
 
     def delete_document(self, doc_id: str) -> Dict[str, Any]:
         """删除知识库中的文档"""
-        vs = _get_vectorstore()
-        if not vs:
+        if not vector_index.available:
             return {
                 "success": False,
                 "message": "知识库未初始化"
             }
 
+        self._ensure_catalog()
+
+        db = SessionLocal()
         try:
-            docs = vs.get()
-            ids_to_delete = []
-            
-            for doc_id_item, metadata in zip(docs.get("ids", []), docs.get("metadatas", [])):
-                if metadata.get("doc_id") == doc_id:
-                    ids_to_delete.append(doc_id_item)
-
-            if ids_to_delete:
-                vs.delete(ids_to_delete)
-                
-                for file_name in os.listdir(self.docs_dir):
-                    if file_name.startswith(doc_id):
-                        os.remove(os.path.join(self.docs_dir, file_name))
-                        break
-
-                logger.info(f"知识库删除文档成功: {doc_id}")
-                return {
-                    "success": True,
-                    "message": "文档已从知识库中删除"
-                }
-            else:
+            doc = db.query(KnowledgeDocument).filter(KnowledgeDocument.doc_id == doc_id).first()
+            if not doc:
                 return {
                     "success": False,
                     "message": "文档不存在"
                 }
 
+            if doc.chunk_ids:
+                vector_index.delete(MANUALS, doc.chunk_ids)
+
+            file_path = doc.file_path or self._find_doc_file(doc_id)
+            if file_path and os.path.exists(file_path):
+                os.remove(file_path)
+
+            db.delete(doc)
+            db.commit()
+
+            logger.info(f"知识库删除文档成功: {doc_id}")
+            return {
+                "success": True,
+                "message": "文档已从知识库中删除"
+            }
+
         except Exception as e:
+            db.rollback()
             logger.error(f"删除文档失败: {str(e)}")
             return {
                 "success": False,
                 "message": str(e)
             }
+        finally:
+            db.close()
 
 
 knowledge_manager = KnowledgeBaseManager()
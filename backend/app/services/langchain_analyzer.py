@@ -1,107 +1,142 @@
-from langchain_openai import ChatOpenAI
-from langchain_community.chat_models import ChatOllama
-from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.documents import Document
 from langchain_core.tools import tool
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 import json
 import logging
+import threading
 from datetime import datetime
 
 from app.core.config import settings
+from app.services.llm_transport import LLMTransport, llm_transport
+from app.services.vector_index import VectorIndex, vector_index, ANALYSIS_HISTORY, MANUALS
+from app.services.history_store import AnalysisHistoryStore, HistoryWriteBehind
+from app.services.anomaly_detector import anomaly_detector
+from app.services.thermal_analyzer import thermal_analyzer, THERMAL_SYSTEM_PROMPT, THERMAL_TASK_PROMPT
+from app.services.trend_engine import trend_engine, TREND_TASK_PROMPT
 
 logger = logging.getLogger(__name__)
 
 
 class RAGRetriever:
-    """RAG 检索器 - 基于历史案例的知识检索"""
+    """RAG 检索器 - 分析结果写入历史分析命名空间，检索同时覆盖维护手册与历史案例"""
 
-    def __init__(self):
-        self.embeddings = None
-        self.vectorstore = None
-        self.text_splitter = None
-        self._init_vectorstore()
+    def __init__(self, index: Optional[VectorIndex] = None):
+        self.index = index or vector_index
+        self.history = AnalysisHistoryStore(self.index)
+        self.writer = HistoryWriteBehind(self.history)
 
-    def _init_vectorstore(self):
-        """初始化向量数据库"""
-        try:
-            from langchain_community.vectorstores import Chroma
-            from langchain_text_splitters import RecursiveCharacterTextSplitter
-            
-            # 优先使用 OpenAI，如果没有则使用 DeepSeek
-            if settings.OPENAI_API_KEY:
-                from langchain_openai import OpenAIEmbeddings
-                self.embeddings = OpenAIEmbeddings(
-                    model="text-embedding-3-small",
-                    openai_api_key=settings.OPENAI_API_KEY
-                )
-                logger.info("使用 OpenAI Embedding")
-            elif settings.DEEPSEEK_API_KEY:
-                # DeepSeek 不支持 embedding API，暂时禁用 RAG
-                logger.info("DeepSeek 不支持 embedding API，RAG 功能已禁用")
-                return
-            else:
-                logger.info("未配置 API Key，跳过知识库初始化")
-                return
-            
-            self.vectorstore = Chroma(
-                persist_directory="./data/vectorstore",
-                embedding_function=self.embeddings
-            )
-            self.text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1000,
-                chunk_overlap=200
-            )
-            logger.info("RAG 向量数据库初始化成功")
-        except Exception as e:
-            logger.error(f"RAG 向量数据库初始化失败: {str(e)}")
+    @property
+    def vectorstore(self):
+        return self.index.store(ANALYSIS_HISTORY)
 
     def add_documents(self, texts: List[str], metadatas: List[Dict] = None):
-        """添加文档到知识库"""
-        if not self.vectorstore:
-            logger.warning("知识库未初始化，请配置 DEEPSEEK_API_KEY 或 OPENAI_API_KEY 以启用知识库功能")
+        """添加文档到历史分析库"""
+        if not self.index.available:
+            logger.warning("知识库未初始化，请检查 EMBEDDING_BACKEND 配置")
             return
 
-        documents = [
-            Document(page_content=text, metadata=metadata or {})
-            for text, metadata in zip(texts, metadatas or [{}] * len(texts))
-        ]
-
-        self.vectorstore.add_documents(documents)
+        metadatas = [metadata or {} for metadata in (metadatas or [{}] * len(texts))]
+        self.index.add(ANALYSIS_HISTORY, texts, metadatas)
         logger.info(f"已添加 {len(texts)} 个文档到知识库")
 
-    def retrieve(self, query: str, k: int = 3) -> List[Dict]:
-        """检索相似文档"""
-        if not self.vectorstore:
+    def save_analysis(self, text: str, metadata: Dict[str, Any]):
+        """保存分析结果到历史分析库（入队后台批量写入，不阻塞分析响应）"""
+        if not self.index.available:
+            logger.warning("知识库未初始化，请检查 EMBEDDING_BACKEND 配置")
+            return
+
+        self.writer.enqueue(text, metadata)
+
+    def flush(self):
+        """写入队列中剩余的历史分析并停止后台线程（应用关闭时调用）"""
+        self.writer.close()
+
+    def retrieve(self, query: str, k: int = 3, namespaces: Optional[List[str]] = None) -> List[Dict]:
+        """检索相似文档（默认跨维护手册与历史分析两个命名空间）"""
+        if not self.index.available:
             return []
 
         try:
-            results = self.vectorstore.similarity_search(query, k=k)
-            return [
-                {
-                    "content": doc.page_content,
-                    "metadata": doc.metadata
-                }
-                for doc in results
-            ]
+            return self.index.search(query, k=k, namespaces=namespaces)
         except Exception as e:
             logger.error(f"检索失败: {str(e)}")
             return []
 
     def as_retriever(self, k: int = 3):
-        """返回 LangChain 检索器"""
+        """返回 LangChain 检索器（历史分析库）"""
         if not self.vectorstore:
             return None
         return self.vectorstore.as_retriever(search_kwargs={"k": k})
 
 
+DEFAULT_SYSTEM_PROMPT = "你是一位专业的设备数据分析专家，擅长分析设备运行数据并给出专业建议。"
+
+SYSTEM_PROMPTS = {
+    "thermal": THERMAL_SYSTEM_PROMPT
+}
+
+# 本地领域分析结果在数据上下文中的字段名
+DOMAIN_CONTEXT_KEYS = {
+    "thermal": "thermal_analysis",
+    "trend": "trend_analysis"
+}
+
+
+_MESSAGE_ROLES = {"system": "system", "human": "user", "ai": "assistant"}
+
+
+class TransportChatModel:
+    """
+    经 LLM 传输层调用的聊天模型（接受 LangChain 消息，返回 AIMessage）
+
+    DeepSeek 走 OpenAI 兼容的 /chat/completions，本地模型走 Ollama /api/chat；
+    请求共享传输层的连接池、重试、按后端并发上限与熔断，调用计入 /llm/metrics。
+    """
+
+    def __init__(
+        self,
+        backend: str,
+        base_url: str,
+        model: str,
+        temperature: float = 0.7,
+        api_key: Optional[str] = None,
+        transport: Optional[LLMTransport] = None
+    ):
+        self.backend = backend
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.temperature = temperature
+        self.api_key = api_key
+        self.transport = transport or llm_transport
+
+    def invoke(self, messages: List[BaseMessage]) -> AIMessage:
+        chat = [{"role": _MESSAGE_ROLES.get(m.type, "user"), "content": m.content} for m in messages]
+        if self.backend == "ollama":
+            payload = {
+                "model": self.model,
+                "messages": chat,
+                "stream": False,
+                "options": {"temperature": self.temperature}
+            }
+            result = self.transport.post_json_sync("ollama", f"{self.base_url}/api/chat", payload)
+            return AIMessage(content=(result.get("message") or {}).get("content", ""))
+
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else None
+        payload = {"model": self.model, "messages": chat, "temperature": self.temperature}
+        result = self.transport.post_json_sync(
+            self.backend, f"{self.base_url}/chat/completions", payload, headers=headers
+        )
+        return AIMessage(content=result["choices"][0]["message"]["content"])
+
+
 class LangChainAnalyzer:
     """基于 LangChain 的 AI 分析器"""
 
-    def __init__(self, use_local_model: bool = False):
+    def __init__(self, use_local_model: bool = False, rag: Optional[RAGRetriever] = None):
         self.use_local_model = use_local_model
-        self.rag = RAGRetriever()
+        self.rag = rag or get_rag_retriever()
         self.memory = None
         self._init_llm()
 
@@ -109,23 +144,19 @@ class LangChainAnalyzer:
         """初始化 LLM"""
         try:
             if self.use_local_model:
-                self.llm = ChatOllama(
-                    base_url=settings.OLLAMA_BASE_URL or "http://localhost:11434",
-                    model=settings.OLLAMA_MODEL or "qwen:7b",
-                    temperature=0.7
+                self.llm = TransportChatModel(
+                    "ollama",
+                    settings.OLLAMA_BASE_URL or "http://localhost:11434",
+                    settings.OLLAMA_MODEL or "qwen:7b"
                 )
             else:
                 # DeepSeek API: base_url 应该是 https://api.deepseek.com/v1
                 # 而不是包含 /chat/completions 的完整 URL
-                base_url = settings.DEEPSEEK_API_URL or "https://api.deepseek.com/v1"
-                if "/chat/completions" in base_url:
-                    base_url = base_url.replace("/chat/completions", "")
-                
-                self.llm = ChatOpenAI(
-                    model=settings.DEEPSEEK_MODEL or "deepseek-chat",
-                    temperature=0.7,
-                    openai_api_key=settings.DEEPSEEK_API_KEY,
-                    openai_api_base=base_url
+                self.llm = TransportChatModel(
+                    "deepseek",
+                    _deepseek_base_url(),
+                    settings.DEEPSEEK_MODEL or "deepseek-chat",
+                    api_key=settings.DEEPSEEK_API_KEY
                 )
             from langchain.memory import ConversationBufferMemory
             self.memory = ConversationBufferMemory(
@@ -153,24 +184,38 @@ class LangChainAnalyzer:
 
         try:
             logger.info(f"开始分析: {data.get('file_name', 'unknown')}")
-            context = self._prepare_context(data, analysis_type)
+            metrics = self._run_domain_analysis(data, analysis_type)
+            context = self._prepare_context(data, analysis_type, metrics)
             
             retrieved_context = ""
-            if analysis_type == "table" or analysis_type == "general":
-                query = f"分析 {data.get('file_name', '')} {data.get('table_name', '')}"
+            if analysis_type in ("table", "general", "thermal", "trend"):
+                # 列名中常含设备编号、测点名，纳入查询以提高关键词召回
+                columns = " ".join(str(c) for c in (data.get("columns") or [])[:30])
+                query = f"分析 {data.get('file_name', '')} {data.get('table_name', '')} {columns}"
                 logger.info(f"RAG检索: {query[:50]}...")
                 docs = self.rag.retrieve(query, k=3)
                 logger.info(f"RAG检索完成: 找到 {len(docs)} 条记录")
                 if docs:
-                    retrieved_context = "\n\n## 相关历史案例:\n"
+                    retrieved_context = "\n\n## 相关维护手册与历史案例:\n"
                     for i, doc in enumerate(docs, 1):
-                        retrieved_context += f"\n【案例 {i}】:\n{doc['content'][:500]}\n"
+                        label = "手册" if doc.get("namespace") == MANUALS else "案例"
+                        retrieved_context += f"\n【{label} {i}】:\n{doc['content'][:500]}\n"
+
+            similar_tables = data.get("similar_tables") or []
+            if similar_tables:
+                retrieved_context += "\n\n## 结构相近设备表的历史分析:\n"
+                for i, table in enumerate(similar_tables, 1):
+                    retrieved_context += (
+                        f"\n【相似表 {i}】{table['file_name']} / {table['table_name']}"
+                        f"（相似度 {table['similarity']}，共同字段: {', '.join(map(str, table['shared_columns'][:10]))}）:\n"
+                        f"{table['analysis']['content'][:500]}\n"
+                    )
 
             prompt = self._build_prompt(context, retrieved_context, user_query, analysis_type)
             logger.info(f"Prompt构建完成: {len(prompt)} 字符")
 
             messages = [
-                SystemMessage(content="你是一位专业的设备数据分析专家，擅长分析设备运行数据并给出专业建议。"),
+                SystemMessage(content=SYSTEM_PROMPTS.get(analysis_type, DEFAULT_SYSTEM_PROMPT)),
                 HumanMessage(content=prompt)
             ]
 
@@ -179,17 +224,25 @@ class LangChainAnalyzer:
             result_content = response.content if hasattr(response, 'content') else str(response)
             logger.info(f"LLM响应: {len(result_content)} 字符")
 
-            logger.info("保存到知识库...")
+            logger.info("提交到知识库写入队列...")
             self._save_to_knowledge_base(data, result_content, analysis_type)
             logger.info("分析完成")
 
-            return {
-                "status": "success",
+            result = {
+                "analysis_type": analysis_type,
                 "content": result_content,
                 "timestamp": datetime.now().isoformat(),
-                "analysis_type": analysis_type,
                 "rag_used": bool(retrieved_context)
             }
+            if metrics is not None:
+                result["metrics"] = metrics
+
+            return {
+                "status": "success",
+                "message": "分析完成",
+                "model": "ollama" if self.use_local_model else "deepseek",
+                "result": result
+            }
 
         except Exception as e:
             logger.error(f"LangChain 分析失败: {str(e)}")
@@ -199,8 +252,32 @@ class LangChainAnalyzer:
                 "result": None
             }
 
-    def _prepare_context(self, data: Dict[str, Any], analysis_type: str) -> str:
+    def _run_domain_analysis(self, data: Dict[str, Any], analysis_type: str) -> Optional[Dict[str, Any]]:
+        """执行本地领域分析，结果精确计算，LLM 仅负责解读"""
+        if analysis_type == "thermal":
+            return thermal_analyzer.analyze(data.get("data", []), data.get("columns"))
+        if analysis_type == "trend":
+            return trend_engine.analyze(data.get("data", []), data.get("columns"), cache_key=data.get("table_version"))
+        return None
+
+    def _prepare_context(
+        self,
+        data: Dict[str, Any],
+        analysis_type: str,
+        metrics: Optional[Dict[str, Any]] = None
+    ) -> str:
         """准备数据上下文"""
+        if analysis_type in DOMAIN_CONTEXT_KEYS:
+            context = {
+                "file_name": data.get("file_name"),
+                "table_name": data.get("table_name"),
+                "row_count": data.get("row_count", 0),
+                "columns": data.get("columns", []),
+                "data_mode": data.get("data_mode", "采样"),
+                DOMAIN_CONTEXT_KEYS[analysis_type]: metrics
+            }
+            return json.dumps(context, ensure_ascii=False, indent=2)
+
         if analysis_type == "table":
             table_data = data.get("data", [])
             context = {
@@ -209,7 +286,8 @@ class LangChainAnalyzer:
                 "row_count": data.get("row_count", 0),
                 "columns": data.get("columns", []),
                 "data_mode": data.get("data_mode", "采样"),
-                "sample_data": table_data[:20] if table_data else []
+                "sample_data": table_data[:5] if table_data else [],
+                "anomaly_detection": anomaly_detector.detect(table_data, data.get("columns"))
             }
             return json.dumps(context, ensure_ascii=False, indent=2)
 
@@ -245,11 +323,15 @@ class LangChainAnalyzer:
 {retrieved_context}
 """
 
-        if analysis_type == "table":
+        if analysis_type == "thermal":
+            prompt += THERMAL_TASK_PROMPT
+        elif analysis_type == "trend":
+            prompt += TREND_TASK_PROMPT
+        elif analysis_type == "table":
             prompt += """
 请对指定表进行详细数据分析：
 1. 表结构分析：字段含义、类型、数据特征
-2. 数据质量分析：缺失值、异常值、数据分布
+2. 数据质量分析：缺失值、异常值、数据分布（异常值以 anomaly_detection 中的全量本地检测结果为准）
 3. 字段特征分析：各字段的值域范围、重复度、关键字段识别
 4. 数据洞察：发现的问题、规律、建议
 
@@ -291,29 +373,73 @@ class LangChainAnalyzer:
                 "timestamp": datetime.now().isoformat()
             }
 
-            self.rag.add_documents([text], [metadata])
+            self.rag.save_analysis(text, metadata)
         except Exception as e:
             logger.error(f"保存到知识库失败: {str(e)}")
 
 
-_analyzer: Optional[LangChainAnalyzer] = None
+def _deepseek_base_url() -> str:
+    base_url = settings.DEEPSEEK_API_URL or "https://api.deepseek.com/v1"
+    return base_url.replace("/chat/completions", "")
+
+
+class AnalyzerRegistry:
+    """分析器注册表 - 按后端/模型配置保持常驻实例，切换后端无需重建（线程安全）"""
+
+    def __init__(self):
+        self._analyzers: Dict[Tuple[str, str, str], LangChainAnalyzer] = {}
+        self._lock = threading.Lock()
+
+    def _config_key(self, use_local_model: bool) -> Tuple[str, str, str]:
+        if use_local_model:
+            return ("ollama", settings.OLLAMA_BASE_URL or "http://localhost:11434", settings.OLLAMA_MODEL or "qwen:7b")
+        return ("deepseek", _deepseek_base_url(), settings.DEEPSEEK_MODEL or "deepseek-chat")
+
+    def get(self, use_local_model: bool = False) -> LangChainAnalyzer:
+        """获取指定后端的分析器，不存在时创建（同一配置只创建一次）"""
+        key = self._config_key(use_local_model)
+        analyzer = self._analyzers.get(key)
+        if analyzer is not None:
+            return analyzer
+
+        with self._lock:
+            analyzer = self._analyzers.get(key)
+            if analyzer is None:
+                logger.info(f"创建分析器实例: {key[0]} / {key[2]}")
+                analyzer = LangChainAnalyzer(use_local_model, rag=get_rag_retriever())
+                self._analyzers[key] = analyzer
+        return analyzer
+
+    def prewarm(self):
+        """启动时预热：DeepSeek 与本地模型两个后端各创建一个实例"""
+        for use_local_model in (False, True):
+            self.get(use_local_model)
+        logger.info(f"分析器预热完成: {len(self._analyzers)} 个实例")
+
+    def clear(self):
+        """清空注册表（配置变更后使用）"""
+        with self._lock:
+            self._analyzers.clear()
+
+
 _rag: Optional[RAGRetriever] = None
+_rag_lock = threading.Lock()
 
 
 def get_langchain_analyzer(use_local_model: bool = False) -> LangChainAnalyzer:
     """获取 LangChain 分析器实例"""
-    global _analyzer
-    if _analyzer is None or _analyzer.use_local_model != use_local_model:
-        _analyzer = LangChainAnalyzer(use_local_model)
-    return _analyzer
+    return analyzer_registry.get(use_local_model)
 
 
 def get_rag_retriever() -> RAGRetriever:
     """获取 RAG 检索器实例"""
     global _rag
     if _rag is None:
-        _rag = RAGRetriever()
+        with _rag_lock:
+            if _rag is None:
+                _rag = RAGRetriever()
     return _rag
 
 
+analyzer_registry = AnalyzerRegistry()
 rag_retriever = get_rag_retriever()
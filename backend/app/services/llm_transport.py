@@ -0,0 +1,312 @@
+import asyncio
+import random
+import threading
+import time
+import logging
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Any, Optional
+
+import httpx
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class LLMTransportError(Exception):
+    """LLM 调用失败（重试耗尽、熔断或非重试类错误）"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass
+class BackendPolicy:
+    """单个后端的调用策略"""
+    max_concurrency: int
+    timeout: float
+    max_retries: int = 3
+
+
+class CircuitBreaker:
+    """熔断器：连续失败达到阈值后熔断，冷却期结束后放行一次试探请求"""
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.half_open = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self.half_open or time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.half_open:
+            self.half_open = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.half_open = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.half_open or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self.half_open = False
+
+
+class BackendMetrics:
+    """后端调用指标：请求数、失败、重试、延迟分位数和 token 用量"""
+
+    def __init__(self, window: int = 500):
+        self.requests = 0
+        self.successes = 0
+        self.failures = 0
+        self.retries = 0
+        self.rejected = 0
+        self.in_flight = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.latencies = deque(maxlen=window)
+
+    def snapshot(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+
+        def percentile(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 3)
+
+        return {
+            "requests": self.requests,
+            "successes": self.successes,
+            "failures": self.failures,
+            "retries": self.retries,
+            "rejected": self.rejected,
+            "in_flight": self.in_flight,
+            "latency_seconds": {
+                "p50": percentile(0.5),
+                "p95": percentile(0.95),
+                "max": round(latencies[-1], 3) if latencies else None
+            },
+            "tokens": {
+                "prompt": self.prompt_tokens,
+                "completion": self.completion_tokens
+            }
+        }
+
+
+class LLMTransport:
+    """LLM 传输层 - 共享异步连接池（HTTP/2 keep-alive）、抖动重试、按后端并发限制、熔断与指标
+
+    连接池、信号量和熔断状态都只在内部独立线程的事件循环中访问；
+    同步代码通过 post_json_sync 调用，异步代码 await post_json。
+    """
+
+    def __init__(self, policies: Optional[Dict[str, BackendPolicy]] = None):
+        self.policies = policies or {
+            "deepseek": BackendPolicy(
+                max_concurrency=settings.DEEPSEEK_MAX_CONCURRENCY,
+                timeout=settings.LLM_REQUEST_TIMEOUT,
+                max_retries=settings.LLM_MAX_RETRIES
+            ),
+            "ollama": BackendPolicy(
+                max_concurrency=settings.OLLAMA_MAX_CONCURRENCY,
+                timeout=settings.OLLAMA_REQUEST_TIMEOUT,
+                max_retries=settings.LLM_MAX_RETRIES
+            )
+        }
+        self.metrics: Dict[str, BackendMetrics] = {name: BackendMetrics() for name in self.policies}
+        self.breakers: Dict[str, CircuitBreaker] = {
+            name: CircuitBreaker(settings.LLM_CIRCUIT_FAILURE_THRESHOLD, settings.LLM_CIRCUIT_RESET_SECONDS)
+            for name in self.policies
+        }
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        """启动后台事件循环线程（首次调用时）"""
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    thread = threading.Thread(target=loop.run_forever, name="llm-transport", daemon=True)
+                    thread.start()
+                    self._thread = thread
+                    self._loop = loop
+        return self._loop
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            try:
+                import h2  # noqa: F401
+                http2 = True
+            except ImportError:
+                http2 = False
+            self._client = httpx.AsyncClient(
+                http2=http2,
+                limits=httpx.Limits(
+                    max_connections=settings.HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=60.0
+                )
+            )
+            logger.info(f"LLM 传输层连接池已创建 (HTTP/2: {http2})")
+        return self._client
+
+    def _get_semaphore(self, backend: str) -> asyncio.Semaphore:
+        if backend not in self._semaphores:
+            self._semaphores[backend] = asyncio.Semaphore(self.policies[backend].max_concurrency)
+        return self._semaphores[backend]
+
+    def _retry_delay(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        """重试等待：优先遵循 Retry-After，否则指数退避 + 全抖动"""
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after:
+                try:
+                    return min(float(retry_after), settings.LLM_RETRY_MAX_DELAY)
+                except ValueError:
+                    pass
+        cap = min(settings.LLM_RETRY_MAX_DELAY, settings.LLM_RETRY_BASE_DELAY * (2 ** attempt))
+        return random.uniform(0, cap)
+
+    async def post_json(
+        self,
+        backend: str,
+        url: str,
+        payload: Dict[str, Any],
+        headers: Optional[Dict[str, str]] = None
+    ) -> Dict[str, Any]:
+        """
+        向指定后端发送 JSON POST 请求（异步入口，可在任意事件循环中 await）
+
+        Args:
+            backend: 后端名称（deepseek/ollama），决定并发上限、超时和熔断状态
+            url: 请求地址
+            payload: 请求体
+            headers: 请求头
+        """
+        loop = self._ensure_loop()
+        future = asyncio.run_coroutine_threadsafe(self._post_json(backend, url, payload, headers), loop)
+        return await asyncio.wrap_future(future)
+
+    def post_json_sync(
+        self,
+        backend: str,
+        url: str,
+        payload: Dict[str, Any],
+        headers: Optional[Dict[str, str]] = None
+    ) -> Dict[str, Any]:
+        """同步调用入口：提交到后台事件循环并等待结果"""
+        loop = self._ensure_loop()
+        future = asyncio.run_coroutine_threadsafe(self._post_json(backend, url, payload, headers), loop)
+        return future.result()
+
+    async def _post_json(
+        self,
+        backend: str,
+        url: str,
+        payload: Dict[str, Any],
+        headers: Optional[Dict[str, str]]
+    ) -> Dict[str, Any]:
+        """在传输层事件循环内执行：熔断检查、并发限制、重试"""
+        policy = self.policies[backend]
+        metrics = self.metrics[backend]
+        breaker = self.breakers[backend]
+
+        if not breaker.allow():
+            metrics.rejected += 1
+            raise LLMTransportError(f"{backend} 后端已熔断，请稍后重试")
+
+        client = self._get_client()
+        metrics.requests += 1
+        last_error = None
+
+        async with self._get_semaphore(backend):
+            metrics.in_flight += 1
+            try:
+                for attempt in range(policy.max_retries + 1):
+                    response = None
+                    started = time.perf_counter()
+                    try:
+                        response = await client.post(url, json=payload, headers=headers, timeout=policy.timeout)
+                        if response.status_code == 200:
+                            metrics.latencies.append(time.perf_counter() - started)
+                            result = response.json()
+                            self._record_tokens(metrics, result)
+                            metrics.successes += 1
+                            breaker.record_success()
+                            return result
+                        last_error = LLMTransportError(
+                            f"{backend} API调用失败 ({response.status_code}): {response.text[:500]}",
+                            status_code=response.status_code
+                        )
+                        if response.status_code not in RETRY_STATUS_CODES:
+                            break
+                    except (httpx.TimeoutException, httpx.TransportError) as e:
+                        last_error = LLMTransportError(f"{backend} 连接失败: {str(e) or type(e).__name__}")
+
+                    if attempt < policy.max_retries:
+                        delay = self._retry_delay(attempt, response)
+                        metrics.retries += 1
+                        logger.warning(f"{backend} 调用失败，{delay:.2f}s 后第 {attempt + 1} 次重试: {last_error}")
+                        await asyncio.sleep(delay)
+            finally:
+                metrics.in_flight -= 1
+
+        metrics.failures += 1
+        breaker.record_failure()
+        raise last_error
+
+    def _record_tokens(self, metrics: BackendMetrics, result: Dict[str, Any]):
+        """记录 token 用量（兼容 OpenAI usage 与 Ollama eval_count 格式）"""
+        usage = result.get("usage") or {}
+        metrics.prompt_tokens += int(usage.get("prompt_tokens") or result.get("prompt_eval_count") or 0)
+        metrics.completion_tokens += int(usage.get("completion_tokens") or result.get("eval_count") or 0)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """各后端调用指标与熔断状态"""
+        return {
+            name: {
+                **self.metrics[name].snapshot(),
+                "circuit": self.breakers[name].state,
+                "max_concurrency": self.policies[name].max_concurrency
+            }
+            for name in self.policies
+        }
+
+    def close(self):
+        """关闭连接池并停止后台事件循环"""
+        if self._loop is None:
+            return
+        if self._client is not None:
+            asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop).result(timeout=10)
+            self._client = None
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._loop = None
+        self._thread = None
+        self._semaphores = {}
+
+
+llm_transport = LLMTransport()
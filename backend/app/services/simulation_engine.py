@@ -1,165 +1,161 @@
+import asyncio
+import heapq
 import logging
-import random
 import json
+import time
+import uuid
 from datetime import datetime
-from typing import Dict, Any, List, Optional
+from typing import AsyncIterator, Dict, Any, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.cache import LRUCache
+from app.services.feature_extract import KeywordAutomaton, extract_column_features
+from app.services.simulation_plan import SimulationPlan
+from app.services.simulation_model import FittedTableModel, FittedSimulationPlan
+from app.services.simulation_replay import TableReplay
+from app.services.simulation_store import SimulationLimitError, SimulationStore, simulation_store
 
 logger = logging.getLogger(__name__)
 
+FEATURE_CACHE_SIZE = 128
+# 空闲停止与过期清理的检查间隔（秒）
+EVICT_INTERVAL = 30.0
+
+
+class SimulationBuffer:
+    """模拟数据环形缓冲 - 固定容量，按递增序号写入，超出容量时覆盖最旧的行
+
+    每行写入时同时保存一份 JSON 编码，推送给多个订阅端时直接拼接，不再逐连接序列化。
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, capacity)
+        self.slots: List[Optional[Dict[str, Any]]] = [None] * self.capacity
+        self.encoded: List[Optional[str]] = [None] * self.capacity
+        self.next_seq = 0
+
+    @property
+    def first_seq(self) -> int:
+        return max(0, self.next_seq - self.capacity)
+
+    def extend(self, rows: List[Dict[str, Any]]):
+        # 单批超过容量时只保留最后 capacity 行，序号仍按全部行推进
+        skip = max(0, len(rows) - self.capacity)
+        self.next_seq += skip
+        for row in rows[skip:]:
+            slot = self.next_seq % self.capacity
+            self.slots[slot] = row
+            self.encoded[slot] = json.dumps(row, ensure_ascii=False, default=str)
+            self.next_seq += 1
+
+    def _range(self, since: Optional[int], limit: int) -> Tuple[int, int, int]:
+        """返回 (起始序号, 结束序号, since 之后已被覆盖的行数)"""
+        limit = max(0, limit)
+        if since is None:
+            start = max(self.first_seq, self.next_seq - limit)
+        else:
+            start = max(self.first_seq, since + 1)
+        dropped = max(0, start - since - 1) if since is not None else 0
+        return start, min(self.next_seq, start + limit), dropped
+
+    def _result(self, since: Optional[int], start: int, end: int, dropped: int, items: List[Any]) -> Dict[str, Any]:
+        return {
+            "rows": items,
+            "last_seq": end - 1 if end > start else (since if since is not None else self.next_seq - 1),
+            "dropped": dropped,
+            "has_more": end < self.next_seq
+        }
+
+    def read(self, since: Optional[int], limit: int) -> Dict[str, Any]:
+        start, end, dropped = self._range(since, limit)
+        rows = [self.slots[seq % self.capacity] for seq in range(start, end)]
+        return self._result(since, start, end, dropped, rows)
+
+    def read_encoded(self, since: Optional[int], limit: int) -> Dict[str, Any]:
+        """同 read，rows 为各行的 JSON 编码"""
+        start, end, dropped = self._range(since, limit)
+        rows = [self.encoded[seq % self.capacity] for seq in range(start, end)]
+        return self._result(since, start, end, dropped, rows)
+
 
 class SimulationEngine:
-    """数据模拟引擎"""
+    """数据模拟引擎
+
+    active_simulations 只保存本进程生成数据的模拟；状态与最近的数据行定期写入共享存储（SimulationStore），
+    其他工作进程上的查询、读取、推送与停止通过共享存储完成。
+    """
     
-    def __init__(self):
+    def __init__(self, store: Optional[SimulationStore] = None):
         self.active_simulations: Dict[str, Dict] = {}
+        self.store = store or simulation_store
+        self._models = LRUCache(maxsize=settings.SIMULATION_MODEL_CACHE_SIZE)
+        self._features = LRUCache(maxsize=FEATURE_CACHE_SIZE)
+        self._automata = LRUCache(maxsize=FEATURE_CACHE_SIZE)
+        self._heap: List[Tuple[float, str]] = []
+        self._due: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush: Optional[asyncio.Future] = None
+        self._next_housekeeping = 0.0
+        self._next_evict = 0.0
     
-    def generate_simulation_data(
+    def fit_model(
         self,
-        columns: List[str],
-        row_count: int = 100,
-        analysis_features: Optional[Dict[str, Any]] = None
-    ) -> List[Dict[str, Any]]:
-        """生成模拟数据"""
-        
-        if not columns:
-            return []
-        
-        simulation_data = []
-        
-        for i in range(row_count):
-            row = {}
-            for col in columns:
-                row[col] = self._generate_field_value(
-                    col, 
-                    analysis_features.get(col, {}) if analysis_features else {}
-                )
-            row['_timestamp'] = datetime.now().isoformat()
-            row['_index'] = i
-            simulation_data.append(row)
-        
-        return simulation_data
-    
-    def _generate_field_value(
-        self, 
-        column_name: str, 
-        features: Dict[str, Any]
-    ) -> Any:
-        """根据字段特征生成模拟值"""
-        
-        col_lower = column_name.lower()
-        
-        if features:
-            missing_rate = features.get('missing_rate', 0)
-            if random.random() < missing_rate:
-                return None
-            
-            anomaly_rate = features.get('anomaly_rate', 0)
-            if random.random() < anomaly_rate:
-                return self._generate_anomaly_value(col_lower)
-            
-            value_range = features.get('value_range')
-            if value_range:
-                return random.uniform(value_range[0], value_range[1])
-        
-        if any(keyword in col_lower for keyword in ['温度', 'temp', 'temperature']):
-            return round(random.uniform(20, 100), 1)
-        
-        elif any(keyword in col_lower for keyword in ['压力', 'pressure']):
-            return round(random.uniform(0.1, 1.0), 3)
-        
-        elif any(keyword in col_lower for keyword in ['电流', 'current']):
-            return round(random.uniform(0, 100), 2)
-        
-        elif any(keyword in col_lower for keyword in ['电压', 'voltage']):
-            return round(random.uniform(220, 250), 1)
-        
-        elif any(keyword in col_lower for keyword in ['功率', 'power']):
-            return round(random.uniform(0, 50), 2)
-        
-        elif any(keyword in col_lower for keyword in ['效率', 'efficiency']):
-            return round(random.uniform(60, 95), 1)
-        
-        elif any(keyword in col_lower for keyword in ['转速', 'speed', 'rpm']):
-            return random.randint(500, 3000)
-        
-        elif any(keyword in col_lower for keyword in ['时间', 'time', 'date']):
-            return datetime.now().isoformat()
-        
-        elif any(keyword in col_lower for keyword in ['状态', 'status', 'flag']):
-            return random.choice(['正常', '运行', '停止', '告警', '正常', '运行'])
-        
-        elif any(keyword in col_lower for keyword in ['id', '编号', 'no']):
-            return f"EQ{random.randint(1000, 9999)}"
-        
-        else:
-            return random.randint(1, 100)
-    
-    def _generate_anomaly_value(self, column_name: str) -> Any:
-        """生成异常值"""
-        anomaly_type = random.choice(['high', 'low', 'zero', 'negative'])
-        
-        if '温度' in column_name or 'temp' in column_name:
-            return 150 if anomaly_type == 'high' else -10
-        
-        elif '压力' in column_name or 'pressure' in column_name:
-            return 2.0 if anomaly_type == 'high' else 0
-        
-        elif '电流' in column_name or 'current' in column_name:
-            return -5 if anomaly_type == 'negative' else 500
-        
-        elif '电压' in column_name or 'voltage' in column_name:
-            return 0 if anomaly_type == 'zero' else 380
-        
-        else:
-            return 9999
-    
+        rows: List[Dict[str, Any]],
+        columns: Optional[List[str]] = None,
+        cache_key: Optional[str] = None
+    ) -> Optional[FittedTableModel]:
+        """
+        由表数据拟合模拟模型（按表版本缓存）；数据行数不足 SIMULATION_FIT_MIN_ROWS 时返回 None
+
+        Args:
+            rows: 表数据行（TableData.data）
+            columns: 列顺序
+            cache_key: 缓存键（TableData.version_key）
+        """
+        if len(rows or []) < settings.SIMULATION_FIT_MIN_ROWS:
+            return None
+        if cache_key is not None:
+            model = self._models.get(cache_key)
+            if model is not None:
+                return model
+        try:
+            model = FittedTableModel.fit(rows, columns)
+        except Exception as e:
+            logger.error(f"模拟模型拟合失败: {str(e)}")
+            return None
+        if cache_key is not None:
+            self._models.set(cache_key, model)
+        return model
+
     def extract_features_from_analysis(
         self, 
         analysis_result: Dict[str, Any],
-        columns: List[str] = None
+        columns: List[str] = None,
+        cache_key: Optional[str] = None
     ) -> Dict[str, Any]:
-        """从AI分析结果中提取字段特征"""
-        
-        features = {}
-        
-        content = analysis_result.get('content', '')
-        
-        import re
-        
-        for col in (columns or []):
-            col_features = {}
-            col_lower = col.lower()
-            
-            missing_patterns = [
-                rf'{col}[^。\n]{0,20}缺失[^。\n]{0,20}(\d+\.?\d*)%',
-                rf'{col}[^。\n]{0,20}缺失率[^。\n]{0,20}(\d+\.?\d*)%'
-            ]
-            
-            for pattern in missing_patterns:
-                match = re.search(pattern, content, re.IGNORECASE)
-                if match:
-                    rate = float(match.group(1))
-                    if rate > 1:
-                        rate = rate / 100
-                    col_features['missing_rate'] = rate
-                    break
-            
-            anomaly_patterns = [
-                rf'{col}[^。\n]{0,20}异常[^。\n]{0,20}(\d+\.?\d*)%',
-                rf'{col}[^。\n]{0,20}异常值[^。\n]{0,20}(\d+\.?\d*)%'
-            ]
-            
-            for pattern in anomaly_patterns:
-                match = re.search(pattern, content, re.IGNORECASE)
-                if match:
-                    rate = float(match.group(1))
-                    if rate > 1:
-                        rate = rate / 100
-                    col_features['anomaly_rate'] = rate
-                    break
-            
-            if col_features:
-                features[col] = col_features
+        """
+        从AI分析结果中提取字段特征（一次扫描匹配全部列名，见 extract_column_features）
+
+        Args:
+            analysis_result: 分析结果（content 为分析文本）
+            columns: 列名
+            cache_key: 分析记录 ID；提供时按记录、文本与列名缓存提取结果
+        """
+        columns = list(columns or [])
+        content = (analysis_result or {}).get('content', '') or ''
+        
+        key = (cache_key, hash(content), tuple(columns)) if cache_key is not None else None
+        cached = self._features.get(key) if key is not None else None
+        if cached is not None:
+            return {col: dict(col_features) for col, col_features in cached.items()}
+        
+        automaton_key = tuple(columns)
+        automaton = self._automata.get(automaton_key)
+        if automaton is None:
+            automaton = KeywordAutomaton([col.lower() for col in columns])
+            self._automata.set(automaton_key, automaton)
+        features = extract_column_features(content, columns, automaton)
         
         if not features and columns:
             for col in columns[:3]:
@@ -169,52 +165,517 @@ class SimulationEngine:
                 }
         
         logger.info(f"提取到模拟特征: {features}")
+        if key is not None:
+            self._features.set(key, {col: dict(col_features) for col, col_features in features.items()})
         return features
     
-    def start_simulation(
+    async def _store_call(self, method, *args):
+        """在线程池中访问共享存储，不阻塞事件循环"""
+        return await asyncio.get_running_loop().run_in_executor(None, method, *args)
+
+    async def start_simulation(
         self,
         simulation_id: str,
         columns: List[str],
-        interval: int = 5,
-        analysis_features: Optional[Dict[str, Any]] = None
+        interval: float = 5,
+        analysis_features: Optional[Dict[str, Any]] = None,
+        rows_per_tick: Optional[int] = None,
+        model: Optional[FittedTableModel] = None,
+        fault_rate: Optional[float] = None,
+        replay: Optional[TableReplay] = None,
+        seed: Optional[int] = None
     ) -> Dict[str, Any]:
-        """启动模拟"""
-        
+        """
+        启动模拟：由共享调度循环按 interval 秒周期生成数据写入环形缓冲
+
+        Args:
+            simulation_id: 模拟 ID（同 ID 重复启动会替换原模拟，包括其他工作进程上运行的）
+            columns: 列名
+            interval: 生成间隔（秒）
+            analysis_features: 字段特征
+            rows_per_tick: 每次生成的行数，默认 SIMULATION_ROWS_PER_TICK
+            model: 由真实数据拟合的模型（见 fit_model），提供时按模型生成，否则按列名关键字与 analysis_features 生成
+            fault_rate: 每个数值列每步随机发生故障片段的概率，默认 SIMULATION_FAULT_RATE
+            replay: 历史表回放源，提供时按原始时间间隔 / 倍速输出表中的真实行（interval 为最长检查间隔）
+            seed: 随机种子，默认随机生成；记录在模拟状态中，以同样的参数与种子启动可得到相同的数据序列
+
+        Raises:
+            SimulationLimitError: 所有工作进程中运行的模拟已达 SIMULATION_MAX_ACTIVE 个
+        """
+        self._evict(time.time())
+        fault_rate = settings.SIMULATION_FAULT_RATE if fault_rate is None else fault_rate
+        interval = max(float(interval), settings.SIMULATION_MIN_INTERVAL)
+        model_summary = model.summary() if model else {'type': 'replay' if replay else 'keyword'}
+        # 每个模拟使用独立的计划实例与随机数流，信号状态与故障片段互不影响
+        plan = None if replay else (
+            FittedSimulationPlan(model, fault_rate, seed) if model
+            else SimulationPlan(columns, analysis_features, fault_rate, seed)
+        )
+        seed = plan.seed if plan else None
+        run_id = str(uuid.uuid4())
+        await self._store_call(
+            self.store.claim,
+            simulation_id,
+            run_id,
+            {'columns': columns, 'interval': interval, 'model': model_summary, 'seed': seed},
+            settings.SIMULATION_MAX_ACTIVE
+        )
         self.active_simulations[simulation_id] = {
             'columns': columns,
             'interval': interval,
             'analysis_features': analysis_features or {},
             'status': 'running',
             'start_time': datetime.now().isoformat(),
-            'data_count': 0
+            'data_count': 0,
+            'rows_per_tick': rows_per_tick or settings.SIMULATION_ROWS_PER_TICK,
+            'plan': plan,
+            'seed': seed,
+            'replay': replay,
+            'model': model_summary,
+            'buffer': SimulationBuffer(settings.SIMULATION_BUFFER_SIZE),
+            'updated': asyncio.Event(),
+            'subscribers': 0,
+            # 共享存储同步：运行实例 ID、已写入的序号、已写入的状态；空闲判断用的最后访问时间（Unix 秒）
+            'run_id': run_id,
+            'flushed_seq': 0,
+            'stored_status': 'running',
+            'last_access': time.time(),
+            'stopped_at': None
         }
+        self._schedule(simulation_id, time.monotonic())
         
         return {
             'simulation_id': simulation_id,
             'status': 'started',
-            'message': f'模拟已启动，间隔 {interval} 秒'
+            'model': 'replay' if replay else ('fitted' if model else 'keyword'),
+            'seed': seed,
+            'message': (
+                f'回放已启动，{replay.speed:g} 倍速' if replay
+                else f'模拟已启动，间隔 {interval:g} 秒'
+            )
         }
     
-    def stop_simulation(self, simulation_id: str) -> Dict[str, Any]:
-        """停止模拟"""
-        
-        if simulation_id in self.active_simulations:
-            self.active_simulations[simulation_id]['status'] = 'stopped'
+    async def stop_simulation(self, simulation_id: str) -> Dict[str, Any]:
+        """停止模拟（保留已生成的数据，调度循环不再为其生成新行）；其他进程上的模拟通过共享存储停止"""
+        
+        simulation = self.active_simulations.get(simulation_id)
+        if simulation is not None:
+            if simulation['status'] == 'running':
+                self._mark_stopped(simulation, 'stopped')
+                if await self._store_call(self.store.set_status, simulation_id, 'stopped', simulation['run_id']):
+                    simulation['stored_status'] = 'stopped'
+        elif (
+            not await self._store_call(self.store.set_status, simulation_id, 'stopped')
+            and await self._store_call(self.store.get, simulation_id) is None
+        ):
             return {
                 'simulation_id': simulation_id,
-                'status': 'stopped',
-                'message': '模拟已停止'
+                'status': 'error',
+                'message': '模拟不存在'
             }
         
         return {
             'simulation_id': simulation_id,
-            'status': 'error',
-            'message': '模拟不存在'
+            'status': 'stopped',
+            'message': '模拟已停止'
         }
     
-    def get_simulation_status(self, simulation_id: str) -> Optional[Dict[str, Any]]:
-        """获取模拟状态"""
-        return self.active_simulations.get(simulation_id)
+    async def get_simulation_status(self, simulation_id: str) -> Optional[Dict[str, Any]]:
+        """获取模拟状态（本进程的模拟直接读取，其他进程的模拟从共享存储读取）"""
+        simulation = self.active_simulations.get(simulation_id)
+        if simulation is None:
+            state = await self._store_call(self.store.get, simulation_id)
+            return {**state, 'faults': [], 'subscribers': 0} if state else None
+        return {
+            'status': simulation['status'],
+            'start_time': simulation['start_time'],
+            'interval': simulation['interval'],
+            'columns': simulation['columns'],
+            'seed': simulation['seed'],
+            'model': simulation['replay'].status() if simulation.get('replay') else simulation['model'],
+            'faults': simulation['plan'].faults.status() if simulation.get('plan') else [],
+            'data_count': simulation['data_count'],
+            'buffered_from_seq': simulation['buffer'].first_seq,
+            'subscribers': simulation['subscribers'],
+            'owner': self.store.worker_id
+        }
+
+    async def _local(self, simulation_id: str) -> Dict[str, Any]:
+        """本进程运行的模拟；不存在时抛出 KeyError，在其他工作进程上运行时抛出 ValueError"""
+        simulation = self.active_simulations.get(simulation_id)
+        if simulation is not None:
+            return simulation
+        if await self._store_call(self.store.get, simulation_id) is not None:
+            raise ValueError("模拟运行在其他工作进程上，无法在当前进程操作")
+        raise KeyError(simulation_id)
+
+    async def inject_fault(
+        self,
+        simulation_id: str,
+        column: str,
+        kind: str,
+        duration: Optional[int] = None,
+        magnitude: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        在模拟的下一批数据中注入故障片段
+
+        Args:
+            column: 数值列名
+            kind: overheat（缓慢过热/漂移）/ stuck（传感器卡死）/ dropout（数据缺失）
+            duration: 持续行数
+            magnitude: overheat 的最大偏移量，默认按列波动幅度估算
+        """
+        simulation = await self._local(simulation_id)
+        if simulation['plan'] is None:
+            raise ValueError("回放模式不支持故障注入")
+        return simulation['plan'].faults.schedule(column, kind, duration, magnitude)
+
+    async def seek_simulation(self, simulation_id: str, position: str) -> Dict[str, Any]:
+        """
+        回放跳转到指定位置（已播放完的回放会从该位置重新开始）
+
+        Args:
+            position: 时间字符串；数值时间列为数值，无时间列时为行号
+        """
+        simulation = await self._local(simulation_id)
+        replay: Optional[TableReplay] = simulation.get('replay')
+        if replay is None:
+            raise ValueError("只有回放模式支持跳转")
+        status = await replay.seek(position, time.monotonic)
+        if simulation['status'] == 'completed':
+            simulation['status'] = 'running'
+            simulation['stopped_at'] = None
+            await self._store_call(self.store.set_status, simulation_id, 'running', simulation['run_id'])
+            simulation['stored_status'] = 'running'
+        if simulation['status'] == 'running':
+            self._schedule(simulation_id, time.monotonic())
+        return status
+
+    async def read_simulation_data(
+        self,
+        simulation_id: str,
+        since: Optional[int] = None,
+        limit: int = 20
+    ) -> Optional[Dict[str, Any]]:
+        """
+        读取模拟已生成的数据
+
+        Args:
+            since: 上次读取返回的 last_seq，返回其后的行；为空时返回最近 limit 行
+            limit: 最多返回行数
+
+        Returns:
+            rows、last_seq（本次最后一行序号，下次作为 since 传入）、dropped（since 之后已被环形缓冲覆盖的行数）
+        """
+        simulation = self.active_simulations.get(simulation_id)
+        if simulation is None:
+            result = await self._store_call(self.store.read, simulation_id, since, limit)
+            if result is None:
+                return None
+            return {**result, 'rows': [json.loads(row) for row in result['rows']]}
+        simulation['last_access'] = time.time()
+        return simulation['buffer'].read(since, limit)
+
+    def _schedule(self, simulation_id: str, due: float):
+        """登记下一次生成时间，并在需要时启动/唤醒共享调度循环"""
+        self._due[simulation_id] = due
+        heapq.heappush(self._heap, (due, simulation_id))
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run_scheduler())
+        else:
+            self._wakeup.set()
+
+    def _tick(self, simulation_id: str, due: float, now: float) -> Optional[float]:
+        """为到期的模拟生成数据，返回下一次生成时间（模拟已停止或被替换时返回 None）"""
+        simulation = self.active_simulations.get(simulation_id)
+        if simulation is None or simulation['status'] != 'running':
+            return None
+
+        replay: Optional[TableReplay] = simulation.get('replay')
+        if replay is not None:
+            return self._tick_replay(simulation, replay, now)
+
+        interval = simulation['interval']
+        # 调度落后时补齐错过的周期（最多补满一个缓冲区）
+        ticks = min(int((now - due) // interval) + 1, max(1, settings.SIMULATION_BUFFER_SIZE))
+        buffer: SimulationBuffer = simulation['buffer']
+        rows = simulation['plan'].generate(
+            simulation['rows_per_tick'] * ticks, "records", start_index=buffer.next_seq
+        )
+        buffer.extend(rows)
+        simulation['data_count'] = buffer.next_seq
+        self._notify(simulation)
+        return due + ticks * interval
+
+    def _tick_replay(self, simulation: Dict[str, Any], replay: TableReplay, now: float) -> Optional[float]:
+        """输出回放中已到期的行；下一次检查安排在下一行到期时（最长 interval 秒），播放结束时返回 None"""
+        buffer: SimulationBuffer = simulation['buffer']
+        rows = replay.advance(now)
+        if rows:
+            timestamp = datetime.now().isoformat()
+            # 循环回放时同一行对象会再次输出，附加字段写在副本上
+            rows = [
+                {**row, '_timestamp': timestamp, '_index': buffer.next_seq + i}
+                for i, row in enumerate(rows)
+            ]
+            buffer.extend(rows)
+            simulation['data_count'] = buffer.next_seq
+        if replay.finished:
+            self._mark_stopped(simulation, 'completed')
+            return None
+        if rows:
+            self._notify(simulation)
+
+        next_due = replay.next_due()
+        # 下一页仍在预取时稍后重试
+        if next_due is None:
+            next_due = now + settings.SIMULATION_MIN_INTERVAL
+        return min(max(next_due, now + settings.SIMULATION_MIN_INTERVAL), now + simulation['interval'])
+
+    def _mark_stopped(self, simulation: Dict[str, Any], status: str):
+        simulation['status'] = status
+        simulation['stopped_at'] = time.time()
+        self._notify(simulation)
+
+    @staticmethod
+    def _notify(simulation: Dict[str, Any]):
+        """唤醒等待该模拟新数据的订阅端（换上新的 Event，供下一轮等待）"""
+        event = simulation.get('updated')
+        if event is not None:
+            simulation['updated'] = asyncio.Event()
+            event.set()
+
+    async def subscribe(
+        self,
+        simulation_id: str,
+        since: Optional[int] = None,
+        max_batch: Optional[int] = None,
+        min_interval: Optional[float] = None,
+        heartbeat: Optional[float] = None
+    ) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """
+        订阅模拟数据推送：所有订阅端共享同一个生产者与环形缓冲，各自只维护读取位置
+
+        每批最多 max_batch 行、两批之间至少间隔 min_interval 秒；订阅端消费过慢时直接跳到缓冲中最旧的行，
+        跳过的行数通过 dropped 告知（背压：不为慢连接堆积队列）。heartbeat 秒内无新数据时产出 None 作为心跳。
+        模拟停止或被替换后，推送完剩余数据即结束。其他工作进程上的模拟改为轮询共享存储。
+
+        Yields:
+            {"rows": 行 JSON 编码列表, "last_seq", "dropped", "has_more"} 或 None（心跳）
+        """
+        max_batch = max_batch or settings.SIMULATION_PUSH_MAX_BATCH
+        min_interval = settings.SIMULATION_PUSH_MIN_INTERVAL if min_interval is None else min_interval
+        heartbeat = heartbeat or settings.SIMULATION_PUSH_HEARTBEAT
+        simulation = self.active_simulations.get(simulation_id)
+        if simulation is None:
+            async for batch in self._subscribe_remote(simulation_id, since, max_batch, min_interval, heartbeat):
+                yield batch
+            return
+        buffer: SimulationBuffer = simulation['buffer']
+        cursor = since if since is not None else buffer.next_seq - 1
+
+        simulation['subscribers'] += 1
+        try:
+            while True:
+                event = simulation['updated']
+                if buffer.next_seq - 1 > cursor:
+                    batch = buffer.read_encoded(cursor, max_batch)
+                    cursor = batch["last_seq"]
+                    yield batch
+                    if not batch["has_more"] and min_interval > 0:
+                        await asyncio.sleep(min_interval)
+                    continue
+
+                if simulation['status'] != 'running' or self.active_simulations.get(simulation_id) is not simulation:
+                    return
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            simulation['subscribers'] -= 1
+            simulation['last_access'] = time.time()
+
+    async def _subscribe_remote(
+        self,
+        simulation_id: str,
+        since: Optional[int],
+        max_batch: int,
+        min_interval: float,
+        heartbeat: float
+    ) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """按写入间隔轮询共享存储中其他进程写入的新行"""
+        loop = asyncio.get_running_loop()
+        poll = max(min_interval, settings.SIMULATION_STORE_FLUSH_INTERVAL)
+        cursor = since
+        if cursor is None:
+            latest = await loop.run_in_executor(None, self.store.read, simulation_id, None, 0)
+            if latest is None:
+                return
+            cursor = latest['last_seq']
+        quiet_since = time.monotonic()
+        while True:
+            batch = await loop.run_in_executor(None, self.store.read, simulation_id, cursor, max_batch)
+            if batch is None:
+                return
+            if batch['rows']:
+                cursor = batch['last_seq']
+                quiet_since = time.monotonic()
+                yield batch
+                if batch['has_more']:
+                    continue
+            elif batch['status'] != 'running':
+                return
+            elif time.monotonic() - quiet_since >= heartbeat:
+                quiet_since = time.monotonic()
+                yield None
+            await asyncio.sleep(poll)
+
+    async def _run_scheduler(self):
+        """共享调度循环：所有模拟按各自的下次生成时间排在同一个最小堆中，并定期执行共享存储同步与过期清理"""
+        try:
+            while self._heap or self.active_simulations:
+                now = time.monotonic()
+                if now >= self._next_housekeeping:
+                    self._next_housekeeping = now + settings.SIMULATION_STORE_FLUSH_INTERVAL
+                    self._housekeep()
+                    continue
+
+                due, simulation_id = self._heap[0] if self._heap else (float("inf"), None)
+                delay = min(due, self._next_housekeeping) - now
+                if delay > 0:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                heapq.heappop(self._heap)
+                # 同一模拟重复启动时堆中可能有旧的登记，只处理与当前模拟对象对应的那一条
+                if self._due.get(simulation_id, due) != due:
+                    continue
+                try:
+                    next_due = self._tick(simulation_id, due, time.monotonic())
+                except Exception as e:
+                    logger.error(f"模拟数据生成失败 {simulation_id}: {str(e)}")
+                    # 标记为失败：不再发送运行心跳，也不再占用同时运行的名额
+                    simulation = self.active_simulations.get(simulation_id)
+                    if simulation is not None:
+                        self._mark_stopped(simulation, 'failed')
+                    next_due = None
+                if next_due is None:
+                    self._due.pop(simulation_id, None)
+                else:
+                    self._due[simulation_id] = next_due
+                    heapq.heappush(self._heap, (next_due, simulation_id))
+        except asyncio.CancelledError:
+            pass
+
+    def _collect_updates(self) -> List[Dict[str, Any]]:
+        """本进程各模拟待写入共享存储的新行与状态（运行中的模拟每次都写入，作为心跳）"""
+        updates = []
+        for simulation_id, simulation in self.active_simulations.items():
+            buffer: SimulationBuffer = simulation['buffer']
+            pending = buffer.next_seq > simulation['flushed_seq']
+            if simulation['status'] != 'running' and not pending and simulation['stored_status'] == simulation['status']:
+                continue
+            rows = []
+            if pending:
+                batch = buffer.read_encoded(simulation['flushed_seq'] - 1, buffer.capacity)
+                start = batch['last_seq'] - len(batch['rows']) + 1
+                rows = list(zip(range(start, batch['last_seq'] + 1), batch['rows']))
+                simulation['flushed_seq'] = buffer.next_seq
+            simulation['stored_status'] = simulation['status']
+            updates.append({
+                'simulation_id': simulation_id,
+                'run_id': simulation['run_id'],
+                'status': simulation['status'],
+                'next_seq': buffer.next_seq,
+                'rows': rows
+            })
+        return updates
+
+    def _housekeep(self):
+        """周期维护：新行与心跳在线程池中批量写入共享存储（上一批未完成时跳过），按 EVICT_INTERVAL 清理过期模拟"""
+        if self._flush is None or self._flush.done():
+            updates = self._collect_updates()
+            if updates:
+                self._flush = asyncio.get_running_loop().run_in_executor(
+                    None, self.store.flush, updates, settings.SIMULATION_BUFFER_SIZE
+                )
+                self._flush.add_done_callback(self._flushed)
+        now = time.time()
+        if now >= self._next_evict:
+            self._next_evict = now + EVICT_INTERVAL
+            self._evict(now)
+
+    def _flushed(self, future: asyncio.Future):
+        try:
+            lost, last_access = future.result()
+        except Exception as e:
+            logger.error(f"模拟数据写入共享存储失败: {str(e)}")
+            return
+        lost = set(lost)
+        for simulation_id, simulation in list(self.active_simulations.items()):
+            if simulation['run_id'] in lost:
+                # 已被其他进程替换或停止：本进程不再生成，读取改走共享存储
+                del self.active_simulations[simulation_id]
+                self._mark_stopped(simulation, 'stopped')
+                logger.info(f"模拟已在其他工作进程停止或替换: {simulation_id}")
+        for simulation_id, accessed in last_access.items():
+            simulation = self.active_simulations.get(simulation_id)
+            if simulation is not None and accessed is not None:
+                simulation['last_access'] = max(simulation['last_access'], accessed.timestamp())
+
+    def _evict(self, now: float):
+        """
+        空闲停止与过期清理
+
+        运行中且无订阅端、超过 SIMULATION_IDLE_TIMEOUT 秒未被读取的模拟自动停止；
+        停止超过 SIMULATION_TTL 秒（且数据已写入共享存储）的模拟从本进程移除，共享存储中的过期记录一并删除。
+        """
+        expired = []
+        for simulation_id, simulation in self.active_simulations.items():
+            if simulation['status'] == 'running':
+                idle = now - simulation['last_access']
+                if 0 < settings.SIMULATION_IDLE_TIMEOUT < idle and simulation['subscribers'] == 0:
+                    self._mark_stopped(simulation, 'stopped')
+                    logger.info(f"模拟空闲 {idle:.0f} 秒，自动停止: {simulation_id}")
+            elif (
+                now - simulation['stopped_at'] > settings.SIMULATION_TTL
+                and simulation['flushed_seq'] == simulation['buffer'].next_seq
+                and simulation['stored_status'] == simulation['status']
+            ):
+                expired.append(simulation_id)
+        for simulation_id in expired:
+            del self.active_simulations[simulation_id]
+        if expired:
+            logger.info(f"移除过期模拟: {len(expired)} 个")
+        asyncio.get_running_loop().run_in_executor(None, self.store.expire, settings.SIMULATION_TTL)
+
+    async def shutdown(self):
+        """停止调度循环，本进程的模拟标记为已停止并写入共享存储（应用关闭时调用）"""
+        task, self._task = self._task, None
+        if task is not None and not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        self._heap.clear()
+        self._due.clear()
+
+        for simulation in self.active_simulations.values():
+            if simulation['status'] == 'running':
+                self._mark_stopped(simulation, 'stopped')
+        if self._flush is not None:
+            await asyncio.gather(self._flush, return_exceptions=True)
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.store.flush, self._collect_updates(), settings.SIMULATION_BUFFER_SIZE
+            )
+        except Exception as e:
+            logger.error(f"模拟数据写入共享存储失败: {str(e)}")
 
 
 simulation_engine = SimulationEngine()
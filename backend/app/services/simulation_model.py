@@ -0,0 +1,296 @@
+import time
+import logging
+from datetime import datetime
+from statistics import NormalDist
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.services.frame_utils import rows_to_frame, detect_time_column, parse_time_column, numeric_frame, round_value
+from app.services.simulation_plan import SimulationPlan, constant_column
+from app.services.simulation_signals import (
+    FaultInjector, ar1_filter, block_powers, column_streams, new_seed, standard_normal_columns
+)
+
+logger = logging.getLogger(__name__)
+
+# 标准正态分位函数查表（避免依赖 scipy）：秩 -> 正态得分 与 分位表的正态坐标均由此插值得到
+_P_GRID = np.linspace(0.0005, 0.9995, 4001)
+_Z_GRID = np.array([NormalDist().inv_cdf(p) for p in _P_GRID])
+# 边际分布分位表的概率点
+QUANTILE_POINTS = np.linspace(0.0, 1.0, 257)
+MAX_CATEGORIES = 200
+
+
+def norm_ppf(p: np.ndarray) -> np.ndarray:
+    return np.interp(np.clip(p, _P_GRID[0], _P_GRID[-1]), _P_GRID, _Z_GRID)
+
+
+def normal_scores(values: np.ndarray) -> np.ndarray:
+    """数值列转为正态得分（按秩，NaN 保持 NaN）"""
+    scores = np.full(values.shape, np.nan)
+    valid = ~np.isnan(values)
+    n = int(valid.sum())
+    if n == 0:
+        return scores
+    ranks = pd.Series(values[valid]).rank(method="average").to_numpy()
+    scores[valid] = norm_ppf((ranks - 0.5) / n)
+    return scores
+
+
+def _decimals(values: np.ndarray, max_decimals: int = 6) -> int:
+    """观测值的小数位数（取值均为整数时为 0）"""
+    sample = values[:2000]
+    scale = np.maximum(1.0, np.abs(sample))
+    for d in range(max_decimals + 1):
+        if np.all(np.abs(np.round(sample, d) - sample) <= 1e-9 * scale):
+            return d
+    return max_decimals
+
+
+def _nearest_psd(matrix: np.ndarray, floor: float = 1e-6) -> np.ndarray:
+    """对称矩阵投影为正定（特征值截断）"""
+    matrix = (matrix + matrix.T) / 2
+    eigvals, eigvecs = np.linalg.eigh(matrix)
+    return (eigvecs * np.maximum(eigvals, floor)) @ eigvecs.T
+
+
+class FittedTableModel:
+    """
+    由真实表数据拟合的模拟模型（只读，可被多个模拟共享）
+
+    数值列：经验分位表（边际分布）+ 正态得分上的 AR(1) 自相关 + 列间相关（高斯 copula），
+    生成时在正态空间按向量 AR(1) 递推，再经分位表映射回原始取值；
+    文本列：按经验频率抽样；各列保留原始缺失率与小数位数。
+    """
+
+    def __init__(self, columns: List[str]):
+        self.columns = list(columns)
+        self.time_column: Optional[str] = None
+        self.fitted_rows = 0
+        self.numeric: List[str] = []
+        self.z_points = norm_ppf(QUANTILE_POINTS)
+        self.quantiles = np.empty((0, len(QUANTILE_POINTS)))
+        self.phi = np.empty(0)
+        self.correlation = np.empty((0, 0))
+        self.innovation_chol = np.empty((0, 0))
+        self.decimals: List[int] = []
+        self.missing_rates: Dict[str, float] = {}
+        self.categories: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._powers: Optional[np.ndarray] = None
+        self.fit_seconds = 0.0
+
+    @classmethod
+    def fit(cls, rows: List[Dict[str, Any]], columns: Optional[List[str]] = None) -> "FittedTableModel":
+        """
+        拟合表数据
+
+        Args:
+            rows: 表数据行（TableData.data）
+            columns: 列顺序
+        """
+        started = time.perf_counter()
+        df = rows_to_frame(rows, columns)
+        model = cls(columns or list(df.columns))
+        model.fitted_rows = len(df)
+        if df.empty:
+            return model
+
+        model.time_column = detect_time_column(df)
+        times = parse_time_column(df, model.time_column)
+        if times is not None:
+            # 自相关按时间顺序估计
+            df = df.iloc[np.argsort(times.to_numpy(), kind="stable")].reset_index(drop=True)
+
+        numeric = numeric_frame(df, exclude=[model.time_column] if model.time_column else None)
+        model._fit_numeric(numeric)
+        for column in model.columns:
+            if column in df.columns and column != model.time_column and column not in model.numeric:
+                model._fit_category(column, df[column])
+            if column in df.columns:
+                model.missing_rates[column] = float(df[column].isna().mean())
+
+        model.fit_seconds = time.perf_counter() - started
+        logger.info(
+            f"模拟模型拟合完成: {len(df)} 行, 数值列 {len(model.numeric)}, 文本列 {len(model.categories)}, "
+            f"耗时 {model.fit_seconds:.3f}s"
+        )
+        return model
+
+    def _fit_numeric(self, numeric: pd.DataFrame):
+        columns = [c for c in numeric.columns if numeric[c].notna().sum() >= 2]
+        if not columns:
+            return
+        values = numeric[columns].to_numpy(dtype=np.float64)
+        self.numeric = list(columns)
+
+        # 边际分布：经验分位表；取值精度
+        self.quantiles = np.vstack([np.nanquantile(values[:, i], QUANTILE_POINTS) for i in range(len(columns))])
+        self.decimals = [_decimals(values[~np.isnan(values[:, i]), i]) for i in range(len(columns))]
+
+        # 正态得分上的滞后 1 自相关（AR(1) 系数）与列间相关
+        scores = np.column_stack([normal_scores(values[:, i]) for i in range(len(columns))])
+        lagged = scores[:-1] * scores[1:]
+        pairs = ~np.isnan(lagged)
+        counts = pairs.sum(axis=0)
+        phi = np.where(counts > 2, np.nansum(lagged, axis=0) / np.maximum(counts, 1), 0.0)
+        self.phi = np.clip(phi, -0.99, 0.99)
+
+        filled = np.nan_to_num(scores, nan=0.0)
+        if len(columns) > 1:
+            std = filled.std(axis=0)
+            correlation = np.corrcoef(filled, rowvar=False) if np.all(std > 0) else np.eye(len(columns))
+            correlation = np.nan_to_num(correlation, nan=0.0)
+            np.fill_diagonal(correlation, 1.0)
+        else:
+            correlation = np.eye(1)
+        self.correlation = _nearest_psd(correlation)
+
+        # 平稳向量 AR(1)：z_t = φ∘z_{t-1} + e_t，Cov(e) = R∘(1 - φφᵀ) 使 z 的平稳协方差为 R
+        innovation = self.correlation * (1 - np.outer(self.phi, self.phi))
+        self.innovation_chol = np.linalg.cholesky(_nearest_psd(innovation))
+
+    def _fit_category(self, column: str, series: pd.Series):
+        values = series.dropna()
+        if values.empty:
+            return
+        counts = values.astype(str).value_counts()
+        if len(counts) > MAX_CATEGORIES:
+            # 高基数列（编号等）：从观测值中均匀抽样
+            choices = counts.index.to_numpy()[:MAX_CATEGORIES]
+            weights = np.full(len(choices), 1.0 / len(choices))
+        else:
+            choices = counts.index.to_numpy()
+            weights = (counts / counts.sum()).to_numpy()
+        self.categories[column] = (choices.astype(object), weights)
+
+    def _block_powers(self) -> np.ndarray:
+        if self._powers is None:
+            self._powers = block_powers(self.phi)
+        return self._powers
+
+    def latent(
+        self,
+        rngs: List[np.random.Generator],
+        n: int,
+        state: Optional[np.ndarray]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        生成 n 行正态空间的潜变量
+
+        Args:
+            rngs: 各数值列的随机数流（独立标准正态数按列抽取后再乘相关矩阵的 Cholesky 因子）
+            state: 上一行的潜变量（None 表示从平稳分布开始）
+
+        Returns:
+            (潜变量矩阵 n × 数值列数, 最后一行潜变量)
+        """
+        k = len(self.numeric)
+        if state is None:
+            state = np.linalg.cholesky(self.correlation) @ np.array([rng.standard_normal() for rng in rngs])
+        if n == 0:
+            return np.empty((0, k)), state
+
+        innovations = standard_normal_columns(rngs, n) @ self.innovation_chol.T
+        z = ar1_filter(innovations, self.phi, state, self._block_powers())
+        return z, z[-1]
+
+    def generate_columns(
+        self,
+        streams: Dict[str, Dict[str, np.random.Generator]],
+        n: int,
+        state: Optional[np.ndarray],
+        now: str
+    ) -> Tuple[Dict[str, Tuple[np.ndarray, Optional[np.ndarray]]], Optional[np.ndarray]]:
+        """
+        按列生成 n 行数据，返回 ({列名: (取值数组, 缺失掩码)}, 新的潜变量状态)
+
+        Args:
+            streams: {列名: 该列的随机数流}（见 column_streams）
+        """
+        data: Dict[str, Tuple[np.ndarray, Optional[np.ndarray]]] = {}
+        if self.numeric:
+            z, state = self.latent([streams[column]["values"] for column in self.numeric], n, state)
+            for i, column in enumerate(self.numeric):
+                values = np.interp(z[:, i], self.z_points, self.quantiles[i])
+                decimals = self.decimals[i]
+                values = np.round(values, decimals)
+                if decimals == 0:
+                    values = values.astype(np.int64)
+                data[column] = (values, None)
+
+        for column in self.columns:
+            if column in data:
+                continue
+            if column == self.time_column:
+                data[column] = (constant_column(now, n), None)
+            elif column in self.categories:
+                choices, weights = self.categories[column]
+                rng = streams[column]["values"]
+                data[column] = (choices[rng.choice(len(choices), size=n, p=weights)], None)
+            else:
+                data[column] = (constant_column(None, n), None)
+
+        for column, rate in self.missing_rates.items():
+            if 0 < rate < 1 and column in data and column != self.time_column:
+                missing = streams[column]["events"].random(n) < rate
+                if missing.any():
+                    data[column] = (data[column][0], missing)
+        return {column: data[column] for column in self.columns if column in data}, state
+
+    def summary(self) -> Dict[str, Any]:
+        """模型摘要（列分布与自相关系数）"""
+        numeric = {}
+        for i, column in enumerate(self.numeric):
+            q = self.quantiles[i]
+            numeric[column] = {
+                "p5": round_value(float(np.interp(0.05, QUANTILE_POINTS, q))),
+                "median": round_value(float(np.interp(0.5, QUANTILE_POINTS, q))),
+                "p95": round_value(float(np.interp(0.95, QUANTILE_POINTS, q))),
+                "ar1": round_value(float(self.phi[i])),
+                "missing_rate": round_value(self.missing_rates.get(column, 0.0))
+            }
+        return {
+            "type": "fitted",
+            "fitted_rows": self.fitted_rows,
+            "time_column": self.time_column,
+            "numeric_columns": numeric,
+            "categorical_columns": list(self.categories),
+            "fit_seconds": round_value(self.fit_seconds)
+        }
+
+
+class FittedSimulationPlan(SimulationPlan):
+    """基于拟合模型的生成计划 - 模型共享，每个模拟各自保存 AR 状态与随机数流，使连续批次的数据首尾相接"""
+
+    def __init__(self, model: FittedTableModel, fault_rate: float = 0.0, seed: Optional[int] = None):
+        self.columns = list(model.columns)
+        self.generators = []
+        self.model = model
+        self.state: Optional[np.ndarray] = None
+        self.seed = new_seed() if seed is None else int(seed)
+        self.streams = dict(zip(self.columns, column_streams(self.seed, len(self.columns))))
+        # 故障幅度按各列 P5-P95 跨度缩放
+        spans = [
+            float(np.interp(0.95, QUANTILE_POINTS, q) - np.interp(0.05, QUANTILE_POINTS, q)) / 4
+            for q in model.quantiles
+        ]
+        self.faults = FaultInjector(
+            model.numeric,
+            spans,
+            rate=fault_rate,
+            rngs=[self.streams[column]["faults"] for column in model.numeric]
+        )
+
+    def generate_columns(
+        self,
+        row_count: int,
+        start_index: int = 0
+    ) -> Dict[str, Tuple[np.ndarray, Optional[np.ndarray]]]:
+        now = datetime.now().isoformat()
+        data, self.state = self.model.generate_columns(self.streams, row_count, self.state, now)
+        self.faults.apply(data, row_count)
+        data["_timestamp"] = (constant_column(now, row_count), None)
+        data["_index"] = (np.arange(start_index, start_index + row_count), None)
+        return data
@@ -0,0 +1,294 @@
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.simulation_signals import SignalBank, FaultInjector, column_streams, new_seed
+
+# 字段类型识别规则（按顺序匹配，首个命中生效）
+FIELD_KINDS: List[Tuple[str, Tuple[str, ...]]] = [
+    ("temperature", ("温度", "temp", "temperature")),
+    ("pressure", ("压力", "pressure")),
+    ("current", ("电流", "current")),
+    ("voltage", ("电压", "voltage")),
+    ("power", ("功率", "power")),
+    ("efficiency", ("效率", "efficiency")),
+    ("speed", ("转速", "speed", "rpm")),
+    ("time", ("时间", "time", "date")),
+    ("status", ("状态", "status", "flag")),
+    ("id", ("id", "编号", "no")),
+]
+
+# 数值字段：(下限, 上限, 小数位)；小数位为 None 表示整数
+NUMERIC_KINDS: Dict[str, Tuple[float, float, Optional[int]]] = {
+    "temperature": (20, 100, 1),
+    "pressure": (0.1, 1.0, 3),
+    "current": (0, 100, 2),
+    "voltage": (220, 250, 1),
+    "power": (0, 50, 2),
+    "efficiency": (60, 95, 1),
+    "speed": (500, 3000, None),
+    "default": (1, 100, None),
+}
+
+STATUS_CHOICES = np.array(["正常", "运行", "停止", "告警", "正常", "运行"], dtype=object)
+ID_CHOICES = np.array([f"EQ{i}" for i in range(1000, 10000)], dtype=object)
+
+# 异常值：(关键字, 以 1/4 概率出现的值, 其余情况的值)
+ANOMALY_KINDS: List[Tuple[Tuple[str, ...], Any, Any]] = [
+    (("温度", "temp"), 150, -10),
+    (("压力", "pressure"), 2.0, 0),
+    (("电流", "current"), -5, 500),
+    (("电压", "voltage"), 0, 380),
+]
+DEFAULT_ANOMALY = 9999
+
+OUTPUT_FORMATS = ("records", "columnar", "arrow")
+
+
+def constant_column(value: Any, n: int) -> np.ndarray:
+    """常量对象列（np.full 填充 object 数组较慢）"""
+    column = np.empty(n, dtype=object)
+    column.fill(value)
+    return column
+
+
+def classify_column(column_name: str) -> str:
+    """按列名关键字识别字段类型"""
+    col_lower = column_name.lower()
+    for kind, keywords in FIELD_KINDS:
+        if any(keyword in col_lower for keyword in keywords):
+            return kind
+    return "default"
+
+
+def _anomaly_values(column_name: str) -> Tuple[Any, Any]:
+    col_lower = column_name.lower()
+    for keywords, rare, common in ANOMALY_KINDS:
+        if any(keyword in col_lower for keyword in keywords):
+            return rare, common
+    return DEFAULT_ANOMALY, DEFAULT_ANOMALY
+
+
+class ColumnGenerator:
+    """单列生成器 - 字段类型与特征在编译时确定，生成时整列向量化产出
+
+    数值列的取值来自 SignalBank 中的连续信号（见 signal_spec），其余列（时间、状态、编号）按列独立抽样。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        features: Optional[Dict[str, Any]] = None,
+        streams: Optional[Dict[str, np.random.Generator]] = None
+    ):
+        features = features or {}
+        self.name = name
+        self.streams = streams if streams is not None else column_streams(new_seed(), 1)[0]
+        self.kind = classify_column(name)
+        self.missing_rate = float(features.get("missing_rate", 0) or 0)
+        self.anomaly_rate = float(features.get("anomaly_rate", 0) or 0)
+        self.value_range = features.get("value_range")
+        self.signal = features.get("signal")
+        self.anomaly_rare, self.anomaly_common = _anomaly_values(name)
+        self.numeric = bool(self.value_range) or self.kind in NUMERIC_KINDS
+
+        if self.value_range:
+            self.low, self.high, self.decimals = float(self.value_range[0]), float(self.value_range[1]), 4
+        elif self.numeric:
+            low, high, decimals = NUMERIC_KINDS[self.kind]
+            self.low, self.high, self.decimals = float(low), float(high), decimals
+
+    def signal_spec(self) -> Dict[str, Any]:
+        """连续信号参数（特征中的 signal 可为类型名，或包含 signal/theta/volatility/slope/target/mean 的字典）"""
+        spec = {"low": self.low, "high": self.high}
+        if isinstance(self.signal, dict):
+            spec.update(self.signal)
+        elif self.signal:
+            spec["signal"] = self.signal
+        return spec
+
+    def values(self, n: int, now: str) -> np.ndarray:
+        """生成 n 个正常取值（非数值列）"""
+        if self.kind == "time":
+            return constant_column(now, n)
+        rng = self.streams["values"]
+        if self.kind == "status":
+            return STATUS_CHOICES[rng.integers(0, len(STATUS_CHOICES), n)]
+        return ID_CHOICES[rng.integers(0, len(ID_CHOICES), n)]
+
+    def generate(
+        self,
+        n: int,
+        now: str,
+        signal: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """
+        生成一列数据
+
+        每行只抽取一个均匀数 u 决定缺失与异常：u < 缺失率 为缺失，其后 异常率 宽度的区间为异常
+        （前 1/4 取少见的异常值），使同一种子的结果与批大小无关。
+
+        Args:
+            signal: 数值列由 SignalBank 推进并按精度取整后的取值
+
+        Returns:
+            (取值数组, 缺失掩码)；无缺失时掩码为 None
+        """
+        values = signal if signal is not None else self.values(n, now)
+        if self.missing_rate <= 0 and self.anomaly_rate <= 0:
+            return values, None
+
+        u = self.streams["events"].random(n)
+        missing = u < self.missing_rate
+        if not missing.any():
+            missing = None
+
+        if self.anomaly_rate > 0:
+            offset = u - self.missing_rate
+            anomaly = (offset >= 0) & (offset < self.anomaly_rate)
+            if anomaly.any():
+                replacement = np.where(offset[anomaly] < self.anomaly_rate / 4, self.anomaly_rare, self.anomaly_common)
+                if values.dtype.kind in "iu" and replacement.dtype.kind == "f":
+                    values = values.astype(np.float64)
+                elif values.dtype == object:
+                    replacement = replacement.astype(object)
+                values[anomaly] = replacement
+        return values, missing
+
+
+class SimulationPlan:
+    """模拟数据生成计划 - 由列名与分析特征编译一次，之后按批整列生成
+
+    计划实例保存各数值列的信号状态与故障片段，连续调用生成的数据首尾相接；每个运行中的模拟使用独立的实例。
+    所有随机数来自由 seed 按列派生的流（见 column_streams）：同样的列、特征与种子生成的取值完全相同
+    （时间列与 _timestamp 为生成时刻），不同种子的计划可在多个进程中并行生成而互不影响。
+    """
+
+    def __init__(
+        self,
+        columns: List[str],
+        analysis_features: Optional[Dict[str, Any]] = None,
+        fault_rate: float = 0.0,
+        seed: Optional[int] = None
+    ):
+        analysis_features = analysis_features or {}
+        self.columns = list(columns)
+        self.seed = new_seed() if seed is None else int(seed)
+        streams = column_streams(self.seed, len(self.columns))
+        self.generators = [
+            ColumnGenerator(col, analysis_features.get(col, {}), col_streams)
+            for col, col_streams in zip(self.columns, streams)
+        ]
+        numeric = [gen for gen in self.generators if gen.numeric]
+        self.signal_columns = {gen.name: i for i, gen in enumerate(numeric)}
+        self.signals = SignalBank([gen.signal_spec() for gen in numeric], [gen.streams["values"] for gen in numeric])
+        # 按小数位分组整体取整（小数位为 None 的字段为整数）
+        groups: Dict[int, List[int]] = {}
+        for i, gen in enumerate(numeric):
+            groups.setdefault(0 if gen.decimals is None else gen.decimals, []).append(i)
+        self.round_groups = {decimals: np.array(index) for decimals, index in groups.items()}
+        self.faults = FaultInjector(
+            [gen.name for gen in numeric],
+            [(gen.high - gen.low) / 8 for gen in numeric],
+            rate=fault_rate,
+            rngs=[gen.streams["faults"] for gen in numeric]
+        )
+
+    def generate_columns(
+        self,
+        row_count: int,
+        start_index: int = 0
+    ) -> Dict[str, Tuple[np.ndarray, Optional[np.ndarray]]]:
+        """按列生成 row_count 行数据，返回 {列名: (取值数组, 缺失掩码)}，附带 _timestamp 与 _index 列"""
+        now = datetime.now().isoformat()
+        signals = self.signals.step(row_count)
+        for decimals, index in self.round_groups.items():
+            signals[:, index] = np.round(signals[:, index], decimals)
+
+        data = {}
+        for gen in self.generators:
+            index = self.signal_columns.get(gen.name)
+            if index is None:
+                data[gen.name] = gen.generate(row_count, now)
+                continue
+            values = signals[:, index]
+            if gen.decimals is None:
+                values = values.astype(np.int64)
+            data[gen.name] = gen.generate(row_count, now, values)
+        self.faults.apply(data, row_count)
+        data["_timestamp"] = (constant_column(now, row_count), None)
+        data["_index"] = (np.arange(start_index, start_index + row_count), None)
+        return data
+
+    @staticmethod
+    def _to_list(values: np.ndarray, missing: Optional[np.ndarray]) -> List[Any]:
+        result = values.tolist()
+        if missing is not None:
+            for i in np.flatnonzero(missing).tolist():
+                result[i] = None
+        return result
+
+    @staticmethod
+    def to_columnar(data: Dict[str, Tuple[np.ndarray, Optional[np.ndarray]]]) -> Dict[str, List[Any]]:
+        return {name: SimulationPlan._to_list(values, missing) for name, (values, missing) in data.items()}
+
+    @staticmethod
+    def to_records(data: Dict[str, Tuple[np.ndarray, Optional[np.ndarray]]]) -> List[Dict[str, Any]]:
+        columnar = SimulationPlan.to_columnar(data)
+        names = list(columnar)
+        return [dict(zip(names, row)) for row in zip(*columnar.values())]
+
+    @staticmethod
+    def to_arrow(data: Dict[str, Tuple[np.ndarray, Optional[np.ndarray]]]):
+        """转换为 pyarrow.Table（需要安装 pyarrow）"""
+        import pyarrow as pa
+
+        arrays = {}
+        for name, (values, missing) in data.items():
+            if values.dtype == object:
+                items = values.tolist()
+                try:
+                    arrays[name] = pa.array(items, mask=missing)
+                except (pa.ArrowInvalid, pa.ArrowTypeError):
+                    # 异常值与正常值类型不一致（如编号列中的 9999），统一为字符串
+                    arrays[name] = pa.array([str(v) for v in items], mask=missing)
+            else:
+                arrays[name] = pa.array(values, mask=missing)
+        return pa.table(arrays)
+
+    def generate(
+        self,
+        row_count: int,
+        output: str = "records",
+        start_index: int = 0
+    ):
+        """
+        生成模拟数据（接续上一次调用的信号状态）
+
+        Args:
+            row_count: 行数
+            output: records（行字典列表）/ columnar（列名到值列表）/ arrow（pyarrow.Table）
+            start_index: _index 起始编号
+        """
+        if output not in OUTPUT_FORMATS:
+            raise ValueError(f"不支持的输出格式: {output}")
+        data = self.generate_columns(row_count, start_index)
+        if output == "columnar":
+            return self.to_columnar(data)
+        if output == "arrow":
+            return self.to_arrow(data)
+        return self.to_records(data)
+
+
+def records_to_output(rows: List[Dict[str, Any]], output: str = "records"):
+    """已生成的行数据（如模拟环形缓冲中的行）转换为指定输出格式"""
+    if output not in OUTPUT_FORMATS:
+        raise ValueError(f"不支持的输出格式: {output}")
+    if output == "records":
+        return rows
+    names = list(rows[0]) if rows else []
+    data = {name: (np.array([row.get(name) for row in rows], dtype=object), None) for name in names}
+    if output == "columnar":
+        return SimulationPlan.to_columnar(data)
+    return SimulationPlan.to_arrow(data)
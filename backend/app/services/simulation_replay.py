@@ -0,0 +1,301 @@
+import json
+import time
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.core.database import engine
+from app.services.frame_utils import rows_to_frame, detect_time_column
+
+logger = logging.getLogger(__name__)
+
+# 行的时间键（秒）：数值时间直接使用，文本时间经 julianday 解析为 Unix 秒（无时区的时间按 UTC 处理，仅用于排序与间隔）；
+# 无时间列时按存储顺序，每行 1 秒
+_TIME_KEY = """
+CASE WHEN :path IS NULL THEN CAST(j.key AS REAL)
+     WHEN json_type(j.value, :path) IN ('integer', 'real') THEN json_extract(j.value, :path)
+     ELSE (julianday(json_extract(j.value, :path)) - 2440587.5) * 86400.0 END
+"""
+
+# 键集分页：表数据整体存为一个 JSON 列，SQLite 无法为行内的时间键建索引，每页都要用 json_each 解析整份文档、
+# 计算所有行的时间键并排序后再取 LIMIT 行，单页开销随表行数线性（排序为 n log n）增长。
+# 这是单 JSON 列存储方案下有意接受的代价：页在线程池中预取，回放只在翻页时付出一次，内存中不保留全表；
+# 若需回放远大于 SIMULATION_REPLAY_PAGE_SIZE 的表，应先把行拆分到独立的表中再建 (时间, 行号) 索引。
+_ROWS_SQL = f"""
+SELECT ts, idx, row FROM (
+    SELECT {_TIME_KEY} AS ts, j.key AS idx, j.value AS row
+    FROM table_data AS t, json_each(t.data) AS j
+    WHERE t.id = :table_id
+)
+WHERE (ts, idx) > (:after_ts, :after_idx)
+ORDER BY ts, idx
+LIMIT :limit
+"""
+
+_BOUNDS_SQL = f"""
+SELECT COUNT(*), MIN(ts), MAX(ts), MAX(numeric) FROM (
+    SELECT {_TIME_KEY} AS ts, json_type(j.value, :path) IN ('integer', 'real') AS numeric
+    FROM table_data AS t, json_each(t.data) AS j
+    WHERE t.id = :table_id
+)
+WHERE ts IS NOT NULL
+"""
+
+_SAMPLE_SQL = """
+SELECT j.value FROM table_data AS t, json_each(t.data) AS j
+WHERE t.id = :table_id
+LIMIT :limit
+"""
+
+_PATH_HITS_SQL = """
+SELECT COUNT(json_type(j.value, :path)) FROM (
+    SELECT j.value FROM table_data AS t, json_each(t.data) AS j
+    WHERE t.id = :table_id
+    LIMIT :limit
+) AS j
+"""
+
+_START = (float("-inf"), -1)
+# julianday 换算有浮点误差，跳转时向前放宽 1 毫秒，避免漏掉恰好位于目标时刻的行
+_SEEK_TOLERANCE = 1e-3
+
+
+def _json_paths(column: str) -> List[str]:
+    """列名对应的 JSON 路径候选：JSON 列默认按 ASCII 转义写入，较旧的 SQLite 按转义后的原文匹配键名"""
+    escaped = json.dumps(column)[1:-1]
+    return ['$."' + escaped + '"', '$."' + column + '"'] if escaped != column else ['$."' + column + '"']
+
+
+class TableReplay:
+    """
+    历史表回放 - 按时间列顺序把已入库的表数据当作实时数据重放
+
+    通过 SQLite json_each 按 (时间, 行号) 键集分页读取 TableData.data（上传时入库的行，至多 TABLE_DATA_MAX_ROWS 行），
+    内存中只保留当前页与预取的下一页；
+    行按 原始时间间隔 / speed 推进，支持跳转（seek）与循环（loop）。
+    """
+
+    def __init__(
+        self,
+        table_data_id: str,
+        columns: Optional[List[str]] = None,
+        time_column: Optional[str] = None,
+        speed: float = 1.0,
+        loop: bool = False,
+        start_at: Optional[str] = None,
+        page_size: Optional[int] = None
+    ):
+        """
+        Args:
+            table_data_id: TableData.id
+            columns: 列名（用于识别时间列）
+            time_column: 时间列，默认自动识别；识别不到时按存储顺序每行 1 秒回放
+            speed: 回放倍速（1 为原速，100 为 100 倍速）
+            loop: 播放到末尾后是否从头循环
+            start_at: 起始时间，默认从最早的行开始
+            page_size: 每次读取的行数，默认 SIMULATION_REPLAY_PAGE_SIZE
+        """
+        if engine.dialect.name != "sqlite":
+            raise ValueError("回放模式依赖 SQLite JSON 函数")
+        if speed <= 0:
+            raise ValueError("回放倍速必须大于 0")
+        self.table_data_id = table_data_id
+        self.speed = float(speed)
+        self.loop = loop
+        self.page_size = max(1, page_size or settings.SIMULATION_REPLAY_PAGE_SIZE)
+        self.time_column = time_column if time_column is not None else self._detect_time_column(columns)
+        if self.time_column is not None and '"' in self.time_column:
+            logger.warning(f"时间列名包含引号，按存储顺序回放: {self.time_column}")
+            self.time_column = None
+        self.path = self._resolve_path(self.time_column)
+
+        self.total_rows, self.first_ts, self.last_ts, self.numeric_time = self._bounds()
+        if not self.total_rows:
+            raise ValueError("表中没有可回放的数据（时间列为空或无法解析）")
+
+        self.rows_emitted = 0
+        self.loops = 0
+        self.finished = False
+        self._pending: Optional[asyncio.Future] = None
+        self._first_page = self._fetch(_START)
+        self._restart(None, self.first_ts)
+        if start_at is not None:
+            self._restart(None, *self._locate(start_at))
+
+    def _query(self, sql: str, **params) -> List[Tuple]:
+        with engine.connect() as conn:
+            return conn.execute(text(sql), {"table_id": self.table_data_id, **params}).fetchall()
+
+    def _detect_time_column(self, columns: Optional[List[str]]) -> Optional[str]:
+        sample = [json.loads(row[0]) for row in self._query(_SAMPLE_SQL, limit=50)]
+        sample = [row for row in sample if isinstance(row, dict)]
+        return detect_time_column(rows_to_frame(sample, columns))
+
+    def _resolve_path(self, column: Optional[str]) -> Optional[str]:
+        if column is None:
+            return None
+        paths = _json_paths(column)
+        for path in paths:
+            if self._query(_PATH_HITS_SQL, path=path, limit=50)[0][0]:
+                return path
+        return paths[0]
+
+    def _bounds(self) -> Tuple[int, Optional[float], Optional[float], bool]:
+        count, first, last, numeric = self._query(_BOUNDS_SQL, path=self.path)[0]
+        return int(count or 0), first, last, bool(numeric)
+
+    def _fetch(self, after: Tuple[float, int]) -> List[Tuple[float, int, Dict[str, Any]]]:
+        """读取键 (时间, 行号) 之后的一页"""
+        rows = self._query(
+            _ROWS_SQL,
+            path=self.path,
+            after_ts=after[0],
+            after_idx=after[1],
+            limit=self.page_size
+        )
+        return [(float(ts), int(idx), json.loads(row)) for ts, idx, row in rows]
+
+    def _restart(self, now: Optional[float], origin: float, page: Optional[List] = None, after=_START):
+        """从 origin 时刻（表内时间）开始计时；page 为该位置起的已读取页（进行中的预取结果随之作废）"""
+        self._pending = None
+        self._page = self._first_page if page is None else page
+        self._pos = 0
+        self._after = self._page[-1][:2] if self._page else after
+        self._exhausted = len(self._page) < self.page_size
+        self.origin = origin
+        self.anchor = now
+
+    def time_key(self, position: str) -> float:
+        """把回放位置转换为行时间键的刻度：时间列为文本时间时按时间字符串解析，否则为数值（无时间列时为行号）"""
+        if not self.time_column or self.numeric_time:
+            try:
+                return float(position)
+            except (TypeError, ValueError):
+                raise ValueError(f"无法解析回放位置: {position}")
+        with engine.connect() as conn:
+            value = conn.execute(
+                text("SELECT (julianday(:p) - 2440587.5) * 86400.0"), {"p": position}
+            ).scalar()
+        if value is None:
+            raise ValueError(f"无法解析回放位置: {position}")
+        return float(value)
+
+    def _locate(self, position: str) -> Tuple[float, List, Tuple[float, int]]:
+        """定位到 position：返回 (时间键, 从该位置起的一页, 分页键)"""
+        target = self.time_key(position)
+        after = (target - _SEEK_TOLERANCE, -1)
+        return target, self._fetch(after), after
+
+    async def seek(self, position: str, clock) -> Dict[str, Any]:
+        """
+        跳转到 position，从该时刻起按倍速继续回放（读取在线程池中进行）
+
+        Args:
+            position: 时间字符串；数值时间列为数值，无时间列时为行号
+            clock: 返回当前单调时钟的函数（time.monotonic）
+        """
+        target, page, after = await asyncio.get_running_loop().run_in_executor(None, self._locate, position)
+        now = clock()
+        self._restart(now, target, page, after)
+        self.finished = False
+        return self.status(now)
+
+    def virtual_time(self, now: Optional[float]) -> float:
+        """当前回放到的表内时间"""
+        if self.anchor is None or now is None:
+            return self.origin
+        return self.origin + (now - self.anchor) * self.speed
+
+    def _advance_page(self) -> bool:
+        """当前页读完后切换到预取的下一页；下一页尚未就绪时返回 False"""
+        if self._exhausted:
+            return False
+        if self._pending is None or not self._pending.done():
+            self._prefetch()
+            return False
+        future, self._pending = self._pending, None
+        if future.exception() is not None:
+            # 下一批到期时重试
+            logger.error(f"回放数据读取失败: {str(future.exception())}")
+            return False
+        page = future.result()
+        self._page, self._pos = page, 0
+        if page:
+            self._after = page[-1][:2]
+        self._exhausted = len(page) < self.page_size
+        return bool(page)
+
+    def _prefetch(self):
+        if self._exhausted or self._pending is not None:
+            return
+        self._pending = asyncio.get_running_loop().run_in_executor(None, self._fetch, self._after)
+
+    def advance(self, now: float) -> List[Dict[str, Any]]:
+        """返回到 now 为止到期的行（按时间顺序）；播放到末尾时按 loop 从头开始或标记结束"""
+        if self.anchor is None:
+            self.anchor = now
+        virtual = self.virtual_time(now)
+        rows: List[Dict[str, Any]] = []
+        restarted = False
+        while not self.finished:
+            if self._pos >= len(self._page):
+                if self._advance_page():
+                    continue
+                if not self._exhausted:
+                    break
+                if not self.loop:
+                    self.finished = True
+                    break
+                if restarted:
+                    # 全表时间相同的极端情况：每批最多循环一轮
+                    break
+                # 循环：从最早的行重新开始，按 now 重新计时
+                self.loops += 1
+                self._restart(now, self.first_ts)
+                virtual = self.origin
+                restarted = True
+                continue
+            ts, _, row = self._page[self._pos]
+            if ts > virtual:
+                break
+            rows.append(row)
+            self._pos += 1
+
+        if self._pos >= len(self._page) // 2:
+            self._prefetch()
+        self.rows_emitted += len(rows)
+        return rows
+
+    def next_due(self) -> Optional[float]:
+        """下一行到期的单调时钟时刻（当前页已读完、等待预取时返回 None）"""
+        if self.finished or self.anchor is None or self._pos >= len(self._page):
+            return None
+        ts = self._page[self._pos][0]
+        return self.anchor + max(0.0, ts - self.origin) / self.speed
+
+    def _format(self, ts: Optional[float]) -> Any:
+        if ts is None or not self.time_column or self.numeric_time:
+            return ts
+        return datetime.fromtimestamp(round(ts, 3), tz=timezone.utc).replace(tzinfo=None).isoformat()
+
+    def status(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """回放进度（position 为当前回放到的表内时间）"""
+        now = time.monotonic() if now is None else now
+        position = min(self.virtual_time(now), self.last_ts) if self.last_ts is not None else None
+        return {
+            "type": "replay",
+            "time_column": self.time_column,
+            "speed": self.speed,
+            "loop": self.loop,
+            "total_rows": self.total_rows,
+            "rows_emitted": self.rows_emitted,
+            "loops": self.loops,
+            "start": self._format(self.first_ts),
+            "end": self._format(self.last_ts),
+            "position": self._format(position),
+            "finished": self.finished
+        }
@@ -0,0 +1,307 @@
+import secrets
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+# AR(1) 分块递推的块长；不超过 AR_DIRECT_ROWS 行时直接逐行递推
+AR_BLOCK = 64
+AR_DIRECT_ROWS = 8
+
+SIGNAL_TYPES = ("ou", "random_walk", "ramp", "drift")
+FAULT_KINDS = ("overheat", "stuck", "dropout")
+# 每列派生的随机数流：values（信号扰动、文本列取值）、events（缺失与异常）、faults（随机故障）
+STREAM_KINDS = ("values", "events", "faults")
+
+
+def new_seed() -> int:
+    """新的模拟种子（53 位，经 JSON 传到前端不丢失精度）"""
+    return secrets.randbits(53)
+
+
+def column_streams(seed: int, count: int) -> List[Dict[str, np.random.Generator]]:
+    """
+    由种子为每列派生独立的随机数流
+
+    SeedSequence 先按列 spawn，每列再按 STREAM_KINDS 各 spawn 一条流：同一种子生成的数据完全相同，
+    且各列、各用途的流互不影响，按批抽样的结果与批大小无关（分多次生成与一次生成得到同样的序列）。
+    """
+    streams = []
+    for child in np.random.SeedSequence(seed).spawn(count):
+        streams.append(dict(zip(STREAM_KINDS, (np.random.default_rng(s) for s in child.spawn(len(STREAM_KINDS))))))
+    return streams
+
+
+def standard_normal_columns(rngs: List[np.random.Generator], n: int) -> np.ndarray:
+    """各列从自己的流抽取 n 个标准正态数，返回 n × 列数"""
+    out = np.empty((len(rngs), n))
+    for i, rng in enumerate(rngs):
+        rng.standard_normal(out=out[i])
+    return out.T
+
+
+def block_powers(phi: np.ndarray, block: int = AR_BLOCK) -> np.ndarray:
+    """分块递推矩阵（转置形式，供 块内扰动 @ P 使用）：P[c, s, j] = φ_c^(j-s)（j >= s，否则为 0）"""
+    exponent = np.arange(block)[None, :] - np.arange(block)[:, None]
+    mask = exponent >= 0
+    powers = np.power(phi[:, None, None], np.where(mask, exponent, 0)[None, :, :])
+    return np.ascontiguousarray(np.where(mask[None, :, :], powers, 0.0))
+
+
+def ar1_filter(
+    innovations: np.ndarray,
+    phi: np.ndarray,
+    state: np.ndarray,
+    powers: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    多列 AR(1) 递推 x_t = φ∘x_{t-1} + e_t（φ=1 即随机游走）
+
+    行数较多时各块内的递推一次性用按列批量的矩阵乘完成，块间只需依次叠加上一块末行状态的衰减项；
+    逐行推进（实时模拟每次只生成一两行）时直接递推。
+
+    Args:
+        innovations: 扰动项，n × 列数
+        phi: 各列系数
+        state: 上一行的取值
+        powers: 预先计算的 block_powers(phi)
+    """
+    n, k = innovations.shape
+    if n <= AR_DIRECT_ROWS:
+        x = np.empty((n, k))
+        for t in range(n):
+            state = phi * state + innovations[t]
+            x[t] = state
+        return x
+
+    if powers is None:
+        powers = block_powers(phi)
+    block = powers.shape[1]
+    blocks = -(-n // block)
+    padded = np.zeros((blocks * block, k))
+    padded[:n] = innovations
+    # (列, 块, 块内行) @ (列, 块内行, 块内行)
+    x = np.ascontiguousarray(padded.reshape(blocks, block, k).transpose(2, 0, 1)) @ powers
+    x = x.transpose(1, 2, 0)
+    decay = phi[None, :] ** np.arange(1, block + 1)[:, None]
+    for b in range(blocks):
+        x[b] += decay * state[None, :]
+        state = x[b, -1]
+    return x.reshape(-1, k)[:n]
+
+
+class SignalBank:
+    """
+    多列连续信号 - 所有数值列的状态保存在同一组数组中，按批向量化推进
+
+    每列取值 = 均值轨迹 + 偏离量：偏离量为 AR(1)（ou: Ornstein–Uhlenbeck 离散化，random_walk: φ=1），
+    均值轨迹可按 slope 漂移（drift）或漂移到 target 后保持（ramp）；取值限制在 [low, high]。
+    """
+
+    def __init__(self, specs: List[Dict[str, Any]], rngs: Optional[List[np.random.Generator]] = None):
+        """
+        Args:
+            specs: 各列信号参数：low、high（取值范围），可选 signal（ou/random_walk/ramp/drift）、
+                mean、theta（均值回复速度，每步）、volatility（每步噪声标准差）、slope（每步均值变化）、target（ramp 终点）
+            rngs: 各列的随机数流（见 column_streams），默认按新种子派生
+        """
+        k = len(specs)
+        self.rngs = rngs if rngs is not None else [s["values"] for s in column_streams(new_seed(), k)]
+        self.low = np.array([float(s["low"]) for s in specs])
+        self.high = np.array([float(s["high"]) for s in specs])
+        span = np.maximum(self.high - self.low, 1e-9)
+        kinds = [s.get("signal") or "ou" for s in specs]
+        for kind in kinds:
+            if kind not in SIGNAL_TYPES:
+                raise ValueError(f"不支持的信号类型: {kind}")
+
+        self.mean = np.array([float(s.get("mean", (s["low"] + s["high"]) / 2)) for s in specs])
+        theta = np.array([
+            0.0 if kind == "random_walk" else float(s.get("theta", 0.05))
+            for s, kind in zip(specs, kinds)
+        ])
+        self.phi = np.exp(-theta)
+        # OU 平稳标准差默认取范围的 1/8；随机游走每步标准差默认取范围的 1/100
+        default_volatility = np.where(theta > 0, span / 8 * np.sqrt(1 - self.phi ** 2), span / 100)
+        self.volatility = np.array([
+            float(s["volatility"]) if s.get("volatility") is not None else default_volatility[i]
+            for i, s in enumerate(specs)
+        ])
+
+        self.target = np.full(k, np.nan)
+        self.slope = np.zeros(k)
+        for i, (s, kind) in enumerate(zip(specs, kinds)):
+            if kind == "ramp":
+                self.target[i] = float(s.get("target", self.high[i] - span[i] / 8))
+                self.slope[i] = float(s.get("slope", (self.target[i] - self.mean[i]) / 200))
+            elif kind == "drift":
+                self.slope[i] = float(s.get("slope", span[i] / 1000))
+
+        stationary = np.where(theta > 0, self.volatility / np.sqrt(np.maximum(1 - self.phi ** 2, 1e-12)), 0.0)
+        self.deviation = stationary * np.array([rng.standard_normal() for rng in self.rngs])
+        self.powers = block_powers(self.phi)
+
+    def __len__(self) -> int:
+        return len(self.mean)
+
+    def step(self, n: int) -> np.ndarray:
+        """推进 n 步，返回 n × 列数 的取值"""
+        k = len(self)
+        if n == 0 or k == 0:
+            return np.empty((n, k))
+
+        innovations = standard_normal_columns(self.rngs, n) * self.volatility
+        deviation = ar1_filter(innovations, self.phi, self.deviation, self.powers)
+        if self.slope.any():
+            mean = self.mean[None, :] + self.slope[None, :] * np.arange(1, n + 1)[:, None]
+            ramp = ~np.isnan(self.target)
+            if ramp.any():
+                rising = ramp & (self.slope >= 0)
+                falling = ramp & (self.slope < 0)
+                mean[:, rising] = np.minimum(mean[:, rising], self.target[rising])
+                mean[:, falling] = np.maximum(mean[:, falling], self.target[falling])
+        else:
+            mean = np.broadcast_to(self.mean, (n, k))
+
+        values = np.add(deviation, mean, out=deviation)
+        np.clip(values, self.low, self.high, out=values)
+        self.mean = mean[-1]
+        # 触及上下限时偏离量随之截断，避免随机游走越界后长时间贴边
+        self.deviation = values[-1] - self.mean
+        return values
+
+
+class FaultInjector:
+    """
+    故障片段注入 - 在数值列上叠加持续一段时间的故障
+
+    overheat: 偏移量在片段内线性升至 magnitude（缓慢过热/漂移）；stuck: 传感器卡死，保持片段起点的取值；
+    dropout: 片段内取值缺失。随机故障按每列每步 rate 的概率发生（每列从自己的流抽取下一次故障的起点与参数，
+    结果与批大小无关），也可通过 schedule 指定。
+    """
+
+    def __init__(
+        self,
+        columns: List[str],
+        scales: List[float],
+        rate: float = 0.0,
+        min_duration: int = 20,
+        max_duration: int = 120,
+        rngs: Optional[List[np.random.Generator]] = None
+    ):
+        if not 0 <= rate <= 1:
+            raise ValueError(f"故障发生概率应在 0 到 1 之间: {rate}")
+        self.columns = list(columns)
+        self.index = {column: i for i, column in enumerate(self.columns)}
+        self.scales = np.asarray(scales, dtype=np.float64)
+        self.rate = rate
+        self.min_duration = min_duration
+        self.max_duration = max_duration
+        self.rngs = rngs if rngs is not None else [s["faults"] for s in column_streams(new_seed(), len(self.columns))]
+        self.step_count = 0
+        # 各列当前故障：{列下标: {kind, start, duration, magnitude, value}}
+        self.active: Dict[int, Dict[str, Any]] = {}
+        self.pending: List[Tuple[int, Dict[str, Any]]] = []
+        # 各列下一次随机故障的起始步（首次生成时抽取）
+        self.next_onset: Optional[np.ndarray] = None
+
+    def schedule(
+        self,
+        column: str,
+        kind: str,
+        duration: Optional[int] = None,
+        magnitude: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """在下一批数据开始处注入故障"""
+        if column not in self.index:
+            raise ValueError(f"列不存在或不是数值列: {column}")
+        if kind not in FAULT_KINDS:
+            raise ValueError(f"不支持的故障类型: {kind}")
+        i = self.index[column]
+        episode = {
+            "kind": kind,
+            "duration": int(duration or self.max_duration),
+            "magnitude": float(magnitude if magnitude is not None else 3 * self.scales[i])
+        }
+        self.pending.append((i, episode))
+        return {"column": column, **episode}
+
+    def _random_episode(self, i: int, not_before: int) -> Dict[str, Any]:
+        """第 i 列在 next_onset 处开始的随机故障（与进行中的故障重叠时顺延），并抽取下一次的起点"""
+        rng = self.rngs[i]
+        episode = {
+            "kind": FAULT_KINDS[rng.integers(len(FAULT_KINDS))],
+            "start": max(int(self.next_onset[i]), not_before),
+            "duration": int(rng.integers(self.min_duration, self.max_duration + 1)),
+            "magnitude": float(3 * self.scales[i] * rng.uniform(0.5, 1.5))
+        }
+        self.next_onset[i] = episode["start"] + episode["duration"] + rng.geometric(self.rate) - 1
+        return episode
+
+    def _apply_episode(self, episode: Dict[str, Any], values: np.ndarray, missing: Optional[np.ndarray], n: int):
+        batch_start = self.step_count
+        start = max(0, episode["start"] - batch_start)
+        end = min(n, episode["start"] + episode["duration"] - batch_start)
+        if start >= end:
+            return values, missing
+        if episode["kind"] == "overheat":
+            elapsed = np.arange(start, end) + batch_start - episode["start"] + 1
+            offset = episode["magnitude"] * np.minimum(1.0, elapsed / max(1, episode["duration"] // 2))
+            if values.dtype.kind in "iu":
+                values[start:end] += np.round(offset).astype(values.dtype)
+            else:
+                values[start:end] += offset
+        elif episode["kind"] == "stuck":
+            if "value" not in episode:
+                episode["value"] = values[start]
+            values[start:end] = episode["value"]
+        elif episode["kind"] == "dropout":
+            missing = np.zeros(n, dtype=bool) if missing is None else missing
+            missing[start:end] = True
+        return values, missing
+
+    def apply(self, data: Dict[str, Tuple[np.ndarray, Optional[np.ndarray]]], n: int):
+        """对一批按列数据（{列名: (取值数组, 缺失掩码)}）就地叠加故障，并推进步数"""
+        batch_start, batch_end = self.step_count, self.step_count + n
+        for i, episode in self.pending:
+            self.active[i] = {**episode, "start": batch_start}
+        self.pending = []
+
+        due = set(self.active)
+        if self.rate > 0 and self.columns:
+            if self.next_onset is None:
+                self.next_onset = np.array([batch_start + rng.geometric(self.rate) - 1 for rng in self.rngs])
+            due.update(np.flatnonzero(self.next_onset < batch_end).tolist())
+
+        for i in sorted(due):
+            column = self.columns[i]
+            values, missing = data[column]
+            ended = batch_start
+            # 一批内可能先后出现多段故障
+            while True:
+                episode = self.active.get(i)
+                if episode is None:
+                    if self.rate <= 0 or self.next_onset[i] >= batch_end:
+                        break
+                    episode = self.active[i] = self._random_episode(i, ended)
+                    if episode["start"] >= batch_end:
+                        break
+                values, missing = self._apply_episode(episode, values, missing, n)
+                ended = episode["start"] + episode["duration"]
+                if ended > batch_end:
+                    break
+                del self.active[i]
+            data[column] = (values, missing)
+        self.step_count = batch_end
+
+    def status(self) -> List[Dict[str, Any]]:
+        """当前进行中的故障"""
+        return [
+            {
+                "column": self.columns[i],
+                "kind": episode["kind"],
+                "start_step": episode["start"],
+                "duration": episode["duration"],
+                "remaining": max(0, episode["start"] + episode["duration"] - self.step_count)
+            }
+            for i, episode in self.active.items()
+        ]
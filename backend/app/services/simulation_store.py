@@ -0,0 +1,237 @@
+import os
+import socket
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+
+from sqlalchemy import select, literal, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.core.config import settings
+from app.core.database import SessionLocal, SimulationState, SimulationRow
+
+logger = logging.getLogger(__name__)
+
+
+class SimulationLimitError(Exception):
+    """同时运行的模拟数量已达上限"""
+
+
+def stale_after() -> timedelta:
+    """生成进程超过该时长未刷新 updated_at 即视为已退出"""
+    return timedelta(seconds=max(30.0, 10 * settings.SIMULATION_STORE_FLUSH_INTERVAL))
+
+
+class SimulationStore:
+    """
+    模拟共享存储 - 模拟状态与最近生成的数据行写入数据库，同一数据库上的所有工作进程都能查询与读取
+
+    每个模拟只由启动它的进程生成数据，该进程按 SIMULATION_STORE_FLUSH_INTERVAL 批量写入新行并刷新心跳；
+    其他进程读取、停止时只访问数据库。每次启动分配新的 run_id，旧进程的写入以 run_id 为条件，被替换或被远程停止后自动失效。
+    """
+
+    def __init__(self):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+    def claim(self, simulation_id: str, run_id: str, info: Dict[str, Any], limit: int = 0):
+        """
+        登记（或接管同 ID 的）模拟，清空旧数据行
+
+        运行数量检查与登记在同一条 INSERT ... SELECT 中完成，多个进程同时启动时不会超过上限。
+
+        Args:
+            limit: 所有进程中同时运行的模拟上限（不含同 ID 的模拟），0 为不限制
+
+        Raises:
+            SimulationLimitError: 运行中（心跳未过期）的模拟已达 limit 个
+        """
+        db = SessionLocal()
+        try:
+            now = datetime.now()
+            values = {
+                "simulation_id": simulation_id,
+                "run_id": run_id,
+                "owner": self.worker_id,
+                "status": "running",
+                "info": info,
+                "next_seq": 0,
+                "start_time": now,
+                "last_access": now,
+                "updated_at": now
+            }
+            table = SimulationState.__table__
+            source = select(*[literal(value, type_=table.c[name].type) for name, value in values.items()])
+            if limit > 0:
+                running = select(func.count()).select_from(table).where(
+                    table.c.status == "running",
+                    table.c.updated_at >= now - stale_after(),
+                    table.c.simulation_id != simulation_id
+                ).scalar_subquery()
+                source = source.where(running < limit)
+            inserted = db.execute(
+                sqlite_insert(SimulationState).prefix_with("OR REPLACE").from_select(list(values), source)
+            ).rowcount
+            if not inserted:
+                db.rollback()
+                raise SimulationLimitError(f"同时运行的模拟数量已达上限 {limit}")
+            db.query(SimulationRow).filter(SimulationRow.simulation_id == simulation_id).delete()
+            db.commit()
+        finally:
+            db.close()
+
+    def flush(self, updates: List[Dict[str, Any]], capacity: int) -> Tuple[List[str], Dict[str, datetime]]:
+        """
+        批量写入本进程模拟的新行与状态（一个事务）
+
+        Args:
+            updates: [{simulation_id, run_id, status, next_seq, rows: [(seq, JSON 编码)]}]
+            capacity: 每个模拟保留的行数
+
+        Returns:
+            (已被替换或已被其他进程停止的运行实例 run_id, 各模拟在数据库中记录的最后访问时间)
+        """
+        lost, last_access = [], {}
+        if not updates:
+            return lost, last_access
+        db = SessionLocal()
+        try:
+            now = datetime.now()
+            for update in updates:
+                simulation_id = update["simulation_id"]
+                state = db.query(SimulationState).filter(
+                    SimulationState.simulation_id == simulation_id,
+                    SimulationState.run_id == update["run_id"]
+                ).first()
+                if state is None:
+                    lost.append(update["run_id"])
+                    continue
+                if state.status == "running":
+                    state.status = update["status"]
+                elif update["status"] == "running":
+                    # 已被其他进程停止：写完本批数据后在本进程停止
+                    lost.append(update["run_id"])
+                state.next_seq = update["next_seq"]
+                state.updated_at = now
+                last_access[simulation_id] = state.last_access
+                if update["rows"]:
+                    db.execute(
+                        sqlite_insert(SimulationRow).prefix_with("OR REPLACE"),
+                        [{"simulation_id": simulation_id, "seq": seq, "data": data} for seq, data in update["rows"]]
+                    )
+                    db.query(SimulationRow).filter(
+                        SimulationRow.simulation_id == simulation_id,
+                        SimulationRow.seq < update["next_seq"] - capacity
+                    ).delete(synchronize_session=False)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        return lost, last_access
+
+    def set_status(self, simulation_id: str, status: str, run_id: Optional[str] = None) -> bool:
+        """修改运行中模拟的状态（run_id 为空时不限定运行实例，用于其他进程停止模拟）"""
+        db = SessionLocal()
+        try:
+            query = db.query(SimulationState).filter(
+                SimulationState.simulation_id == simulation_id,
+                SimulationState.status == "running"
+            )
+            if run_id is not None:
+                query = query.filter(SimulationState.run_id == run_id)
+            updated = query.update({"status": status, "updated_at": datetime.now()}, synchronize_session=False)
+            db.commit()
+            return bool(updated)
+        finally:
+            db.close()
+
+    def get(self, simulation_id: str) -> Optional[Dict[str, Any]]:
+        """模拟状态；心跳过期的运行中模拟状态为 lost（生成进程已退出）"""
+        db = SessionLocal()
+        try:
+            state = db.query(SimulationState).filter(SimulationState.simulation_id == simulation_id).first()
+            if state is None:
+                return None
+            status = state.status
+            if status == "running" and state.updated_at < datetime.now() - stale_after():
+                status = "lost"
+            first_seq = db.query(SimulationRow.seq).filter(
+                SimulationRow.simulation_id == simulation_id
+            ).order_by(SimulationRow.seq).limit(1).scalar()
+            return {
+                **(state.info or {}),
+                "status": status,
+                "owner": state.owner,
+                "start_time": state.start_time.isoformat() if state.start_time else None,
+                "data_count": state.next_seq,
+                "buffered_from_seq": first_seq if first_seq is not None else state.next_seq
+            }
+        finally:
+            db.close()
+
+    def read(self, simulation_id: str, since: Optional[int], limit: int) -> Optional[Dict[str, Any]]:
+        """
+        读取已写入的数据行（同时记录访问时间），返回格式同 SimulationBuffer.read_encoded，另附 status
+
+        Args:
+            since: 上次读取返回的 last_seq，为空时返回最近 limit 行
+        """
+        limit = max(0, limit)
+        db = SessionLocal()
+        try:
+            state = db.query(SimulationState).filter(SimulationState.simulation_id == simulation_id).first()
+            if state is None:
+                return None
+            query = db.query(SimulationRow.seq, SimulationRow.data).filter(SimulationRow.simulation_id == simulation_id)
+            if since is None:
+                rows = query.order_by(SimulationRow.seq.desc()).limit(limit).all()[::-1]
+            else:
+                rows = query.filter(SimulationRow.seq > since).order_by(SimulationRow.seq).limit(limit).all()
+
+            dropped = 0
+            if since is not None:
+                first = rows[0][0] if rows else state.next_seq
+                dropped = max(0, first - since - 1)
+            last_seq = rows[-1][0] if rows else (since if since is not None else state.next_seq - 1)
+            result = {
+                "rows": [data for _, data in rows],
+                "last_seq": last_seq,
+                "dropped": dropped,
+                "has_more": last_seq < state.next_seq - 1,
+                "status": state.status
+            }
+            state.last_access = datetime.now()
+            db.commit()
+            return result
+        finally:
+            db.close()
+
+    def remove(self, simulation_ids: List[str]):
+        if not simulation_ids:
+            return
+        db = SessionLocal()
+        try:
+            db.query(SimulationRow).filter(SimulationRow.simulation_id.in_(simulation_ids)).delete(synchronize_session=False)
+            db.query(SimulationState).filter(SimulationState.simulation_id.in_(simulation_ids)).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def expire(self, ttl: float) -> int:
+        """删除超过 ttl 秒未更新的模拟（已停止的模拟，以及生成进程已退出的模拟）"""
+        db = SessionLocal()
+        try:
+            cutoff = datetime.now() - max(timedelta(seconds=ttl), stale_after())
+            expired = [row[0] for row in db.query(SimulationState.simulation_id).filter(
+                SimulationState.updated_at < cutoff
+            ).all()]
+        finally:
+            db.close()
+        self.remove(expired)
+        if expired:
+            logger.info(f"模拟共享存储清理: {len(expired)} 个")
+        return len(expired)
+
+
+simulation_store = SimulationStore()
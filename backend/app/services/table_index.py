@@ -0,0 +1,386 @@
+import re
+import time
+import threading
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.database import SessionLocal, TableFingerprint, TableData, AnalysisRecord
+from app.services.embeddings import get_embeddings, HashingEmbeddings
+from app.services.frame_utils import rows_to_frame, numeric_frame, detect_time_column, round_value
+
+logger = logging.getLogger(__name__)
+
+# 数值画像：列统计量（有符号对数刻度）在固定网格上的核密度
+PROFILE_GRID = np.linspace(-12.0, 12.0, 97)
+PROFILE_BANDWIDTH = 0.15
+PROFILE_MAX_COLUMNS = 50
+# 补建指纹时每次从数据库读取的表数量
+BACKFILL_PAGE_SIZE = 20
+
+
+def _signed_log(values: np.ndarray) -> np.ndarray:
+    return np.sign(values) * np.log1p(np.abs(values))
+
+
+def _density(values: np.ndarray) -> np.ndarray:
+    if values.size == 0:
+        return np.zeros_like(PROFILE_GRID)
+    diff = PROFILE_GRID[None, :] - _signed_log(values)[:, None]
+    return np.exp(-0.5 * (diff / PROFILE_BANDWIDTH) ** 2).sum(axis=0)
+
+
+def _normalize(vector: np.ndarray) -> np.ndarray:
+    norm = np.linalg.norm(vector)
+    return (vector / norm).astype(np.float32) if norm > 0 else vector.astype(np.float32)
+
+
+def schema_text(columns: List[str]) -> str:
+    """列名归一化后拼接为文本（去掉序号、单位括号等噪声）"""
+    names = []
+    for column in columns:
+        name = re.sub(r"[\(（\[【].*?[\)）\]】]", "", str(column)).strip().lower()
+        names.append(name or str(column))
+    return "表字段: " + " | ".join(names)
+
+
+def numeric_profile(rows: List[Dict[str, Any]], columns: Optional[List[str]]) -> Tuple[np.ndarray, Dict[str, Any]]:
+    """
+    数值分布画像
+
+    向量由各数值列的 P5 / 中位数 / P95 在对数网格上的核密度拼接而成，
+    另附数值列占比；返回 (归一化向量, 各列统计摘要)。
+    """
+    df = rows_to_frame(rows, columns)
+    time_column = detect_time_column(df)
+    numeric = numeric_frame(df, exclude=[time_column] if time_column else None)
+
+    stats = {}
+    lows, medians, highs = [], [], []
+    for column in list(numeric.columns)[:PROFILE_MAX_COLUMNS]:
+        values = numeric[column].dropna().to_numpy()
+        if values.size == 0:
+            continue
+        low, median, high = np.percentile(values, [5, 50, 95])
+        lows.append(low)
+        medians.append(median)
+        highs.append(high)
+        stats[str(column)] = {"p5": round_value(low), "median": round_value(median), "p95": round_value(high)}
+
+    numeric_ratio = len(stats) / max(1, len(df.columns))
+    vector = np.concatenate([
+        _density(np.array(lows)),
+        _density(np.array(medians)),
+        _density(np.array(highs)),
+        [numeric_ratio * 4.0]
+    ])
+    return _normalize(vector), stats
+
+
+def table_payload(table: TableData) -> Dict[str, Any]:
+    """TableData 转为指纹计算所需的普通字典（可脱离数据库会话使用）"""
+    return {
+        "id": table.id,
+        "record_id": table.record_id,
+        "table_name": table.table_name,
+        "columns": table.columns or [],
+        "data": table.data or []
+    }
+
+
+class TableFingerprintIndex:
+    """表指纹索引 - 上传时为每个表生成指纹，按列名相似度与数值分布相似度加权查找相似表（内存矩阵检索）
+
+    内存矩阵按进程维护，检索时每隔 TABLE_INDEX_REFRESH_INTERVAL 秒与数据库中的指纹同步一次，
+    其他工作进程上传或删除的表在下一次同步后可见。
+    """
+
+    def __init__(self, schema_weight: float = 0.6):
+        self.schema_weight = schema_weight
+        self._embeddings = None
+        self._model_id: Optional[str] = None
+        self._entries: List[Dict[str, Any]] = []
+        self._schema: Optional[np.ndarray] = None
+        self._profile: Optional[np.ndarray] = None
+        self._loaded = False
+        self._synced_at = 0.0
+        self._lock = threading.RLock()
+
+    def _get_embeddings(self):
+        """列名向量化：优先使用共享向量化客户端，不可用时使用哈希向量化"""
+        if self._embeddings is None:
+            embeddings = get_embeddings()
+            if embeddings is None:
+                embeddings = HashingEmbeddings(dim=settings.HASHING_EMBEDDING_DIM)
+            self._embeddings = embeddings
+            self._model_id = embeddings.model_id
+        return self._embeddings
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            self._sync()
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            self._get_embeddings()
+            db = SessionLocal()
+            try:
+                rows = db.query(TableFingerprint).filter(TableFingerprint.model_id == self._model_id).all()
+                self._append([self._item(row) for row in rows])
+                logger.info(f"表指纹索引加载完成: {len(rows)} 个表")
+            except Exception as e:
+                logger.error(f"表指纹索引加载失败: {str(e)}")
+            finally:
+                db.close()
+            self._loaded = True
+            self._synced_at = time.monotonic()
+        # 补建在锁外分页进行，期间的检索使用已加载的指纹
+        self._backfill()
+
+    def _backfill(self):
+        """为启用指纹索引前上传的表（以及用其他向量化模型建立指纹的表）补建指纹，每次读取 BACKFILL_PAGE_SIZE 个表"""
+        db = SessionLocal()
+        try:
+            indexed = {row[0] for row in db.query(TableFingerprint.table_data_id).filter(
+                TableFingerprint.model_id == self._model_id
+            ).all()}
+            missing_ids = [row[0] for row in db.query(TableData.id).all() if row[0] not in indexed]
+        finally:
+            db.close()
+        if missing_ids:
+            logger.info(f"表指纹补建: {len(missing_ids)} 个表")
+
+        for offset in range(0, len(missing_ids), BACKFILL_PAGE_SIZE):
+            db = SessionLocal()
+            try:
+                page = db.query(TableData).filter(
+                    TableData.id.in_(missing_ids[offset:offset + BACKFILL_PAGE_SIZE])
+                ).all()
+                file_names = {r.id: r.file_name for r in db.query(AnalysisRecord).filter(
+                    AnalysisRecord.id.in_({t.record_id for t in page})
+                ).all()}
+                grouped: Dict[str, List[Dict[str, Any]]] = {}
+                for t in page:
+                    grouped.setdefault(t.record_id, []).append(table_payload(t))
+            finally:
+                db.close()
+            for record_id, tables in grouped.items():
+                self.index_tables(file_names.get(record_id, ""), tables)
+
+    def _sync(self):
+        """与数据库中的指纹同步：载入本进程没有的（其他工作进程建立的），移除数据库中已删除的"""
+        now = time.monotonic()
+        if settings.TABLE_INDEX_REFRESH_INTERVAL <= 0 or now - self._synced_at < settings.TABLE_INDEX_REFRESH_INTERVAL:
+            return
+        self._synced_at = now
+        db = SessionLocal()
+        try:
+            stored = {row[0] for row in db.query(TableFingerprint.table_data_id).filter(
+                TableFingerprint.model_id == self._model_id
+            ).all()}
+            with self._lock:
+                local = {entry["table_data_id"] for entry in self._entries}
+            added = list(stored - local)
+            rows = db.query(TableFingerprint).filter(TableFingerprint.table_data_id.in_(added)).all() if added else []
+        except Exception as e:
+            logger.error(f"表指纹索引同步失败: {str(e)}")
+            return
+        finally:
+            db.close()
+
+        removed = local - stored
+        if removed:
+            self._drop(lambda entry: entry["table_data_id"] in removed)
+        self._append([self._item(row) for row in rows])
+        if rows or removed:
+            logger.info(f"表指纹索引同步: 新增 {len(rows)} 个, 移除 {len(removed)} 个")
+
+    def _item(self, row: TableFingerprint) -> Tuple[Dict[str, Any], np.ndarray, np.ndarray]:
+        return (
+            self._entry(row),
+            np.frombuffer(row.schema_vector, dtype=np.float32),
+            np.frombuffer(row.profile_vector, dtype=np.float32)
+        )
+
+    def _entry(self, row: TableFingerprint) -> Dict[str, Any]:
+        return {
+            "table_data_id": row.table_data_id,
+            "record_id": row.record_id,
+            "file_name": row.file_name,
+            "table_name": row.table_name,
+            "columns": row.columns or [],
+            "profile": row.profile or {}
+        }
+
+    def _append(self, items: List[Tuple[Dict[str, Any], np.ndarray, np.ndarray]]):
+        """写入指纹到内存矩阵：已有同一表的指纹时原位替换，否则追加（维度与已有指纹不一致的跳过，如切换了向量化模型）"""
+        if not items:
+            return
+        with self._lock:
+            if self._schema is not None:
+                dims = (self._schema.shape[1], self._profile.shape[1])
+            else:
+                dims = (items[0][1].shape[0], items[0][2].shape[0])
+            # 同一批中重复的表以最后一个为准
+            items = list({
+                item[0]["table_data_id"]: item for item in items
+                if (item[1].shape[0], item[2].shape[0]) == dims
+            }.values())
+            positions = {entry["table_data_id"]: i for i, entry in enumerate(self._entries)}
+            new_items = []
+            for item in items:
+                i = positions.get(item[0]["table_data_id"])
+                if i is None:
+                    new_items.append(item)
+                    continue
+                self._entries[i] = item[0]
+                self._schema[i] = item[1]
+                self._profile[i] = item[2]
+            items = new_items
+            if not items:
+                return
+            schema = np.vstack([item[1] for item in items])
+            profile = np.vstack([item[2] for item in items])
+            self._entries.extend(item[0] for item in items)
+            self._schema = schema if self._schema is None else np.vstack([self._schema, schema])
+            self._profile = profile if self._profile is None else np.vstack([self._profile, profile])
+
+    def fingerprint(self, columns: List[str], rows: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray, Dict[str, Any]]:
+        """计算表指纹：(列名向量, 数值画像向量, 列统计摘要)"""
+        schema = _normalize(np.asarray(self._get_embeddings().embed_query(schema_text(columns)), dtype=np.float32))
+        profile, stats = numeric_profile(rows, columns)
+        return schema, profile, stats
+
+    def index_tables(self, file_name: str, tables: List[Dict[str, Any]]):
+        """
+        为上传文件中的各个表生成并保存指纹
+
+        Args:
+            file_name: 上传文件名
+            tables: table_payload() 生成的表数据（id、record_id、table_name、columns、data）
+        """
+        self._ensure_loaded()
+        db = SessionLocal()
+        try:
+            added = []
+            for table in tables:
+                columns = table.get("columns") or []
+                schema, profile, stats = self.fingerprint(columns, table.get("data") or [])
+                row = TableFingerprint(
+                    table_data_id=table["id"],
+                    record_id=table["record_id"],
+                    file_name=file_name,
+                    table_name=table["table_name"],
+                    columns=columns,
+                    model_id=self._model_id,
+                    schema_vector=schema.tobytes(),
+                    profile_vector=profile.tobytes(),
+                    profile=stats
+                )
+                db.merge(row)
+                added.append((self._entry(row), schema, profile))
+            db.commit()
+            self._append(added)
+            logger.info(f"表指纹已建立: {file_name}, {len(added)} 个表")
+        except Exception as e:
+            db.rollback()
+            logger.error(f"表指纹建立失败: {str(e)}")
+        finally:
+            db.close()
+
+    def remove_record(self, record_id: str):
+        """删除某个上传文件的全部表指纹"""
+        db = SessionLocal()
+        try:
+            db.query(TableFingerprint).filter(TableFingerprint.record_id == record_id).delete()
+            db.commit()
+        finally:
+            db.close()
+
+        self._drop(lambda entry: entry["record_id"] == record_id)
+
+    def _drop(self, predicate):
+        """从内存矩阵中移除满足条件的指纹"""
+        with self._lock:
+            keep = [i for i, entry in enumerate(self._entries) if not predicate(entry)]
+            if len(keep) == len(self._entries):
+                return
+            self._entries = [self._entries[i] for i in keep]
+            self._schema = self._schema[keep] if keep else None
+            self._profile = self._profile[keep] if keep else None
+
+    def similar(
+        self,
+        columns: List[str],
+        rows: List[Dict[str, Any]],
+        k: int = 5,
+        exclude_record_id: Optional[str] = None,
+        min_similarity: float = 0.0
+    ) -> List[Dict[str, Any]]:
+        """
+        查找结构与数值分布相近的表
+
+        Args:
+            columns: 列名
+            rows: 行数据
+            k: 返回数量
+            exclude_record_id: 排除的上传记录（通常为当前文件本身）
+            min_similarity: 综合相似度下限
+        """
+        self._ensure_loaded()
+        schema, profile, _ = self.fingerprint(columns, rows)
+
+        with self._lock:
+            if self._schema is None:
+                return []
+            schema_scores = self._schema @ schema
+            profile_scores = self._profile @ profile
+            entries = list(self._entries)
+
+        scores = self.schema_weight * schema_scores + (1 - self.schema_weight) * profile_scores
+        results = []
+        for i in np.argsort(-scores):
+            entry = entries[i]
+            if exclude_record_id and entry["record_id"] == exclude_record_id:
+                continue
+            if scores[i] < min_similarity:
+                break
+            results.append({
+                **{key: entry[key] for key in ("table_data_id", "record_id", "file_name", "table_name")},
+                "similarity": round_value(float(scores[i])),
+                "schema_similarity": round_value(float(schema_scores[i])),
+                "profile_similarity": round_value(float(profile_scores[i])),
+                "shared_columns": [c for c in entry["columns"] if c in set(columns)][:20]
+            })
+            if len(results) >= k:
+                break
+        return results
+
+    def attach_analyses(self, similar: List[Dict[str, Any]], max_chars: int = 800) -> List[Dict[str, Any]]:
+        """为相似表附上最近一次成功的表分析结果（供 LLM 参考复用）"""
+        if not similar:
+            return similar
+        db = SessionLocal()
+        try:
+            for item in similar:
+                record = db.query(AnalysisRecord).filter(
+                    AnalysisRecord.source_record_id == item["record_id"],
+                    AnalysisRecord.table_name == item["table_name"],
+                    AnalysisRecord.status == "analyzed"
+                ).order_by(AnalysisRecord.completed_at.desc()).first()
+                result = (record.analysis_result or {}) if record else {}
+                item["analysis"] = {
+                    "record_id": record.id,
+                    "analysis_type": record.analysis_type,
+                    "completed_at": record.completed_at.isoformat() if record.completed_at else None,
+                    "content": (result.get("content") or "")[:max_chars]
+                } if record else None
+        finally:
+            db.close()
+        return similar
+
+
+table_index = TableFingerprintIndex()
@@ -0,0 +1,331 @@
+import time
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, List, Optional
+import logging
+
+from app.core.config import settings
+from app.services.frame_utils import (
+    rows_to_frame, detect_time_column, parse_time_column, numeric_frame, time_to_seconds,
+    format_label, round_value
+)
+
+logger = logging.getLogger(__name__)
+
+SENSOR_KEYWORDS = ['温度', '温', 'temp', 'temperature', '元件', '测点']
+
+THERMAL_SYSTEM_PROMPT = """你是整流机组热管理专家，精通大功率硅元件（晶闸管/二极管）的温度监测分析。
+擅长识别：散热器过热、冷却水流量不足、触发不均导致的热斑、环境温度影响等热故障模式。
+请基于温度数据给出专业的热状态评估和预警建议。"""
+
+THERMAL_TASK_PROMPT = """
+数据概览中的 thermal_analysis 是系统对全量数据精确计算的热分析结果（各测点统计、热点、测点间不均衡矩阵、超限持续时间、温升斜率）。
+请直接引用其中的数值，不要自行估算或修改，在此基础上进行解读：
+1. **温度分布评估**：各监测点温度是否均衡，是否存在局部过热（热点）
+2. **超限分析**：超过报警阈值和晶闸管允许结温（thresholds.junction_limit）的测点、次数与持续时间
+3. **热故障诊断**：如果存在温度异常，分析可能原因（水路堵塞、风机故障、负荷不均等）
+4. **预测性建议**：基于温升斜率，判断是否需要调整冷却系统或降负荷运行
+5. **维护优先级**：如果有多个异常点，给出检修优先级排序
+
+注意：整流元件温度过高可能导致硅片热击穿，需严肃对待。请用中文回答。
+"""
+
+
+class ThermalAnalyzer:
+    """整流机组元件温度热分析 - 热点、测点不均衡、超限持续时间、温升斜率（全量向量化计算）"""
+
+    def __init__(
+        self,
+        junction_limit: float = None,
+        alarm_threshold: float = None,
+        imbalance_threshold: float = None,
+        slope_window: int = 10
+    ):
+        self.junction_limit = junction_limit if junction_limit is not None else settings.THERMAL_JUNCTION_LIMIT
+        self.alarm_threshold = alarm_threshold if alarm_threshold is not None else settings.THERMAL_ALARM_THRESHOLD
+        self.imbalance_threshold = imbalance_threshold if imbalance_threshold is not None else settings.THERMAL_IMBALANCE_THRESHOLD
+        self.slope_window = slope_window
+
+    def analyze(
+        self,
+        rows: List[Dict[str, Any]],
+        columns: Optional[List[str]] = None,
+        time_column: Optional[str] = None,
+        sensors: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        对元件温度表执行热分析
+
+        Args:
+            rows: 表数据行（TableData.data）
+            columns: 列顺序
+            time_column: 时间列，不指定时自动识别
+            sensors: 温度测点列，不指定时按列名识别
+        """
+        started = time.perf_counter()
+        df = rows_to_frame(rows, columns)
+
+        if time_column is None:
+            time_column = detect_time_column(df)
+        times = parse_time_column(df, time_column)
+
+        num = numeric_frame(df, exclude=[time_column] if time_column else None)
+        sensors = self._select_sensors(num, sensors)
+
+        result = {
+            "rows": len(df),
+            "time_column": time_column if times is not None else None,
+            "sensors": sensors,
+            "thresholds": {
+                "alarm": self.alarm_threshold,
+                "junction_limit": self.junction_limit,
+                "imbalance": self.imbalance_threshold
+            }
+        }
+
+        if not sensors:
+            result["message"] = "未识别到温度测点列"
+            result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+            return result
+
+        num = num[sensors]
+        if times is not None:
+            order = np.argsort(times.to_numpy(), kind="stable")
+            num = num.iloc[order]
+            times = times.iloc[order]
+            seconds = time_to_seconds(times)
+        else:
+            seconds = None
+
+        X = num.to_numpy(dtype=np.float64, copy=True)
+        labels = times.to_numpy() if times is not None else num.index.to_numpy()
+
+        result["per_sensor"] = self._sensor_statistics(X, sensors, labels)
+        result["hotspots"] = self._hotspots(X, sensors, labels)
+        result["imbalance"] = self._imbalance(X, sensors, labels)
+        result["exceedance"] = self._exceedance(X, sensors, labels, seconds)
+        result["slopes"] = self._slopes(X, sensors, seconds)
+        result["summary"] = self._summary(result)
+        result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+        logger.info(
+            f"热分析完成: {X.shape[0]} 行 x {X.shape[1]} 个测点, "
+            f"风险等级 {result['summary']['risk_level']}, 耗时 {result['elapsed_ms']}ms"
+        )
+        return result
+
+    def _select_sensors(self, num: pd.DataFrame, sensors: Optional[List[str]]) -> List[str]:
+        """识别温度测点列：优先按列名关键字，未命中时使用全部数值列"""
+        if sensors:
+            return [s for s in sensors if s in num.columns]
+
+        matched = [
+            col for col in num.columns
+            if any(keyword in str(col).lower() for keyword in SENSOR_KEYWORDS)
+        ]
+        return matched or list(num.columns)
+
+    def _sensor_statistics(self, X: np.ndarray, sensors: List[str], labels) -> Dict[str, Any]:
+        """各测点统计量"""
+        with np.errstate(all="ignore"):
+            col_min = np.nanmin(X, axis=0)
+            col_max = np.nanmax(X, axis=0)
+            col_mean = np.nanmean(X, axis=0)
+            col_std = np.nanstd(X, axis=0)
+            p95 = np.nanpercentile(X, 95, axis=0)
+        valid = ~np.isnan(X)
+        has_data = valid.any(axis=0)
+        argmax = np.nanargmax(np.where(valid, X, -np.inf), axis=0)
+        last_index = X.shape[0] - 1 - np.argmax(valid[::-1], axis=0)
+
+        return {
+            sensor: {
+                "min": round_value(col_min[j]),
+                "max": round_value(col_max[j]),
+                "mean": round_value(col_mean[j]),
+                "std": round_value(col_std[j]),
+                "p95": round_value(p95[j]),
+                "last": round_value(X[last_index[j], j]) if has_data[j] else None,
+                "max_at": format_label(labels, argmax[j]) if has_data[j] else None,
+                "missing": int((~valid[:, j]).sum())
+            }
+            for j, sensor in enumerate(sensors)
+        }
+
+    def _hotspots(self, X: np.ndarray, sensors: List[str], labels) -> List[Dict[str, Any]]:
+        """热点：测点温度相对同一时刻其他测点中位数的偏离"""
+        if X.shape[1] < 2:
+            return []
+
+        with np.errstate(all="ignore"):
+            row_median = np.nanmedian(X, axis=1)
+            deviation = X - row_median[:, None]
+        hot = deviation > self.imbalance_threshold
+        mean_deviation = np.nanmean(deviation, axis=0)
+        peak_index = np.nanargmax(np.where(np.isnan(deviation), -np.inf, deviation), axis=0)
+
+        hotspots = []
+        for j in np.argsort(-np.nan_to_num(mean_deviation, nan=-np.inf), kind="stable"):
+            if hot[:, j].sum() == 0 and not (mean_deviation[j] > self.imbalance_threshold / 2):
+                continue
+            hotspots.append({
+                "sensor": sensors[j],
+                "mean_deviation": round_value(mean_deviation[j]),
+                "peak_deviation": round_value(deviation[peak_index[j], j]),
+                "peak_at": format_label(labels, peak_index[j]),
+                "hot_samples": int(hot[:, j].sum())
+            })
+        return hotspots
+
+    def _imbalance(self, X: np.ndarray, sensors: List[str], labels) -> Dict[str, Any]:
+        """测点间不均衡：均值差矩阵、最大瞬时差矩阵以及每一时刻的温度极差"""
+        m = X.shape[1]
+        with np.errstate(all="ignore"):
+            means = np.nanmean(X, axis=0)
+            spread = np.nanmax(X, axis=1) - np.nanmin(X, axis=1)
+
+        mean_diff = means[:, None] - means[None, :]
+        max_abs_diff = np.zeros((m, m))
+        # 逐测点向量化计算，避免构造 n x m x m 的中间数组
+        for i in range(m):
+            with np.errstate(all="ignore"):
+                diff = np.abs(X - X[:, [i]])
+            valid = ~np.isnan(diff)
+            max_abs_diff[i] = np.where(valid.any(axis=0), np.nanmax(np.where(valid, diff, -np.inf), axis=0), np.nan)
+
+        valid_spread = ~np.isnan(spread)
+        over = valid_spread & (spread > self.imbalance_threshold)
+        peak = int(np.nanargmax(np.where(valid_spread, spread, -np.inf))) if valid_spread.any() else None
+
+        return {
+            "sensors": sensors,
+            "mean_difference": _round_matrix(mean_diff),
+            "max_abs_difference": _round_matrix(max_abs_diff),
+            "spread_mean": round_value(np.nanmean(spread)) if valid_spread.any() else None,
+            "spread_max": round_value(spread[peak]) if peak is not None else None,
+            "spread_max_at": format_label(labels, peak) if peak is not None else None,
+            "samples_over_threshold": int(over.sum())
+        }
+
+    def _exceedance(
+        self,
+        X: np.ndarray,
+        sensors: List[str],
+        labels,
+        seconds: Optional[np.ndarray]
+    ) -> Dict[str, Any]:
+        """超限分析：报警阈值与结温上限的超限次数、持续时间和最长持续段"""
+        dt = self._sample_durations(seconds, X.shape[0])
+        result = {}
+        for name, threshold in (("alarm", self.alarm_threshold), ("junction_limit", self.junction_limit)):
+            with np.errstate(invalid="ignore"):
+                above = X > threshold
+            # 超限段：上升沿为段开始，对持续时间做分段累加
+            starts = above & ~np.vstack([np.zeros((1, X.shape[1]), dtype=bool), above[:-1]])
+            segment_id = np.cumsum(starts, axis=0)
+            sensors_result = {}
+            for j in np.flatnonzero(above.any(axis=0)):
+                durations = np.bincount(segment_id[above[:, j], j], weights=dt[above[:, j]])
+                first = int(np.argmax(above[:, j]))
+                last = X.shape[0] - 1 - int(np.argmax(above[::-1, j]))
+                sensors_result[sensors[j]] = {
+                    "samples": int(above[:, j].sum()),
+                    "episodes": int(starts[:, j].sum()),
+                    "duration_seconds": round_value(durations.sum(), 1) if seconds is not None else None,
+                    "longest_episode_seconds": round_value(durations.max(), 1) if seconds is not None else None,
+                    "first_at": format_label(labels, first),
+                    "last_at": format_label(labels, last)
+                }
+            result[name] = {
+                "threshold": threshold,
+                "sensors": sensors_result
+            }
+        return result
+
+    def _sample_durations(self, seconds: Optional[np.ndarray], n: int) -> np.ndarray:
+        """每个样本代表的时长：到下一样本的间隔，数据中断（超过5倍中位间隔）时按中位间隔计"""
+        if seconds is None or n < 2:
+            return np.ones(n)
+
+        dt = np.empty(n)
+        dt[:-1] = seconds[1:] - seconds[:-1]
+        median = np.nanmedian(dt[:-1][dt[:-1] > 0]) if (dt[:-1] > 0).any() else 1.0
+        dt[-1] = median
+        invalid = ~(dt > 0) | (dt > median * 5)
+        dt[invalid] = median
+        return dt
+
+    def _slopes(self, X: np.ndarray, sensors: List[str], seconds: Optional[np.ndarray]) -> Dict[str, Any]:
+        """温升斜率：全程最小二乘斜率与滑动窗口最大温升速率（有时间列时单位 °C/分钟，否则 °C/样本）"""
+        n = X.shape[0]
+        if seconds is not None:
+            t = (seconds - np.nanmin(seconds)) / 60.0
+            unit = "°C/min"
+        else:
+            t = np.arange(n, dtype=np.float64)
+            unit = "°C/sample"
+
+        valid = ~np.isnan(X) & ~np.isnan(t)[:, None]
+        count = valid.sum(axis=0)
+        tx = np.where(valid, t[:, None], 0.0)
+        xx = np.where(valid, X, 0.0)
+        with np.errstate(all="ignore"):
+            t_mean = tx.sum(axis=0) / count
+            x_mean = xx.sum(axis=0) / count
+            cov = (np.where(valid, (tx - t_mean) * (xx - x_mean), 0.0)).sum(axis=0)
+            var = (np.where(valid, (tx - t_mean) ** 2, 0.0)).sum(axis=0)
+            overall = cov / var
+
+        w = self.slope_window
+        max_rise = np.full(X.shape[1], np.nan)
+        if n > w:
+            with np.errstate(all="ignore"):
+                rise = (X[w:] - X[:-w]) / (t[w:] - t[:-w])[:, None]
+            rise[~np.isfinite(rise)] = np.nan
+            has = ~np.isnan(rise).all(axis=0)
+            max_rise[has] = np.nanmax(rise[:, has], axis=0)
+
+        return {
+            "unit": unit,
+            "window": w,
+            "sensors": {
+                sensor: {
+                    "overall": round_value(overall[j], 6),
+                    "max_window_rise": round_value(max_rise[j], 6)
+                }
+                for j, sensor in enumerate(sensors)
+            }
+        }
+
+    def _summary(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """汇总风险等级"""
+        per_sensor = result["per_sensor"]
+        maxima = {s: v["max"] for s, v in per_sensor.items() if v["max"] is not None}
+        hottest = max(maxima, key=maxima.get) if maxima else None
+        junction = result["exceedance"]["junction_limit"]["sensors"]
+        alarm = result["exceedance"]["alarm"]["sensors"]
+
+        if junction:
+            risk_level = "严重"
+        elif alarm:
+            risk_level = "告警"
+        elif result["hotspots"] or result["imbalance"]["samples_over_threshold"]:
+            risk_level = "关注"
+        else:
+            risk_level = "正常"
+
+        return {
+            "risk_level": risk_level,
+            "hottest_sensor": hottest,
+            "max_temperature": maxima.get(hottest) if hottest else None,
+            "sensors_over_junction_limit": sorted(junction),
+            "sensors_over_alarm": sorted(alarm),
+            "hotspot_sensors": [h["sensor"] for h in result["hotspots"]]
+        }
+
+
+def _round_matrix(matrix: np.ndarray) -> List[List[Optional[float]]]:
+    return [[round_value(v, 2) for v in row] for row in matrix]
+
+
+thermal_analyzer = ThermalAnalyzer()
@@ -0,0 +1,334 @@
+import time
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, List, Optional, Hashable
+import logging
+
+from app.core.cache import LRUCache
+from app.services.frame_utils import (
+    rows_to_frame, detect_time_column, parse_time_column, numeric_frame, time_to_seconds, round_value
+)
+
+logger = logging.getLogger(__name__)
+
+TREND_TASK_PROMPT = """
+数据概览中的 trend_analysis 是系统对全量时间序列计算的趋势结果：规则时间网格上的滚动斜率、季节性分解、变点（均值突变）以及带置信区间的短期预测。
+请直接引用其中的数值进行解读，不要自行编造预测值：
+1. 时间范围与采样间隔，各关键指标的整体走势（上升/下降/平稳）及速率
+2. 变点：发生时间、突变前后均值及可能的原因
+3. 周期性：是否存在周期波动、周期长度与幅度
+4. 短期预测：根据 forecast 的预测值和置信区间判断是否会接近报警/限值
+5. 运维建议
+
+请用中文回答，关注趋势和预测。
+"""
+
+
+class TrendEngine:
+    """时间序列趋势引擎 - 规则网格重采样、滚动斜率、季节性分解、变点检测和短期预测"""
+
+    def __init__(
+        self,
+        slope_window: int = 12,
+        max_points: int = 200000,
+        max_changepoints: int = 8,
+        min_segment: int = 10,
+        horizon: int = 24,
+        max_columns: int = 20,
+        cache_size: int = 64
+    ):
+        self.slope_window = slope_window
+        self.max_points = max_points
+        self.max_changepoints = max_changepoints
+        self.min_segment = min_segment
+        self.horizon = horizon
+        self.max_columns = max_columns
+        self._cache = LRUCache(maxsize=cache_size)
+
+    def analyze(
+        self,
+        rows: List[Dict[str, Any]],
+        columns: Optional[List[str]] = None,
+        time_column: Optional[str] = None,
+        cache_key: Optional[Hashable] = None
+    ) -> Dict[str, Any]:
+        """
+        对表数据执行趋势分析
+
+        Args:
+            rows: 表数据行（TableData.data）
+            columns: 列顺序
+            time_column: 时间列，不指定时自动识别
+            cache_key: 缓存键（表 + 版本），相同键的重复请求直接返回缓存结果
+        """
+        if cache_key is not None:
+            cached = self._cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"趋势分析命中缓存: {cache_key}")
+                return cached
+
+        result = self._analyze(rows_to_frame(rows, columns), time_column)
+
+        if cache_key is not None:
+            self._cache.set(cache_key, result)
+        return result
+
+    def _analyze(self, df: pd.DataFrame, time_column: Optional[str]) -> Dict[str, Any]:
+        started = time.perf_counter()
+
+        if time_column is None:
+            time_column = detect_time_column(df)
+        times = parse_time_column(df, time_column)
+
+        if times is None:
+            return {
+                "time_column": None,
+                "message": "未识别到时间列，无法进行趋势分析",
+                "columns": {}
+            }
+
+        num = numeric_frame(df, exclude=[time_column])
+        valid = times.notna().to_numpy()
+        num = num[valid]
+        num.index = pd.DatetimeIndex(times[valid].to_numpy())
+        num = num.sort_index()
+
+        if num.empty or len(num) < self.min_segment * 2:
+            return {
+                "time_column": time_column,
+                "message": "有效时间序列数据过少，无法进行趋势分析",
+                "columns": {}
+            }
+
+        grid, step = self._resample(num)
+        X = grid.to_numpy(dtype=np.float64)
+        t_hours = time_to_seconds(grid.index.to_series()) / 3600.0
+        t_hours = t_hours - t_hours[0]
+
+        rolling = self._rolling_slopes(X, step)
+        columns_result = {}
+        order = np.argsort(-np.nanstd(X, axis=0) / (np.abs(np.nanmean(X, axis=0)) + 1e-9), kind="stable")
+
+        for j in order[:self.max_columns]:
+            series = X[:, j]
+            ok = ~np.isnan(series)
+            if ok.sum() < self.min_segment * 2:
+                continue
+
+            filled = pd.Series(series).interpolate(limit_direction="both").to_numpy()
+            overall = np.polyfit(t_hours[ok], series[ok], 1)[0] if ok.sum() > 1 else np.nan
+            seasonal, period = self._seasonal_decompose(filled)
+            changepoints = self._changepoints(filled - seasonal, grid.index)
+            forecast = self._forecast(filled, seasonal, period, grid.index, step)
+
+            col_slopes = rolling[:, j]
+            columns_result[str(grid.columns[j])] = {
+                "start": round_value(filled[0]),
+                "end": round_value(filled[-1]),
+                "mean": round_value(np.nanmean(series)),
+                "overall_slope_per_hour": round_value(overall, 6),
+                "rolling_slope_per_hour": {
+                    "window": self.slope_window,
+                    "last": round_value(col_slopes[~np.isnan(col_slopes)][-1], 6) if (~np.isnan(col_slopes)).any() else None,
+                    "max": round_value(np.nanmax(col_slopes), 6) if (~np.isnan(col_slopes)).any() else None,
+                    "min": round_value(np.nanmin(col_slopes), 6) if (~np.isnan(col_slopes)).any() else None
+                },
+                "seasonality": self._seasonality_summary(filled, seasonal, period, step),
+                "changepoints": changepoints,
+                "forecast": forecast
+            }
+
+        result = {
+            "time_column": time_column,
+            "start": grid.index[0].isoformat(),
+            "end": grid.index[-1].isoformat(),
+            "step_seconds": step,
+            "grid_points": len(grid),
+            "columns": columns_result,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 2)
+        }
+        logger.info(f"趋势分析完成: {len(grid)} 个网格点 x {len(columns_result)} 列, 耗时 {result['elapsed_ms']}ms")
+        return result
+
+    def _resample(self, num: pd.DataFrame):
+        """按中位采样间隔重采样到规则时间网格，短缺口线性插值"""
+        seconds = time_to_seconds(num.index.to_series())
+        diffs = np.diff(seconds)
+        diffs = diffs[diffs > 0]
+        step = float(np.median(diffs)) if len(diffs) else 1.0
+        span = seconds[-1] - seconds[0]
+        if span / step > self.max_points:
+            step = span / self.max_points
+        step = max(1, int(round(step)))
+
+        grid = num.resample(f"{step}s").mean()
+        grid = grid.interpolate(limit=3, limit_area="inside")
+        return grid, step
+
+    def _rolling_slopes(self, X: np.ndarray, step: int) -> np.ndarray:
+        """滚动最小二乘斜率（单位/小时）：规则网格上斜率等价于与固定核的卷积"""
+        w = self.slope_window
+        n = X.shape[0]
+        slopes = np.full(X.shape, np.nan)
+        if n < w:
+            return slopes
+
+        offsets = np.arange(w) - (w - 1) / 2
+        kernel = offsets / (offsets ** 2).sum()
+        windows = np.lib.stride_tricks.sliding_window_view(X, w, axis=0)
+        slopes[w - 1:] = windows @ kernel * (3600.0 / step)
+        return slopes
+
+    def _detect_period(self, x: np.ndarray) -> Optional[int]:
+        """基于 FFT 自相关识别周期（去除线性趋势后，自相关峰值需超过 0.3）"""
+        n = len(x)
+        if n < 8:
+            return None
+
+        t = np.arange(n)
+        detrended = x - np.polyval(np.polyfit(t, x, 1), t)
+        detrended = detrended - detrended.mean()
+        if not np.any(detrended):
+            return None
+
+        size = 1 << (2 * n - 1).bit_length()
+        spectrum = np.fft.rfft(detrended, size)
+        acf = np.fft.irfft(spectrum * np.conj(spectrum), size)[:n // 2]
+        acf = acf / acf[0]
+
+        # 跳过 0 附近的主瓣：从自相关首次变为负值之后开始寻找峰值
+        negative = np.flatnonzero(acf < 0)
+        if len(negative) == 0:
+            return None
+        start = max(2, int(negative[0]))
+        if start >= len(acf):
+            return None
+        lag = start + int(np.argmax(acf[start:]))
+        return lag if acf[lag] > 0.3 else None
+
+    def _seasonal_decompose(self, x: np.ndarray):
+        """加性季节分解：移动平均趋势 + 按相位平均的季节项"""
+        period = self._detect_period(x)
+        if not period:
+            return np.zeros_like(x), None
+
+        trend = pd.Series(x).rolling(period, center=True, min_periods=1).mean().to_numpy()
+        detrended = x - trend
+        phase = np.arange(len(x)) % period
+        pattern = np.bincount(phase, weights=detrended, minlength=period) / np.bincount(phase, minlength=period)
+        pattern -= pattern.mean()
+        return pattern[phase], period
+
+    def _seasonality_summary(self, x: np.ndarray, seasonal: np.ndarray, period: Optional[int], step: int) -> Dict[str, Any]:
+        if not period:
+            return {"period_points": None}
+
+        deseasonalized = x - seasonal
+        residual = deseasonalized - pd.Series(deseasonalized).rolling(period, center=True, min_periods=1).mean().to_numpy()
+        detrended_var = np.var(residual + seasonal)
+        strength = 1 - np.var(residual) / detrended_var if detrended_var > 0 else 0.0
+        return {
+            "period_points": period,
+            "period_seconds": period * step,
+            "amplitude": round_value(seasonal.max() - seasonal.min()),
+            "strength": round_value(max(0.0, strength))
+        }
+
+    def _changepoints(self, x: np.ndarray, index: pd.DatetimeIndex) -> List[Dict[str, Any]]:
+        """二分分割法检测均值变点：去除线性趋势后，基于前缀和向量化计算所有切分点的代价下降"""
+        n = len(x)
+        t = np.arange(n)
+        trend = np.polyval(np.polyfit(t, x, 1), t)
+        residual = x - trend
+        prefix = np.concatenate(([0.0], np.cumsum(residual)))
+
+        # 噪声方差用一阶差分的 MAD 稳健估计，对均值突变不敏感
+        diff = np.diff(residual)
+        sigma = 1.4826 * np.median(np.abs(diff - np.median(diff))) / np.sqrt(2)
+        if sigma <= 0:
+            sigma = np.std(diff) / np.sqrt(2) if np.std(diff) > 0 else 1e-9
+        penalty = 3.0 * sigma * sigma * np.log(n)
+
+        m = self.min_segment
+        segments = [(0, n)]
+        found = []
+        while segments and len(found) < self.max_changepoints:
+            best = None
+            for a, b in segments:
+                if b - a < 2 * m:
+                    continue
+                k = np.arange(a + m, b - m + 1)
+                left_s = prefix[k] - prefix[a]
+                right_s = prefix[b] - prefix[k]
+                total_s = prefix[b] - prefix[a]
+                gain = left_s ** 2 / (k - a) + right_s ** 2 / (b - k) - total_s ** 2 / (b - a)
+                i = int(np.argmax(gain))
+                if gain[i] > penalty and (best is None or gain[i] > best[0]):
+                    best = (gain[i], a, b, int(k[i]))
+            if best is None:
+                break
+            _, a, b, k = best
+            segments.remove((a, b))
+            segments += [(a, k), (k, b)]
+            found.append((k, a, b))
+
+        result = []
+        # 以原始序列在变点前后各一小段内的均值报告突变幅度，
+        # 幅度不显著的切分（缓慢漂移被分段拟合产生）不作为变点
+        threshold = 3 * sigma * np.sqrt(2 / m)
+        for k, a, b in sorted(found):
+            before = x[max(a, k - m):k].mean()
+            after = x[k:min(b, k + m)].mean()
+            if abs(after - before) <= threshold:
+                continue
+            result.append({
+                "at": index[k].isoformat(),
+                "before_mean": round_value(before),
+                "after_mean": round_value(after),
+                "shift": round_value(after - before)
+            })
+        return result
+
+    def _forecast(
+        self,
+        x: np.ndarray,
+        seasonal: np.ndarray,
+        period: Optional[int],
+        index: pd.DatetimeIndex,
+        step: int
+    ) -> Dict[str, Any]:
+        """短期预测：对去季节项的近期数据做线性外推，叠加季节项，给出 95% 预测区间"""
+        n = len(x)
+        h = min(self.horizon, max(1, n // 10))
+        lookback = min(n, max(50, 3 * (period or 0)))
+        y = (x - seasonal)[-lookback:]
+        t = np.arange(n - lookback, n, dtype=np.float64)
+
+        slope, intercept = np.polyfit(t, y, 1)
+        residual = y - (slope * t + intercept)
+        dof = max(1, lookback - 2)
+        sigma = np.sqrt((residual ** 2).sum() / dof)
+
+        future_t = np.arange(n, n + h, dtype=np.float64)
+        t_mean = t.mean()
+        sxx = ((t - t_mean) ** 2).sum()
+        spread = 1.96 * sigma * np.sqrt(1 + 1 / lookback + (future_t - t_mean) ** 2 / sxx)
+
+        if period:
+            pattern = seasonal[-period:]
+            future_seasonal = pattern[(np.arange(h)) % period]
+        else:
+            future_seasonal = np.zeros(h)
+        values = slope * future_t + intercept + future_seasonal
+
+        future_index = index[-1] + pd.to_timedelta(np.arange(1, h + 1) * step, unit="s")
+        return {
+            "horizon": h,
+            "timestamps": [ts.isoformat() for ts in future_index],
+            "values": [round_value(v) for v in values],
+            "lower": [round_value(v) for v in values - spread],
+            "upper": [round_value(v) for v in values + spread]
+        }
+
+
+trend_engine = TrendEngine()
@@ -0,0 +1,178 @@
+import os
+import threading
+import logging
+from typing import Dict, Any, List, Optional, Iterable
+
+from app.core.config import settings
+from app.services.embeddings import get_embeddings, collection_name
+from app.services.hybrid_retriever import HybridRetriever, simhash, hamming_distance
+from app.services.ann_index import create_ann_index, hnsw_metadata
+
+logger = logging.getLogger(__name__)
+
+# 命名空间：上传的维护手册 / 历史分析结果
+MANUALS = "manuals"
+ANALYSIS_HISTORY = "analysis_history"
+NAMESPACES = (MANUALS, ANALYSIS_HISTORY)
+
+# 旧版本的两个独立向量库位置（历史分析库使用相对于工作目录的路径）
+LEGACY_DIRS = {
+    MANUALS: os.path.join(settings.BASE_DIR, "data", "knowledge_vectorstore"),
+    ANALYSIS_HISTORY: os.path.abspath(os.path.join("data", "vectorstore"))
+}
+
+
+class VectorIndex:
+    """统一向量索引服务 - 单一持久化目录、单一向量化客户端，按命名空间分集合存储，检索可跨命名空间"""
+
+    def __init__(self, persist_directory: str):
+        self.persist_directory = persist_directory
+        self.client = None
+        self.stores: Dict[str, Any] = {}
+        self.retrievers: Dict[str, HybridRetriever] = {}
+        self._initialized = False
+        self._lock = threading.Lock()
+
+    def _ensure_initialized(self):
+        if self._initialized:
+            return
+        with self._lock:
+            if self._initialized:
+                return
+            try:
+                import chromadb
+                from langchain_community.vectorstores import Chroma
+
+                embeddings = get_embeddings()
+                if embeddings is None:
+                    logger.info("没有可用的向量化后端，向量索引不可用")
+                    return
+
+                os.makedirs(self.persist_directory, exist_ok=True)
+                self.client = chromadb.PersistentClient(path=self.persist_directory)
+                for namespace in NAMESPACES:
+                    store = Chroma(
+                        client=self.client,
+                        collection_name=collection_name(namespace),
+                        embedding_function=embeddings,
+                        collection_metadata=hnsw_metadata()
+                    )
+                    self._migrate_legacy(namespace, store)
+                    self.stores[namespace] = store
+                    self.retrievers[namespace] = HybridRetriever(
+                        store,
+                        cache_size=settings.RAG_QUERY_CACHE_SIZE,
+                        ann=create_ann_index(),
+                        refresh_interval=settings.RAG_INDEX_REFRESH_INTERVAL
+                    )
+                logger.info(f"向量索引初始化成功: {self.persist_directory}")
+            except Exception as e:
+                logger.error(f"向量索引初始化失败: {str(e)}")
+                self.stores = {}
+                self.retrievers = {}
+            finally:
+                self._initialized = True
+
+    def _migrate_legacy(self, namespace: str, store):
+        """新集合为空且存在旧版本向量库时，连同向量一起迁移（无需重新向量化）"""
+        legacy_dir = LEGACY_DIRS.get(namespace)
+        if not legacy_dir or not os.path.isdir(legacy_dir) or os.path.abspath(legacy_dir) == os.path.abspath(self.persist_directory):
+            return
+        if store._collection.count() > 0:
+            return
+
+        try:
+            import chromadb
+            legacy = chromadb.PersistentClient(path=legacy_dir).get_collection(collection_name())
+            data = legacy.get(include=["documents", "metadatas", "embeddings"])
+        except Exception:
+            return
+
+        ids = data.get("ids") or []
+        for start in range(0, len(ids), 1000):
+            end = start + 1000
+            store._collection.upsert(
+                ids=ids[start:end],
+                embeddings=data["embeddings"][start:end],
+                metadatas=data["metadatas"][start:end],
+                documents=data["documents"][start:end]
+            )
+        if ids:
+            logger.info(f"已从旧向量库迁移 {len(ids)} 条记录到命名空间 {namespace}")
+
+    @property
+    def available(self) -> bool:
+        self._ensure_initialized()
+        return bool(self.stores)
+
+    def store(self, namespace: str):
+        """获取命名空间对应的 LangChain 向量库，不可用时返回 None"""
+        self._ensure_initialized()
+        return self.stores.get(namespace)
+
+    def add(
+        self,
+        namespace: str,
+        texts: List[str],
+        metadatas: List[Dict[str, Any]],
+        ids: Optional[List[str]] = None
+    ):
+        """写入指定命名空间（同步更新关键词索引）"""
+        self._ensure_initialized()
+        self.retrievers[namespace].add_texts(texts, metadatas, ids=ids)
+
+    def get(self, namespace: str, **kwargs) -> Dict[str, Any]:
+        """按 ID / 元数据读取记录（参数同 Chroma.get）"""
+        self._ensure_initialized()
+        return self.stores[namespace].get(**kwargs)
+
+    def update_metadata(self, namespace: str, ids: List[str], metadatas: List[Dict[str, Any]]):
+        """更新元数据（不重新向量化）"""
+        self._ensure_initialized()
+        self.stores[namespace]._collection.update(ids=ids, metadatas=metadatas)
+
+    def delete(self, namespace: str, ids: List[str]):
+        """按 ID 删除记录（同步移除关键词索引）"""
+        self._ensure_initialized()
+        if not ids:
+            return
+        self.stores[namespace].delete(ids=ids)
+        self.retrievers[namespace].remove_ids(ids)
+
+    def search(self, query: str, k: int = 3, namespaces: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        """
+        跨命名空间检索，各命名空间结果按融合得分统一排序
+
+        Args:
+            query: 查询文本
+            k: 返回条数
+            namespaces: 检索的命名空间，默认全部
+        """
+        self._ensure_initialized()
+        results = []
+        for namespace in namespaces or NAMESPACES:
+            retriever = self.retrievers.get(namespace)
+            if retriever is None:
+                continue
+            try:
+                # 多取一倍候选，供下面的近重复折叠后仍能凑满 k 条
+                for item in retriever.search(query, k=k * 2):
+                    results.append({**item, "namespace": namespace})
+            except Exception as e:
+                logger.error(f"命名空间 {namespace} 检索失败: {str(e)}")
+
+        results.sort(key=lambda item: item["score"], reverse=True)
+
+        selected, fingerprints = [], []
+        for item in results:
+            fingerprint = simhash(item["content"])
+            if any(hamming_distance(fingerprint, other) <= settings.HISTORY_SIMHASH_DISTANCE for other in fingerprints):
+                continue
+            selected.append(item)
+            fingerprints.append(fingerprint)
+            if len(selected) >= k:
+                break
+        return selected
+
+
+vector_index = VectorIndex(os.path.join(settings.BASE_DIR, "data", "vectorstore"))
@@ -0,0 +1,95 @@
+"""大规模模拟数据集生成：用模拟引擎的列生成器写出 CSV / Parquet / MySQL 转储，用于导入、存储与分析链路的规模测试
+
+用法（在 backend 目录下）:
+    python scripts/generate_dataset.py out/sensor.csv --rows 5000000 --width 40
+    python scripts/generate_dataset.py out/dump.sql --size 2GB --tables 8 --workers 4 --fault-rate 0.001
+    python scripts/generate_dataset.py out/sensor.parquet --rows 1000000 --missing-rate 0.02 --seed 42
+"""
+import os
+import re
+import sys
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.dataset_generator import DATASET_BATCH_SIZE, DATASET_FORMATS, generate_dataset  # noqa: E402
+from app.services.simulation_signals import SIGNAL_TYPES  # noqa: E402
+
+_SIZE_UNITS = {"": 1, "B": 1, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3, "TB": 1024 ** 4}
+
+
+def parse_size(text: str) -> int:
+    """解析文件大小（如 500MB、2GB、1048576）"""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMGT]?B?)\s*", text.upper())
+    if not match:
+        raise argparse.ArgumentTypeError(f"无法解析文件大小: {text}")
+    unit = match.group(2)
+    if unit and not unit.endswith("B"):
+        unit += "B"
+    return int(float(match.group(1)) * _SIZE_UNITS[unit])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="大规模模拟数据集生成（CSV / Parquet / MySQL 转储）")
+    parser.add_argument("path", help="输出文件（扩展名 .csv / .parquet / .sql）")
+    parser.add_argument("--format", choices=DATASET_FORMATS, help="输出格式，默认按扩展名判断")
+    parser.add_argument("--rows", type=int, help="每张表的行数")
+    parser.add_argument("--size", type=parse_size, help="输出总大小上限（如 500MB、2GB），未指定 --rows 时写到该大小为止")
+    parser.add_argument("--width", type=int, default=20, help="列数")
+    parser.add_argument("--columns", help="逗号分隔的列名（覆盖 --width）")
+    parser.add_argument("--tables", type=int, default=1, help="表数量")
+    parser.add_argument("--table-prefix", default="sensor_data", help="表名前缀")
+    parser.add_argument("--missing-rate", type=float, default=0.0, help="数值列缺失率")
+    parser.add_argument("--anomaly-rate", type=float, default=0.0, help="数值列异常值比例")
+    parser.add_argument("--signal", choices=SIGNAL_TYPES, help="数值列信号类型")
+    parser.add_argument("--fault-rate", type=float, default=0.0, help="故障片段发生概率（每列每步）")
+    parser.add_argument("--seed", type=int, help="随机种子（默认随机，结束时输出）")
+    parser.add_argument("--start", help="首行采集时间（默认当天零点）")
+    parser.add_argument("--step", type=float, default=1.0, help="相邻两行的时间间隔（秒）")
+    parser.add_argument("--batch-size", type=int, default=DATASET_BATCH_SIZE, help="每批行数")
+    parser.add_argument("--workers", type=int, default=1, help="并行进程数（多张表时生效）")
+    args = parser.parse_args()
+
+    if args.rows is None and args.size is None:
+        parser.error("需要指定 --rows 或 --size")
+    if args.seed is not None and args.seed < 0:
+        parser.error("--seed 不能为负数")
+
+    directory = os.path.dirname(os.path.abspath(args.path))
+    os.makedirs(directory, exist_ok=True)
+    try:
+        result = generate_dataset(
+            args.path,
+            fmt=args.format,
+            rows=args.rows,
+            max_bytes=args.size,
+            width=args.width,
+            columns=[c.strip() for c in args.columns.split(",") if c.strip()] if args.columns else None,
+            tables=args.tables,
+            table_prefix=args.table_prefix,
+            missing_rate=args.missing_rate,
+            anomaly_rate=args.anomaly_rate,
+            signal=args.signal,
+            fault_rate=args.fault_rate,
+            seed=args.seed,
+            start=args.start,
+            step=args.step,
+            batch_size=args.batch_size,
+            workers=args.workers
+        )
+    except ImportError:
+        raise SystemExit("Parquet 输出需要安装 pyarrow")
+    except ValueError as e:
+        raise SystemExit(str(e))
+
+    print(f"{'table':<24}{'rows':>12}{'MB':>10}{'seconds':>10}")
+    for table in result["tables"]:
+        print(f"{table['table']:<24}{table['rows']:>12}{table['bytes'] / 1024 / 1024:>10.1f}{table['seconds']:>10.1f}")
+    print(
+        f"\n{result['path']}: {result['rows']} 行, {result['bytes'] / 1024 / 1024:.1f} MB, "
+        f"耗时 {result['seconds']:.1f}s, seed={result['seed']}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""混合检索：向量库命中不在本进程 BM25 索引中时仍返回该命中；按分块 ID 删除不影响内容相同的其他分块；跨进程写入后重建索引"""
+import time
+
+import pytest
+from langchain_core.documents import Document
+
+from app.services.hybrid_retriever import HybridRetriever
+
+
+class StubVectorStore:
+    """向量库桩：get 返回空库（本进程 BM25 索引为空），similarity_search 返回固定命中"""
+
+    def __init__(self, hits):
+        self.hits = hits
+
+    def get(self, include=None):
+        return {"documents": [], "metadatas": []}
+
+    def similarity_search(self, query, k=4):
+        return self.hits[:k]
+
+
+def test_vector_hit_missing_from_bm25():
+    hit = Document(page_content="整流柜温度超过 85℃ 时检查风机", metadata={"doc_id": "other-worker"})
+    retriever = HybridRetriever(StubVectorStore([hit]))
+
+    results = retriever.search("整流柜温度", k=3)
+
+    assert [r["content"] for r in results] == [hit.page_content]
+    assert results[0]["metadata"] == {"doc_id": "other-worker"}
+
+
+def _chroma_store():
+    import uuid
+
+    import chromadb
+    from langchain_community.vectorstores import Chroma
+
+    from app.services.embeddings import HashingEmbeddings
+
+    return Chroma(
+        client=chromadb.EphemeralClient(),
+        collection_name=f"test-{uuid.uuid4().hex[:8]}",
+        embedding_function=HashingEmbeddings(dim=256)
+    )
+
+
+@pytest.mark.parametrize("ann", [None, "quantized"])
+def test_remove_keeps_chunks_with_same_text(ann):
+    from app.services.ann_index import QuantizedFlatIndex
+
+    store = _chroma_store()
+    retriever = HybridRetriever(store, ann=QuantizedFlatIndex("none") if ann else None)
+    shared = "更换整流柜风机前先断开主回路电源"
+    retriever.add_texts([shared, "定期清理散热器滤网"], [{"doc_id": "a"}, {"doc_id": "a"}], ids=["a-0", "a-1"])
+    retriever.add_texts([shared], [{"doc_id": "b"}], ids=["b-0"])
+
+    # 删除文档 a 的分块：文档 b 中相同文本的分块仍可检索，元数据指向 b
+    store.delete(ids=["a-0", "a-1"])
+    retriever.remove_ids(["a-0", "a-1"])
+    results = retriever.search("整流柜风机 断开电源", k=3)
+    assert [r["content"] for r in results] == [shared]
+    assert results[0]["metadata"] == {"doc_id": "b"}
+
+    store.delete(ids=["b-0"])
+    retriever.remove_ids(["b-0"])
+    assert retriever.search("整流柜风机 断开电源", k=3) == []
+
+
+def test_refresh_picks_up_other_worker_writes():
+    store = _chroma_store()
+    retriever = HybridRetriever(store, refresh_interval=0.01)
+    retriever.add_texts(["整流柜温度报警处理"], [{"doc_id": "a"}], ids=["a-0"])
+
+    # 另一个工作进程直接写入同一集合
+    other = HybridRetriever(store)
+    other.add_texts(["电解槽电压波动排查"], [{"doc_id": "b"}], ids=["b-0"])
+    time.sleep(0.02)
+
+    assert retriever.search("电压波动", k=3)[0]["metadata"] == {"doc_id": "b"}
+    assert len(retriever.bm25) == 2
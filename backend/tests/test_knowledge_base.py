@@ -0,0 +1,43 @@
+"""知识库导入：同名不同内容的文档互不覆盖；仅在指定 replace_doc_id 时原地更新"""
+import uuid
+
+import pytest
+
+from app.core.database import init_db
+from app.services.knowledge_base import knowledge_manager
+from app.services.vector_index import vector_index
+
+
+@pytest.fixture
+def doc_ids():
+    init_db()
+    if not vector_index.available:
+        pytest.skip("向量库不可用")
+    ids = []
+    yield ids
+    for doc_id in ids:
+        knowledge_manager.delete_document(doc_id)
+
+
+def test_same_name_requires_explicit_replace(doc_ids):
+    tag = uuid.uuid4().hex
+    first = knowledge_manager.add_document(f"整流柜风机维护 {tag}".encode(), "说明书.txt")
+    second = knowledge_manager.add_document(f"电解槽电压排查 {tag}".encode(), "说明书.txt")
+    doc_ids.extend([first["doc_id"], second["doc_id"]])
+
+    assert first["success"] and second["success"]
+    assert first["doc_id"] != second["doc_id"] and not second["updated"]
+    listed = {d["doc_id"] for d in knowledge_manager.list_documents()}
+    assert {first["doc_id"], second["doc_id"]} <= listed
+
+    replaced = knowledge_manager.add_document(
+        f"整流柜风机更换 {tag}".encode(), "说明书.txt", replace_doc_id=first["doc_id"]
+    )
+    assert replaced["success"] and replaced["updated"]
+    assert replaced["doc_id"] == first["doc_id"]
+
+    duplicate = knowledge_manager.add_document(f"电解槽电压排查 {tag}".encode(), "另一份.txt")
+    assert duplicate["duplicate"] and duplicate["doc_id"] == second["doc_id"]
+
+    missing = knowledge_manager.add_document(b"x", "a.txt", replace_doc_id="not-exist")
+    assert not missing["success"]
@@ -0,0 +1,169 @@
+"""LLM 传输层：用本地桩服务验证重试、并发上限、熔断、指标，以及分析器的模型调用经由传输层"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from app.core.config import settings
+from app.services.langchain_analyzer import TransportChatModel
+from app.services.llm_transport import BackendPolicy, LLMTransport, LLMTransportError
+
+
+class StubServer:
+    """本地桩服务：按 responses 依次返回 (状态码, 响应体)，用完后重复最后一个；记录请求与最大并发数"""
+
+    def __init__(self, responses, delay: float = 0.0):
+        self.responses = list(responses)
+        self.delay = delay
+        self.requests = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with stub._lock:
+                    stub.requests.append({"path": self.path, "body": body, "headers": dict(self.headers)})
+                    status, payload = stub.responses.pop(0) if len(stub.responses) > 1 else stub.responses[0]
+                    stub.active += 1
+                    stub.max_active = max(stub.max_active, stub.active)
+                time.sleep(stub.delay)
+                with stub._lock:
+                    stub.active -= 1
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                if status == 429:
+                    self.send_header("Retry-After", "0")
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+OK = (200, {"choices": [{"message": {"content": "ok"}}], "usage": {"prompt_tokens": 3, "completion_tokens": 5}})
+
+
+@pytest.fixture
+def transport(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_RETRY_BASE_DELAY", 0.01)
+    monkeypatch.setattr(settings, "LLM_CIRCUIT_FAILURE_THRESHOLD", 2)
+    monkeypatch.setattr(settings, "LLM_CIRCUIT_RESET_SECONDS", 60.0)
+    transport = LLMTransport({"stub": BackendPolicy(max_concurrency=2, timeout=5.0, max_retries=2)})
+    yield transport
+    transport.close()
+
+
+@pytest.fixture
+def stub():
+    servers = []
+
+    def start(responses, delay=0.0):
+        server = StubServer(responses, delay)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.close()
+
+
+def test_retries_transient_errors_and_records_metrics(transport, stub):
+    server = stub([(503, {"error": "busy"}), (429, {"error": "slow down"}), OK])
+    result = transport.post_json_sync("stub", server.url + "/chat/completions", {"q": 1})
+
+    assert result["choices"][0]["message"]["content"] == "ok"
+    assert len(server.requests) == 3
+    metrics = transport.get_metrics()["stub"]
+    assert metrics["retries"] == 2
+    assert metrics["successes"] == 1
+    assert metrics["tokens"] == {"prompt": 3, "completion": 5}
+    assert metrics["circuit"] == "closed"
+
+
+def test_client_errors_are_not_retried(transport, stub):
+    server = stub([(400, {"error": "bad request"})])
+    with pytest.raises(LLMTransportError) as error:
+        transport.post_json_sync("stub", server.url, {})
+
+    assert error.value.status_code == 400
+    assert len(server.requests) == 1
+
+
+def test_concurrency_is_capped_per_backend(transport, stub):
+    server = stub([OK], delay=0.2)
+    threads = [
+        threading.Thread(target=transport.post_json_sync, args=("stub", server.url, {"i": i}))
+        for i in range(6)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(server.requests) == 6
+    assert server.max_active == 2
+
+
+def test_circuit_opens_after_repeated_failures(transport, stub):
+    server = stub([(500, {"error": "down"})])
+    for _ in range(2):
+        with pytest.raises(LLMTransportError):
+            transport.post_json_sync("stub", server.url, {})
+    calls = len(server.requests)
+
+    with pytest.raises(LLMTransportError, match="熔断"):
+        transport.post_json_sync("stub", server.url, {})
+    assert len(server.requests) == calls
+    metrics = transport.get_metrics()["stub"]
+    assert metrics["circuit"] == "open"
+    assert metrics["rejected"] == 1
+
+
+def test_chat_model_calls_go_through_transport(stub):
+    transport = LLMTransport({
+        "deepseek": BackendPolicy(max_concurrency=1, timeout=5.0, max_retries=0),
+        "ollama": BackendPolicy(max_concurrency=1, timeout=5.0, max_retries=0)
+    })
+    try:
+        openai_server = stub([OK])
+        ollama_server = stub([(200, {"message": {"content": "本地"}, "prompt_eval_count": 2, "eval_count": 4})])
+        messages = [SystemMessage(content="系统"), HumanMessage(content="问题")]
+
+        deepseek = TransportChatModel("deepseek", openai_server.url + "/v1", "m", api_key="k", transport=transport)
+        assert deepseek.invoke(messages).content == "ok"
+        request = openai_server.requests[0]
+        assert request["path"] == "/v1/chat/completions"
+        assert request["headers"]["Authorization"] == "Bearer k"
+        assert request["body"]["messages"] == [
+            {"role": "system", "content": "系统"},
+            {"role": "user", "content": "问题"}
+        ]
+
+        ollama = TransportChatModel("ollama", ollama_server.url, "qwen", transport=transport)
+        assert ollama.invoke(messages).content == "本地"
+        assert ollama_server.requests[0]["path"] == "/api/chat"
+        assert ollama_server.requests[0]["body"]["stream"] is False
+
+        metrics = transport.get_metrics()
+        assert metrics["deepseek"]["successes"] == 1
+        assert metrics["ollama"]["tokens"] == {"prompt": 2, "completion": 4}
+    finally:
+        transport.close()
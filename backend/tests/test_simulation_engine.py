@@ -0,0 +1,44 @@
+"""模拟引擎：故障概率校验，生成失败的模拟标记为 failed 并释放运行名额"""
+import asyncio
+import uuid
+
+import pytest
+
+from app.core.database import init_db
+from app.services.simulation_engine import SimulationEngine
+from app.services.simulation_plan import SimulationPlan
+
+
+@pytest.mark.parametrize("rate", [-0.1, 1.5, float("nan")])
+def test_fault_rate_out_of_range(rate):
+    with pytest.raises(ValueError):
+        SimulationPlan(["温度"], fault_rate=rate)
+
+
+def test_generation_error_marks_failed(monkeypatch):
+    init_db()
+    simulation_id = f"test-{uuid.uuid4().hex[:8]}"
+
+    def broken(*args, **kwargs):
+        raise RuntimeError("boom")
+
+    async def main():
+        engine = SimulationEngine()
+        await engine.start_simulation(simulation_id, ["温度"], interval=1)
+        monkeypatch.setattr(engine.active_simulations[simulation_id]["plan"], "generate", broken)
+        engine._schedule(simulation_id, 0.0)
+        await asyncio.sleep(0.2)
+        local = await engine.get_simulation_status(simulation_id)
+
+        # 写入共享存储后不再以 running 状态占用同时运行的名额
+        engine._next_housekeeping = 0
+        engine._wakeup.set()
+        await asyncio.sleep(0.2)
+        stored = engine.store.get(simulation_id)
+        await engine.shutdown()
+        engine.store.remove([simulation_id])
+        return local, stored
+
+    local, stored = asyncio.run(main())
+    assert local["status"] == "failed"
+    assert stored["status"] == "failed"
@@ -0,0 +1,67 @@
+"""模拟共享存储：多个进程同时登记模拟时，运行数量检查与登记是原子的"""
+import threading
+import uuid
+
+import pytest
+
+from app.core.database import SessionLocal, SimulationState, init_db
+from app.services.simulation_store import SimulationLimitError, SimulationStore
+
+
+@pytest.fixture
+def prefix():
+    init_db()
+    prefix = f"test-{uuid.uuid4().hex[:8]}-"
+    yield prefix
+    db = SessionLocal()
+    try:
+        db.query(SimulationState).filter(SimulationState.simulation_id.like(prefix + "%")).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _running(prefix: str) -> int:
+    db = SessionLocal()
+    try:
+        return db.query(SimulationState).filter(
+            SimulationState.simulation_id.like(prefix + "%"),
+            SimulationState.status == "running"
+        ).count()
+    finally:
+        db.close()
+
+
+def test_concurrent_claims_respect_limit(prefix):
+    claimed, limited, errors = [], [], []
+
+    def claim(i):
+        store = SimulationStore()
+        store.worker_id = f"worker:{i}"
+        try:
+            store.claim(f"{prefix}{i}", str(uuid.uuid4()), {}, limit=3)
+            claimed.append(i)
+        except SimulationLimitError:
+            limited.append(i)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=claim, args=(i,)) for i in range(12)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert len(claimed) == 3 and len(limited) == 9
+    assert _running(prefix) == 3
+
+
+def test_reclaim_same_id_not_counted(prefix):
+    store = SimulationStore()
+    store.claim(f"{prefix}a", "run-1", {}, limit=1)
+    with pytest.raises(SimulationLimitError):
+        store.claim(f"{prefix}b", "run-2", {}, limit=1)
+    store.claim(f"{prefix}a", "run-3", {}, limit=1)
+    assert store.get(f"{prefix}a")["status"] == "running"
+    assert _running(prefix) == 1
@@ -103,18 +103,51 @@ export const equipmentApi = {
     return response.data
   },
 
-  startSimulation: async (recordId: string, tableName: string, interval = 5, useAnalysisFeatures = true) => {
+  startSimulation: async (
+    recordId: string,
+    tableName: string,
+    interval = 5,
+    useAnalysisFeatures = true,
+    seed?: number
+  ) => {
     const response = await apiClient.post('/simulation/start', null, {
       params: {
         record_id: recordId,
         table_name: tableName,
         interval,
-        use_analysis_features: useAnalysisFeatures
+        use_analysis_features: useAnalysisFeatures,
+        seed
       }
     })
     return response.data
   },
 
+  startReplay: async (
+    recordId: string,
+    tableName: string,
+    options: { speed?: number; loop?: boolean; startAt?: string; timeColumn?: string } = {}
+  ) => {
+    const response = await apiClient.post('/simulation/start', null, {
+      params: {
+        record_id: recordId,
+        table_name: tableName,
+        mode: 'replay',
+        speed: options.speed ?? 1,
+        loop: options.loop ?? false,
+        start_at: options.startAt,
+        time_column: options.timeColumn
+      }
+    })
+    return response.data
+  },
+
+  seekSimulation: async (simulationId: string, position: string) => {
+    const response = await apiClient.post('/simulation/seek', null, {
+      params: { simulation_id: simulationId, position }
+    })
+    return response.data
+  },
+
   stopSimulation: async (simulationId: string) => {
     const response = await apiClient.post('/simulation/stop', null, {
       params: { simulation_id: simulationId }
@@ -122,13 +155,21 @@ export const equipmentApi = {
     return response.data
   },
 
-  getSimulationData: async (simulationId: string, rowCount = 20) => {
+  getSimulationData: async (simulationId: string, rowCount = 20, since?: number) => {
     const response = await apiClient.get('/simulation/data', {
-      params: { simulation_id: simulationId, row_count: rowCount }
+      params: { simulation_id: simulationId, row_count: rowCount, since }
     })
     return response.data
   },
 
+  openSimulationStream: (simulationId: string, since?: number) => {
+    const params = new URLSearchParams({ simulation_id: simulationId })
+    if (since !== undefined) {
+      params.set('since', String(since))
+    }
+    return new EventSource(`${API_BASE_URL}/simulation/stream?${params.toString()}`)
+  },
+
   getSimulationStatus: async (simulationId: string) => {
     const response = await apiClient.get('/simulation/status', {
       params: { simulation_id: simulationId }
@@ -141,9 +182,12 @@ export const equipmentApi = {
     return response.data
   },
 
-  uploadKnowledgeDoc: async (file: File) => {
+  uploadKnowledgeDoc: async (file: File, replaceDocId?: string) => {
     const formData = new FormData()
     formData.append('file', file)
+    if (replaceDocId) {
+      formData.append('replace_doc_id', replaceDocId)
+    }
     const response = await apiClient.post('/knowledge/upload', formData, {
       headers: { 'Content-Type': 'multipart/form-data' }
     })